@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# benchmarks/edge_formats.py
+"""
+윤곽선(Edge Map) 저장/전송 형식별 크기와 인코딩 시간 비교 벤치마크
+
+- png: 8비트 그레이스케일 PNG (이전 저장 형식)
+- packbits: np.packbits로 픽셀당 1비트 (압축 없음)
+- packed: packbits + zlib (controller.image_pipeline.pack_edges, 현재 기본 저장 형식)
+- rle: 행 우선 런 길이 부호화 (uint32 런 길이, 비교용)
+- json / svg: findContours + approxPolyDP로 단순화한 벡터 윤곽선
+
+json/svg는 응답 압축을 고려해 gzip 크기도 함께 보고합니다.
+--image를 지정하지 않으면 도형과 그라디언트로 만든 합성 이미지를 사용합니다.
+
+실행 예:
+    python -m benchmarks.edge_formats --width 2000 --height 1500 --iterations 20
+    python -m benchmarks.edge_formats --image sample.jpg
+"""
+import gzip
+import json
+import time
+import argparse
+import platform
+from typing import Callable, Dict
+import cv2
+import numpy as np
+import orjson
+from controller.image_pipeline import (
+    canny_edges, contours_json, contours_svg, edge_contours, encode_png, pack_edges, unpack_edges
+)
+
+
+def _synthetic_gray(width: int, height: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    image = np.tile(np.linspace(40, 200, width, dtype=np.uint8), (height, 1))
+    for _ in range(40):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        radius = int(rng.integers(10, max(11, min(width, height) // 6)))
+        color = int(rng.integers(0, 255))
+        if rng.random() < 0.5:
+            cv2.circle(image, (x, y), radius, color, -1)
+        else:
+            cv2.rectangle(image, (x, y), (x + radius, y + radius // 2), color, -1)
+    return image
+
+
+def rle_encode(edges: np.ndarray) -> bytes:
+    """0/1 구간 길이를 번갈아 기록 (첫 구간은 0)."""
+    flat = (edges.ravel() > 0).astype(np.int8)
+    changes = np.flatnonzero(np.diff(flat)) + 1
+    boundaries = np.concatenate(([0], changes, [flat.size]))
+    runs = np.diff(boundaries).astype(np.uint32)
+    if flat[0]:
+        runs = np.concatenate(([0], runs)).astype(np.uint32)
+    return runs.tobytes()
+
+
+def measure(encode: Callable[[], bytes], iterations: int) -> Dict:
+    timings = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        data = encode()
+        timings.append(time.perf_counter() - start_time)
+    timings.sort()
+    return {
+        "bytes": len(data),
+        "gzip_bytes": len(gzip.compress(data, 6)),
+        "encode_ms": {
+            "p50": round(timings[len(timings) // 2] * 1000, 3),
+            "mean": round(sum(timings) / len(timings) * 1000, 3),
+        },
+    }
+
+
+def run(args) -> Dict:
+    if args.image:
+        gray = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise SystemExit(f"이미지를 읽을 수 없습니다: {args.image}")
+    else:
+        gray = _synthetic_gray(args.width, args.height, args.seed)
+    edges = canny_edges(gray)
+    height, width = edges.shape
+
+    # 압축 형식이 손실 없이 되돌려지는지 확인
+    assert np.array_equal(unpack_edges(pack_edges(edges)) > 0, edges > 0)
+
+    def vector(render):
+        return lambda: render(edge_contours(edges, epsilon=args.epsilon), width, height)
+
+    formats = {
+        "png": lambda: bytes(encode_png(edges)),
+        "packbits": lambda: np.packbits(edges > 0).tobytes(),
+        "packed": lambda: pack_edges(edges),
+        "rle": lambda: rle_encode(edges),
+        "json": lambda: orjson.dumps(vector(contours_json)()),
+        "svg": lambda: vector(contours_svg)().encode(),
+    }
+    results = {name: measure(encode, args.iterations) for name, encode in formats.items()}
+    png_bytes = results["png"]["bytes"]
+    for result in results.values():
+        result["ratio_vs_png"] = round(png_bytes / max(1, result["bytes"]), 1)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "opencv": cv2.__version__},
+        "config": vars(args),
+        "image": {"width": width, "height": height, "edge_pixels": int(np.count_nonzero(edges))},
+        "contours": len(edge_contours(edges, epsilon=args.epsilon)),
+        "formats": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="윤곽선 저장/전송 형식별 크기와 인코딩 시간 비교")
+    parser.add_argument("--image", help="입력 이미지 경로 (없으면 합성 이미지)")
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--height", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--epsilon", type=float, default=1.5)
+    parser.add_argument("--iterations", type=int, default=20)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    report = run(parse_args(argv))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+if __name__ == "__main__":
+    main()
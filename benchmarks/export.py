@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# benchmarks/export.py
+"""
+관리자 내보내기 방식별 처리 시간과 최대 메모리 사용량 비교 벤치마크 (PostgreSQL 필요)
+
+- fetchall: 결과 전체를 dict 리스트로 가져온 뒤 NDJSON으로 변환 (기존 list_admin 방식)
+- cursor_ndjson / cursor_csv: 이름 있는 서버 측 커서에서 배치 단위로 읽어 변환 (controller.admin_export)
+- copy_csv: COPY (...) TO STDOUT으로 PostgreSQL이 만든 CSV를 그대로 전달
+
+테이블 없이 generate_series로 users 테이블과 같은 모양의 행을 만들어 사용합니다.
+최대 RSS는 프로세스 단위로만 측정할 수 있으므로 방식마다 별도 프로세스에서 실행합니다.
+
+실행 예:
+    python -m benchmarks.export --rows 2000000 --dsn "host=127.0.0.1 dbname=ai_photo_db user=postgres password=postgres"
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+from typing import Dict
+from config import config
+
+MODES = ("fetchall", "cursor_ndjson", "cursor_csv", "copy_csv")
+
+BENCH_QUERY = (
+    "SELECT g AS user_id, 'user' || g || '@example.com' AS email, (g % 500) AS credits, "
+    "now() - g * interval '1 second' AS created_at, NULL::timestamp AS last_login "
+    "FROM generate_series(1, {rows}) AS g"
+)
+
+
+def _max_rss_mb() -> float:
+    # Linux에서 ru_maxrss 단위는 KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_mode(args) -> Dict:
+    """한 가지 방식을 현재 프로세스에서 실행합니다 (--child)."""
+    config.PGSQL_TEST_DATABASE_STRING = args.dsn
+    config.PGSQL_TEST_POOL_MIN_SIZE = 1
+    config.PGSQL_TEST_POOL_MAX_SIZE = 1
+    import orjson
+    import psycopg
+    from model import admin_export
+    from model.pgsql_test import get_pool, close_pool
+    from controller.admin_export import _encode
+
+    admin_export.EXPORT_QUERIES["bench"] = BENCH_QUERY.format(rows=args.rows)
+    rss_before = _max_rss_mb()
+    total_bytes = 0
+    first_byte = None
+    start_time = time.perf_counter()
+
+    if args.mode == "fetchall":
+        with get_pool().connection() as conn:
+            cur = conn.cursor(row_factory=psycopg.rows.dict_row)
+            rows = cur.execute(admin_export.EXPORT_QUERIES["bench"]).fetchall()
+            body = b"".join(orjson.dumps(row, default=str) + b"\n" for row in rows)
+            first_byte = time.perf_counter() - start_time
+            total_bytes = len(body)
+    else:
+        if args.mode == "copy_csv":
+            chunks = admin_export.iter_query_csv("bench")
+        else:
+            fmt = "ndjson" if args.mode == "cursor_ndjson" else "csv"
+            chunks = _encode(admin_export.query_batches("bench", args.batch_size), "bench", fmt)
+        for chunk in chunks:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start_time
+            total_bytes += len(chunk)
+
+    elapsed = time.perf_counter() - start_time
+    close_pool()
+    return {
+        "seconds": round(elapsed, 3),
+        "time_to_first_chunk_ms": round((first_byte or elapsed) * 1000, 1),
+        "rows_per_second": round(args.rows / elapsed),
+        "body_mb": round(total_bytes / 1024 / 1024, 1),
+        "max_rss_mb": _max_rss_mb(),
+        "rss_growth_mb": round(_max_rss_mb() - rss_before, 1),
+    }
+
+
+def run(args) -> Dict:
+    results = {}
+    for mode in args.modes:
+        command = [
+            sys.executable, "-m", "benchmarks.export", "--child", "--mode", mode,
+            "--rows", str(args.rows), "--batch-size", str(args.batch_size), "--dsn", args.dsn,
+        ]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            results[mode] = {"error": output.stderr.strip().splitlines()[-1:]}
+        else:
+            results[mode] = json.loads(output.stdout)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {"rows": args.rows, "batch_size": args.batch_size, "modes": args.modes},
+        "modes": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="관리자 내보내기 방식별 처리 시간/메모리 비교")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dsn", default=config.PGSQL_TEST_DATABASE_STRING)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_mode(args) if args.child else run(args)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+if __name__ == "__main__":
+    main()
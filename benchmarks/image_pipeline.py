@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# benchmarks/image_pipeline.py
+"""
+배경 제거 요청 한 건의 디스크 I/O와 메모리 사용량을 이전 방식과 비교하는 벤치마크
+
+- disk: 업로드를 먼저 디스크에 쓰고, 결과를 쓴 뒤, 윤곽선 추출에서 원본을 cv2.imread로 다시 읽는 이전 방식
+- buffer: 메모리의 바이트를 단계 사이에 그대로 전달하고(cv2.imdecode, 그레이스케일 디코딩),
+  원본/결과는 처리가 끝난 뒤 비동기로 한 번씩 기록하는 현재 방식 (controller.image_pipeline)
+
+Remove.bg 호출은 제외하고 응답 PNG를 미리 만들어 사용합니다.
+요청당 read/write 시스템 호출 수와 바이트 수(/proc/self/io), Python 메모리 할당 최대치(tracemalloc),
+지연 시간을 JSON으로 출력합니다 (Linux 전용).
+
+실행 예:
+    python -m benchmarks.image_pipeline --iterations 50 --width 2000 --height 1500
+"""
+import io
+import os
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from typing import Callable, Dict
+import cv2
+from PIL import Image as PILImage
+from controller.image_pipeline import canny_edges, decode_image, encode_png, write_file, write_files
+from benchmarks.load_test import _percentile
+
+
+def _read_proc_io() -> Dict[str, int]:
+    with open("/proc/self/io") as f:
+        return {key: int(value) for key, value in (line.split(": ") for line in f.read().splitlines())}
+
+
+def _sample_jpeg(width: int, height: int) -> bytes:
+    image = PILImage.radial_gradient("L").resize((width, height)).convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def _sample_png(width: int, height: int) -> bytes:
+    image = PILImage.new("RGBA", (width, height), (0, 0, 0, 0))
+    image.paste((200, 80, 40, 255), (width // 4, height // 4, width * 3 // 4, height * 3 // 4))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def disk_pipeline(directory: str, index: int, upload: bytes, cutout: bytes):
+    input_path = os.path.join(directory, f"{index}.jpg")
+    output_path = os.path.join(directory, f"{index}_nobg.png")
+    edge_path = os.path.join(directory, f"{index}_edge.png")
+
+    with open(input_path, "wb") as buffer:
+        buffer.write(upload)
+    # 업스트림 전송을 위해 저장된 업로드를 다시 읽음
+    with open(input_path, "rb") as f:
+        f.read()
+    with open(output_path, "wb") as out:
+        out.write(cutout)
+
+    image = cv2.imread(input_path)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    cv2.imwrite(edge_path, canny_edges(gray))
+
+
+def buffer_pipeline(directory: str, index: int, upload: bytes, cutout: bytes):
+    input_path = os.path.join(directory, f"{index}.jpg")
+    output_path = os.path.join(directory, f"{index}_nobg.png")
+    edge_path = os.path.join(directory, f"{index}_edge.png")
+
+    asyncio.run(write_files([(input_path, upload), (output_path, cutout)]))
+
+    gray = decode_image(upload, cv2.IMREAD_GRAYSCALE)
+    write_file(edge_path, encode_png(canny_edges(gray)))
+
+
+def measure(pipeline: Callable, args, upload: bytes, cutout: bytes) -> Dict:
+    latencies = []
+    peaks = []
+    with tempfile.TemporaryDirectory(prefix="pipeline_") as directory:
+        for index in range(args.warmup):
+            pipeline(directory, -index - 1, upload, cutout)
+
+        io_before = _read_proc_io()
+        for index in range(args.iterations):
+            tracemalloc.start()
+            start_time = time.perf_counter()
+            pipeline(directory, index, upload, cutout)
+            latencies.append(time.perf_counter() - start_time)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        io_after = _read_proc_io()
+
+    per_request = {key: round((io_after[key] - io_before[key]) / args.iterations, 1)
+                   for key in ("syscr", "syscw", "rchar", "wchar", "read_bytes", "write_bytes")}
+    latencies.sort()
+    return {
+        "io_per_request": per_request,
+        "python_alloc_peak_kb": round(max(peaks) / 1024, 1),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 2),
+            "p95": round(_percentile(latencies, 95) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+        },
+    }
+
+
+def run(args) -> Dict:
+    upload = _sample_jpeg(args.width, args.height)
+    cutout = _sample_png(args.width, args.height)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": vars(args),
+        "upload_bytes": len(upload),
+        "cutout_bytes": len(cutout),
+        "pipelines": {
+            "disk": measure(disk_pipeline, args, upload, cutout),
+            "buffer": measure(buffer_pipeline, args, upload, cutout),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="디스크 왕복 방식과 메모리 버퍼 방식의 I/O 비교")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--height", type=int, default=1500)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    report = run(parse_args(argv))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# benchmarks/load_test.py
+"""
+로컬 업스트림 스텁을 대상으로 API 서버의 처리량과 지연 시간을 측정하는 벤치마크
+
+Remove.bg, BRIA, S3 스텁 서버와 API 서버를 각각 별도 프로세스로 띄운 뒤
+각 엔드포인트에 지정된 동시성으로 요청을 보내고 결과를 JSON으로 출력합니다.
+실제 API 키나 AWS 자격 증명이 필요하지 않습니다.
+
+실행 예:
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --latency-ms 150 --output bench.json
+    python -m benchmarks.load_test --endpoints replace_bg --app-workers 4 --error-rate 0.05
+    python -m benchmarks.load_test --server gunicorn --app-workers 4
+"""
+import os
+import io
+import sys
+import json
+import time
+import base64
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+import httpx
+from PIL import Image as PILImage
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ["background_remove", "replace_bg", "remove_and_generate", "background_bg_save", "background_bg_save_binary"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _sample_image(width: int, height: int, fmt: str) -> bytes:
+    image = PILImage.radial_gradient("L").resize((width, height)).convert("RGB")
+    if fmt == "PNG":
+        image = image.convert("RGBA")
+    output = io.BytesIO()
+    image.save(output, format=fmt, quality=90)
+    return output.getvalue()
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """프로세스와 모든 자식 프로세스(워커)의 RSS 합계 (Linux 전용)"""
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            pending.extend(_children(current))
+    except OSError:
+        return None
+    return total
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def _request_factory(endpoint: str, args):
+    """엔드포인트별 요청 인자를 만드는 함수를 반환합니다."""
+    if endpoint == "background_remove":
+        photo = _sample_image(args.image_width, args.image_height, "JPEG")
+        return lambda: ("POST", "/api/background/remove", {"files": {"file": ("photo.jpg", photo, "image/jpeg")}})
+    if endpoint == "replace_bg":
+        cutout = _sample_image(args.image_width // 2, args.image_height // 2, "PNG")
+        return lambda: ("POST", "/api/replace-bg", {
+            "files": {"file": ("cutout.png", cutout, "image/png")},
+            "data": {"bg_prompt": "benchmark scenery", "num_results": str(args.num_results)},
+        })
+    if endpoint == "remove_and_generate":
+        photo = _sample_image(args.image_width, args.image_height, "JPEG")
+        return lambda: ("POST", "/api/remove-and-generate", {
+            "files": {"file": ("photo.jpg", photo, "image/jpeg")},
+            "data": {"bg_prompt": "benchmark scenery", "num_results": str(args.num_results)},
+        })
+    if endpoint == "background_bg_save":
+        cutout = _sample_image(args.image_width // 2, args.image_height // 2, "PNG")
+        payload = {"imageData": "data:image/png;base64," + base64.b64encode(cutout).decode()}
+        return lambda: ("POST", "/api/backgroundBG/save", {"json": payload})
+    if endpoint == "background_bg_save_binary":
+        cutout = _sample_image(args.image_width // 2, args.image_height // 2, "PNG")
+        return lambda: ("POST", "/api/backgroundBG/save-binary", {
+            "content": cutout, "headers": {"content-type": "image/png"},
+        })
+    raise ValueError(f"알 수 없는 엔드포인트: {endpoint}")
+
+
+async def _run_endpoint(client: httpx.AsyncClient, endpoint: str, args, app_pid: Optional[int]) -> Dict:
+    make_request = _request_factory(endpoint, args)
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    rss_samples: List[int] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_request(record: bool):
+        method, path, kwargs = make_request()
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start_time
+        if record:
+            latencies.append(elapsed)
+            status_codes[status] = status_codes.get(status, 0) + 1
+
+    async def sample_rss(stop: asyncio.Event):
+        while not stop.is_set():
+            rss = _rss_bytes(app_pid) if app_pid else None
+            if rss is not None:
+                rss_samples.append(rss)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=0.1)
+            except asyncio.TimeoutError:
+                pass
+
+    # 워밍업 (결과에 포함하지 않음)
+    await asyncio.gather(*(one_request(False) for _ in range(args.warmup)))
+
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(stop))
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one_request(True) for _ in range(args.requests)))
+    wall_time = time.perf_counter() - start_time
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    errors = sum(count for status, count in status_codes.items() if not status.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": status_codes,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 2),
+            "p95": round(_percentile(latencies, 95) * 1000, 2),
+            "p99": round(_percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "rss_mb": {
+            "max": round(max(rss_samples) / 2 ** 20, 1) if rss_samples else None,
+            "mean": round(sum(rss_samples) / len(rss_samples) / 2 ** 20, 1) if rss_samples else None,
+        },
+    }
+
+
+def _start_process(command: List[str], env: dict, cwd: str, log_path: str) -> subprocess.Popen:
+    log_file = open(log_path, "wb")
+    return subprocess.Popen(command, env=env, cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"서버가 응답하지 않습니다: {url}")
+
+
+def start_servers(args, workdir: str):
+    """스텁 서버와 API 서버를 시작하고 (API 주소, 프로세스 목록)을 반환합니다."""
+    stub_port = _free_port()
+    app_port = _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+
+    base_env = dict(os.environ)
+    base_env["PYTHONPATH"] = REPO_ROOT + os.pathsep + base_env.get("PYTHONPATH", "")
+
+    stub_env = dict(base_env)
+    stub_env.update({
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_ERROR_RATE": str(args.error_rate),
+        "STUB_PUBLIC_URL": stub_url,
+    })
+    stub = _start_process(
+        [sys.executable, "-m", "uvicorn", "benchmarks.upstream_stubs:app", "--port", str(stub_port), "--log-level", "warning"],
+        stub_env, REPO_ROOT, os.path.join(workdir, "stub.log"),
+    )
+    _wait_ready(f"{stub_url}/bria/images/0.png")
+
+    app_env = dict(base_env)
+    app_env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "REMOVE_BG_API_URL": f"{stub_url}/removebg",
+        "BRIA_API_URL": f"{stub_url}/bria/replace",
+        "S3_ENDPOINT_URL": stub_url,
+        "REMOVE_BG_API_KEY": "benchmark",
+        "BRIA_API_TOKEN": "benchmark",
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "LOG_LEVEL": "WARNING",
+        "TRACING_EXPORTER": "none",
+        # 처리량 측정이 목적이므로 요청 제한과 보존 정책 작업은 끔
+        "RATE_LIMIT_ENABLED": "false",
+        "RETENTION_ENABLED": "false",
+    })
+    if args.server == "gunicorn":
+        app_env.update({"WEB_CONCURRENCY": str(args.app_workers), "BIND": f"127.0.0.1:{app_port}"})
+        command = [sys.executable, "-m", "gunicorn", "main:app",
+                   "-c", os.path.join(REPO_ROOT, "gunicorn.conf.py")]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", REPO_ROOT, "--port", str(app_port),
+                   "--workers", str(args.app_workers), "--log-level", "warning"]
+    app = _start_process(command, app_env, workdir, os.path.join(workdir, "app.log"))
+    app_url = f"http://127.0.0.1:{app_port}"
+    _wait_ready(f"{app_url}/api/health")
+    return app_url, [app, stub]
+
+
+async def run_benchmark(args, app_url: str, app_pid: Optional[int]) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        results = {}
+        for endpoint in args.endpoints:
+            results[endpoint] = await _run_endpoint(client, endpoint, args, app_pid)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="API 서버 부하 테스트 (로컬 업스트림 스텁 사용)")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--requests", type=int, default=100, help="엔드포인트별 요청 수")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="스텁 업스트림 지연 시간")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="스텁 업스트림 오류율")
+    parser.add_argument("--num-results", type=int, default=4)
+    parser.add_argument("--image-width", type=int, default=1600)
+    parser.add_argument("--image-height", type=int, default=1200)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn",
+                        help="API 서버 실행 방식 (gunicorn은 gunicorn.conf.py 사용)")
+    parser.add_argument("--app-url", default="", help="이미 실행 중인 서버를 대상으로 할 때 지정 (스텁/서버 자동 실행 생략)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default="", help="결과 JSON 파일 경로 (기본값: 표준 출력)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        if args.app_url:
+            app_url, app_pid = args.app_url, None
+        else:
+            app_url, processes = start_servers(args, workdir)
+            app_pid = processes[0].pid
+
+        results = asyncio.run(run_benchmark(args, app_url, app_pid))
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "config": {
+                key: value for key, value in vars(args).items() if key not in ("output",)
+            },
+            "endpoints": results,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(output)
+        else:
+            print(output)
+        return report
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# benchmarks/priority_scheduler.py
+"""
+업스트림 우선순위 게이트(WFQ)의 등급별 대기 시간을 측정하는 벤치마크
+
+업스트림 호출 대신 지정된 시간만큼 대기하는 작업을 요청 처리 경로와 같이 이벤트 루프에서 실행하여,
+낮은 등급의 요청이 몰린 상태에서 paid 요청의 대기 시간이 얼마나 유지되는지 확인합니다.
+--no-priority를 지정하면 모든 요청을 같은 등급으로 처리하여 비교할 수 있습니다.
+
+실행 예:
+    python -m benchmarks.priority_scheduler --limit 4 --anonymous 200 --free 100 --paid 20
+    python -m benchmarks.priority_scheduler --no-priority
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Dict, List
+from controller.upstream_gate import ConcurrencyGate, UpstreamBusyError, _parse_weights, PRIORITY_WEIGHTS
+from benchmarks.load_test import _percentile
+
+
+async def _run(args) -> Dict:
+    weights = _parse_weights(args.weights)
+    gate = ConcurrencyGate("benchmark", args.limit, args.queue_size, args.timeout, weights=weights, max_wait=args.max_wait)
+    latencies: Dict[str, List[float]] = {"paid": [], "free": [], "anonymous": []}
+    rejected: Dict[str, int] = {tier: 0 for tier in latencies}
+
+    async def worker(tier: str, flow: str, delay: float):
+        await asyncio.sleep(delay)
+        start_time = time.monotonic()
+        try:
+            async with gate.slot_async("anonymous" if args.no_priority else tier, flow):
+                waited = time.monotonic() - start_time
+                await asyncio.sleep(args.service_ms / 1000 * random.uniform(0.5, 1.5))
+        except UpstreamBusyError:
+            rejected[tier] += 1
+            return
+        latencies[tier].append(waited)
+
+    workers = []
+    counts = {"anonymous": args.anonymous, "free": args.free, "paid": args.paid}
+    for tier, count in counts.items():
+        users = max(1, count // 10)
+        for i in range(count):
+            # 요청이 burst초 동안 고르게 도착
+            delay = random.uniform(0, args.burst)
+            workers.append(worker(tier, f"{tier}{i % users}", delay))
+    random.shuffle(workers)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*workers)
+    wall_time = time.perf_counter() - start_time
+
+    report = {}
+    for tier, values in latencies.items():
+        values.sort()
+        report[tier] = {
+            "completed": len(values),
+            "rejected": rejected[tier],
+            "wait_ms": {
+                "p50": round(_percentile(values, 50) * 1000, 1),
+                "p95": round(_percentile(values, 95) * 1000, 1),
+                "p99": round(_percentile(values, 99) * 1000, 1),
+            },
+        }
+    return {"config": vars(args), "wall_time_s": round(wall_time, 2), "tiers": report}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="업스트림 우선순위 게이트 벤치마크")
+    parser.add_argument("--limit", type=int, default=4, help="동시 실행 수")
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-wait", type=float, default=5.0, help="기아 방지 대기 시간 (초)")
+    parser.add_argument("--weights", default=PRIORITY_WEIGHTS)
+    parser.add_argument("--service-ms", type=float, default=50.0, help="호출 1건의 평균 처리 시간")
+    parser.add_argument("--burst", type=float, default=1.0, help="요청이 도착하는 기간 (초)")
+    parser.add_argument("--anonymous", type=int, default=200)
+    parser.add_argument("--free", type=int, default=100)
+    parser.add_argument("--paid", type=int, default=20)
+    parser.add_argument("--no-priority", action="store_true", help="모든 요청을 같은 등급으로 처리")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    report = asyncio.run(_run(parse_args(argv)))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+if __name__ == "__main__":
+    main()
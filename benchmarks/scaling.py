@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# benchmarks/scaling.py
+"""
+워커 수에 따른 처리량 변화를 측정하는 벤치마크
+
+워커 수마다 API 서버를 새로 띄워 benchmarks.load_test를 실행하고,
+워커 1개 대비 처리량 배율과 확장 효율(배율 / 워커 수)을 출력합니다.
+동시성은 워커 수에 비례하여 늘리므로 워커당 부하는 같게 유지됩니다.
+이미지 정규화 등 CPU 작업이 있는 엔드포인트는 CPU 코어 수까지 선형에 가깝게 늘어나야 합니다.
+
+실행 예:
+    python -m benchmarks.scaling --workers 1 2 4 --endpoints background_remove
+    python -m benchmarks.scaling --server uvicorn --requests-per-worker 100 --output scaling.json
+"""
+import os
+import json
+import time
+import argparse
+import platform
+from typing import Dict, List
+from benchmarks import load_test
+
+
+def run(args) -> Dict:
+    runs: List[Dict] = []
+    for workers in args.workers:
+        load_args = [
+            "--server", args.server,
+            "--app-workers", str(workers),
+            "--concurrency", str(args.concurrency_per_worker * workers),
+            "--requests", str(args.requests_per_worker * workers),
+            "--warmup", str(args.warmup * workers),
+            "--latency-ms", str(args.latency_ms),
+            "--image-width", str(args.image_width),
+            "--image-height", str(args.image_height),
+            "--endpoints", *args.endpoints,
+        ]
+        report = load_test.main(load_args + ["--output", os.devnull])
+        runs.append({"workers": workers, "endpoints": report["endpoints"]})
+
+    results: Dict[str, List[Dict]] = {}
+    for endpoint in args.endpoints:
+        baseline = runs[0]["endpoints"][endpoint]["throughput_rps"] / args.workers[0]
+        rows = []
+        for run_result in runs:
+            workers = run_result["workers"]
+            stats = run_result["endpoints"][endpoint]
+            speedup = stats["throughput_rps"] / baseline if baseline else 0.0
+            rows.append({
+                "workers": workers,
+                "throughput_rps": stats["throughput_rps"],
+                "p95_ms": stats["latency_ms"]["p95"],
+                "errors": stats["errors"],
+                "speedup": round(speedup, 2),
+                "efficiency": round(speedup / workers, 2),
+            })
+        results[endpoint] = rows
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "endpoints": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="워커 수에 따른 처리량 확장성 측정")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="gunicorn")
+    parser.add_argument("--endpoints", nargs="+", default=["background_remove"], choices=load_test.ENDPOINTS)
+    parser.add_argument("--requests-per-worker", type=int, default=100)
+    parser.add_argument("--concurrency-per-worker", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5, help="워커당 워밍업 요청 수")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="스텁 업스트림 지연 시간")
+    parser.add_argument("--image-width", type=int, default=1600)
+    parser.add_argument("--image-height", type=int, default=1200)
+    parser.add_argument("--output", default="", help="결과 JSON 파일 경로 (기본값: 표준 출력)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# benchmarks/serialization.py
+"""
+배경 생성 결과 응답의 직렬화 시간과 전송 크기를 측정하는 벤치마크
+
+BRIA 응답 형태의 결과(num_results개)를 만들어
+- 표준 json 인코더(JSONResponse)와 orjson(ORJSONResponse)의 직렬화 시간
+- full/compact 응답 형식별 본문 크기와 압축(gzip, brotli) 후 크기 및 압축 시간
+을 비교하여 JSON으로 출력합니다.
+
+실행 예:
+    python -m benchmarks.serialization --num-results 10 --iterations 2000
+"""
+import json
+import time
+import uuid
+import argparse
+import platform
+from typing import Callable, Dict
+from fastapi.responses import JSONResponse, ORJSONResponse
+from controller.compression import available_encodings, compress
+from controller.responses import format_bria_response
+
+
+def sample_content(num_results: int) -> Dict:
+    """replace-bg 응답과 같은 구조의 결과를 만듭니다."""
+    request_id = str(uuid.uuid4())
+    result = [
+        [
+            f"https://d1ei2xrl63k822.cloudfront.net/api/res/{uuid.uuid4()}.png?Expires=1700000000"
+            f"&Signature={uuid.uuid4().hex * 4}&Key-Pair-Id=K2UBN6J3P2VY4O",
+            1000000 + index,
+            str(uuid.uuid4()),
+        ]
+        for index in range(num_results)
+    ]
+    return {
+        "status": "success",
+        "original_url": f"https://briadownload.s3.ap-northeast-2.amazonaws.com/{request_id}_photo_nobg.png",
+        "bria_results": {"result": result, "metadata": {"request_id": request_id, "prompt": "beautiful natural scenery"}},
+        "result_count": num_results,
+        "request_prompt": "beautiful natural scenery",
+        "request_id": request_id,
+        "normalization": {
+            "original_bytes": 4813220, "normalized_bytes": 912331,
+            "original_size": [4032, 3024], "normalized_size": [2048, 1536], "exif_rotated": True,
+        },
+    }
+
+
+def _time_per_call(func: Callable[[], bytes], iterations: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start_time) / iterations * 1e6
+
+
+def run(args) -> Dict:
+    content = sample_content(args.num_results)
+    payloads = {
+        "full": content,
+        "compact": format_bria_response(content, "compact"),
+    }
+
+    serializers = {"json": JSONResponse, "orjson": ORJSONResponse}
+    serialization = {}
+    for name, response_class in serializers.items():
+        # 응답 객체 생성 비용은 제외하고 render만 측정
+        renderer = response_class(content={})
+        serialization[name] = {
+            response_format: round(_time_per_call(lambda p=payload: renderer.render(p), args.iterations), 2)
+            for response_format, payload in payloads.items()
+        }
+
+    wire = {}
+    for response_format, payload in payloads.items():
+        body = ORJSONResponse(content={}).render(payload)
+        sizes = {"identity": {"bytes": len(body), "compress_us": 0.0}}
+        for encoding in available_encodings():
+            sizes[encoding] = {
+                "bytes": len(compress(body, encoding)),
+                "compress_us": round(_time_per_call(lambda b=body, e=encoding: compress(b, e), args.iterations // 10 or 1), 2),
+            }
+        wire[response_format] = sizes
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": vars(args),
+        "serialize_us_per_response": serialization,
+        "bytes_on_wire": wire,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="응답 직렬화 시간 및 전송 크기 측정")
+    parser.add_argument("--num-results", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    report = run(parse_args(argv))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+if __name__ == "__main__":
+    main()
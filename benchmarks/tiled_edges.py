@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# benchmarks/tiled_edges.py
+"""
+대형 이미지 윤곽선 추출의 최대 메모리(RSS) 비교 벤치마크
+
+- full_jpeg: JPEG를 그레이스케일로 디코딩한 뒤 이미지 전체에 Canny 적용 (기존 방식)
+- tiled_jpeg: 그레이스케일 디코딩 후 겹치는 타일 단위로 Canny 적용, 밴드별로 압축 (controller.image_pipeline)
+- tiled_pgm: 바이너리 PGM을 메모리 매핑으로 필요한 행만 읽으며 타일 단위로 처리
+
+이미지 크기(메가픽셀)를 늘려 가며 방식별 최대 RSS를 기록합니다. 최대 RSS는 프로세스 단위로만 측정할 수 있으므로
+측정마다 별도 프로세스에서 실행합니다. 입력 파일은 행 단위로 만든 합성 이미지이며 생성 비용은 측정에 포함하지 않습니다.
+가장 작은 크기에서 타일 처리 결과가 전체 처리와 얼마나 같은지(agreement)도 함께 보고합니다.
+
+실행 예:
+    python -m benchmarks.tiled_edges --sizes 4 16 36 64 100 --memory-mb 64
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from typing import Dict
+import cv2
+import numpy as np
+
+MODES = ("full_jpeg", "tiled_jpeg", "tiled_pgm")
+# 파노라마 비율 (가로:세로)
+ASPECT = 3.0
+GENERATE_BAND_ROWS = 512
+
+
+def _max_rss_mb() -> float:
+    # Linux에서 ru_maxrss 단위는 KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _dimensions(megapixels: float):
+    height = int((megapixels * 1_000_000 / ASPECT) ** 0.5)
+    return int(height * ASPECT), height
+
+
+def _synthetic_band(width: int, y0: int, y1: int, seed: int) -> np.ndarray:
+    """도형 경계와 약한 노이즈가 섞인 합성 이미지의 [y0, y1) 행"""
+    x = np.arange(width, dtype=np.float32)
+    y = np.arange(y0, y1, dtype=np.float32)[:, None]
+    blobs = np.sign(np.sin(x / 97.0) * np.sin(y / 89.0) + 0.3 * np.sin((x + y) / 41.0))
+    band = 128 + 60 * blobs + 30 * np.sin(x / 400.0)
+    band += np.random.default_rng(seed + y0).normal(0, 6, band.shape)
+    return np.clip(band, 0, 255).astype(np.uint8)
+
+
+def generate(directory: str, megapixels: float, seed: int = 7) -> Dict[str, str]:
+    """PGM은 행 단위로 기록하고, JPEG는 PGM을 한 번 읽어 인코딩합니다 (별도 프로세스에서 실행)."""
+    width, height = _dimensions(megapixels)
+    pgm_path = os.path.join(directory, f"{megapixels:g}mp.pgm")
+    with open(pgm_path, "wb") as f:
+        f.write(f"P5\n{width} {height}\n255\n".encode())
+        for y0 in range(0, height, GENERATE_BAND_ROWS):
+            f.write(_synthetic_band(width, y0, min(height, y0 + GENERATE_BAND_ROWS), seed).tobytes())
+    jpeg_path = os.path.join(directory, f"{megapixels:g}mp.jpg")
+    cv2.imwrite(jpeg_path, cv2.imread(pgm_path, cv2.IMREAD_GRAYSCALE), [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return {"pgm": pgm_path, "jpeg": jpeg_path, "width": width, "height": height}
+
+
+def run_mode(args) -> Dict:
+    """한 가지 방식을 현재 프로세스에서 실행합니다 (--child)."""
+    from controller.image_pipeline import (
+        ArrayRaster, canny_edges, iter_edge_bands, open_raster, pack_edge_bands, pack_edges, tiled_canny_edges
+    )
+    memory_limit = args.memory_mb * 1024 * 1024
+    rss_before = _max_rss_mb()
+    start_time = time.perf_counter()
+
+    if args.mode == "agreement":
+        gray = cv2.imread(args.path, cv2.IMREAD_GRAYSCALE)
+        full = canny_edges(gray)
+        tiled = tiled_canny_edges(ArrayRaster(gray), memory_limit)
+        edge_pixels = int(np.count_nonzero(full))
+        differing = int(np.count_nonzero(full != tiled))
+        return {
+            "edge_pixels": edge_pixels,
+            "differing_pixels": differing,
+            "agreement": round(1 - differing / max(edge_pixels, 1), 5),
+        }
+
+    if args.mode == "full_jpeg":
+        gray = cv2.imread(args.path, cv2.IMREAD_GRAYSCALE)
+        width, height = gray.shape[1], gray.shape[0]
+        packed = pack_edges(canny_edges(gray))
+    else:
+        raster = open_raster(args.path)
+        width, height = raster.width, raster.height
+        packed = pack_edge_bands(width, height, iter_edge_bands(raster, memory_limit))
+        raster.close()
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        "seconds": round(elapsed, 3),
+        "megapixels_per_second": round(width * height / 1_000_000 / elapsed, 1),
+        "packed_kb": round(len(packed) / 1024, 1),
+        "max_rss_mb": _max_rss_mb(),
+        "rss_growth_mb": round(_max_rss_mb() - rss_before, 1),
+    }
+
+
+def _child(*extra) -> Dict:
+    command = [sys.executable, "-m", "benchmarks.tiled_edges", "--child", *extra]
+    output = subprocess.run(command, capture_output=True, text=True)
+    if output.returncode != 0:
+        return {"error": output.stderr.strip().splitlines()[-1:]}
+    return json.loads(output.stdout)
+
+
+def run(args) -> Dict:
+    directory = tempfile.mkdtemp(prefix="tiled_edges_")
+    results = {}
+    agreement = None
+    try:
+        for megapixels in args.sizes:
+            files = _child("--generate", "--megapixels", str(megapixels), "--path", directory)
+            if "error" in files:
+                results[f"{megapixels:g}mp"] = files
+                continue
+            entry = {"width": files["width"], "height": files["height"]}
+            for mode in args.modes:
+                path = files["pgm"] if mode == "tiled_pgm" else files["jpeg"]
+                entry[mode] = _child("--mode", mode, "--path", path, "--memory-mb", str(args.memory_mb))
+            if agreement is None:
+                agreement = _child("--mode", "agreement", "--path", files["jpeg"], "--memory-mb", str(args.memory_mb))
+            results[f"{megapixels:g}mp"] = entry
+            for path in (files["pgm"], files["jpeg"]):
+                os.remove(path)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "opencv": cv2.__version__},
+        "config": {"sizes_mp": args.sizes, "memory_mb": args.memory_mb, "modes": args.modes},
+        "agreement_smallest_size": agreement,
+        "sizes": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="대형 이미지 윤곽선 추출의 방식별 최대 메모리 비교")
+    parser.add_argument("--sizes", nargs="+", type=float, default=[4, 16, 36, 64, 100], help="이미지 크기 (메가픽셀)")
+    parser.add_argument("--memory-mb", type=int, default=64, help="타일 처리 메모리 한도 (EDGE_TILE_MEMORY_MB)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--mode", choices=MODES + ("agreement",), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--megapixels", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--generate", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child and args.generate:
+        report = generate(args.path, args.megapixels)
+    elif args.child:
+        report = run_mode(args)
+    else:
+        report = run(args)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+if __name__ == "__main__":
+    main()
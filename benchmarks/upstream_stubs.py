@@ -0,0 +1,110 @@
+# benchmarks/upstream_stubs.py
+"""
+Remove.bg, BRIA, S3를 흉내 내는 로컬 스텁 서버
+
+환경 변수로 지연 시간과 오류율을 주입할 수 있습니다.
+- STUB_LATENCY_MS: 모든 업스트림 공통 지연 시간 (기본값: 0)
+- STUB_REMOVE_BG_LATENCY_MS, STUB_BRIA_LATENCY_MS, STUB_S3_LATENCY_MS: 업스트림별 지연 시간
+- STUB_ERROR_RATE: 500 오류를 반환할 확률 (0.0 ~ 1.0)
+
+실행 예:
+    STUB_LATENCY_MS=200 python -m uvicorn benchmarks.upstream_stubs:app --port 9100
+"""
+import os
+import io
+import random
+import asyncio
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from PIL import Image as PILImage
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+STUB_PUBLIC_URL = os.getenv("STUB_PUBLIC_URL", "http://127.0.0.1:9100")
+
+app = FastAPI()
+
+# S3 스텁 저장소 (메모리)
+_objects = {}
+
+
+def _latency(upstream: str) -> float:
+    value = os.getenv(f"STUB_{upstream.upper()}_LATENCY_MS")
+    return (float(value) if value is not None else STUB_LATENCY_MS) / 1000
+
+
+def _should_fail() -> bool:
+    return STUB_ERROR_RATE > 0 and random.random() < STUB_ERROR_RATE
+
+
+def _cutout_png(size=(512, 512)) -> bytes:
+    image = PILImage.new("RGBA", size, (0, 0, 0, 0))
+    image.paste((200, 80, 40, 255), (size[0] // 4, size[1] // 4, size[0] * 3 // 4, size[1] * 3 // 4))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+CUTOUT_PNG = _cutout_png()
+
+
+@app.post("/removebg")
+async def remove_bg(request: Request):
+    body = await request.body()
+    await asyncio.sleep(_latency("remove_bg"))
+    if _should_fail():
+        return JSONResponse(status_code=500, content={"errors": [{"title": "stub error"}]})
+    if not body:
+        return JSONResponse(status_code=400, content={"errors": [{"title": "no image"}]})
+    return Response(content=CUTOUT_PNG, media_type="image/png")
+
+
+@app.post("/bria/replace")
+async def bria_replace(request: Request):
+    data = await request.json()
+    await asyncio.sleep(_latency("bria"))
+    if _should_fail():
+        return JSONResponse(status_code=500, content={"error": "stub error"})
+    num_results = int(data.get("num_results", 1))
+    results = [
+        [f"{STUB_PUBLIC_URL}/bria/images/{i}.png", random.randint(0, 2 ** 31), f"session-{i}"]
+        for i in range(num_results)
+    ]
+    return {"result": results}
+
+
+@app.get("/bria/images/{name}")
+async def bria_image(name: str):
+    return Response(content=CUTOUT_PNG, media_type="image/png")
+
+
+@app.put("/{bucket}/{key:path}")
+async def s3_put_object(bucket: str, key: str, request: Request):
+    body = await request.body()
+    await asyncio.sleep(_latency("s3"))
+    if _should_fail():
+        return Response(status_code=500, content=b"<Error><Code>InternalError</Code></Error>")
+    _objects[(bucket, key)] = (
+        body,
+        request.headers.get("content-type", "application/octet-stream"),
+        request.headers.get("cache-control", ""),
+    )
+    return Response(status_code=200, headers={"ETag": f'"{abs(hash(body)):x}"'})
+
+
+@app.head("/{bucket}/{key:path}")
+async def s3_head_object(bucket: str, key: str):
+    if (bucket, key) not in _objects:
+        return Response(status_code=404)
+    body, content_type, cache_control = _objects[(bucket, key)]
+    return Response(headers={"Content-Length": str(len(body)), "Content-Type": content_type, "Cache-Control": cache_control})
+
+
+@app.get("/{bucket}/{key:path}")
+async def s3_get_object(bucket: str, key: str):
+    # 서명 URL의 쿼리 파라미터(X-Amz-*)는 검증하지 않음
+    if (bucket, key) not in _objects:
+        return Response(status_code=404, content=b"<Error><Code>NoSuchKey</Code></Error>")
+    body, content_type, cache_control = _objects[(bucket, key)]
+    headers = {"Cache-Control": cache_control} if cache_control else None
+    return Response(content=body, media_type=content_type, headers=headers)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# bulk_process.py
+"""
+로컬 디렉토리 또는 S3 prefix 아래의 이미지를 일괄 처리하는 도구
+
+HTTP 서버를 거치지 않고 controller의 파이프라인을 직접 호출합니다.
+- generate: Remove.bg 배경 제거 → S3 업로드 → BRIA 배경 생성 (controller.background_replace.run_remove_and_generate)
+- edges: 윤곽선 추출만 실행 (controller.background_removal.detect_edges)
+  로컬 .npy, 바이너리 PGM/PPM은 메모리 매핑과 타일 처리를 그대로 사용합니다.
+
+중단 후 다시 실행하면 이어서 처리합니다.
+- 처리 결과를 매니페스트(JSONL)에 한 줄씩 기록하고 즉시 fsync
+- 같은 작업(모드, 프롬프트, 결과 개수)으로 이미 처리한 입력은 건너뜀
+  로컬 파일은 크기와 수정 시간이 바뀌었으면 내용(SHA-256)을 다시 비교하고, S3 객체는 키로 판단
+  경로가 달라도 내용이 같은 입력은 이전 결과를 그대로 기록
+- 실패한 입력은 다음 실행에서 다시 시도
+- 업스트림 포화(429)와 5xx 오류는 --retries 횟수만큼 대기 후 재시도
+
+실행 예:
+    python bulk_process.py ./photos --mode edges --concurrency 8
+    python bulk_process.py s3://my-bucket/incoming/ --mode generate --bg-prompt "sunny beach" --num-results 2
+    python bulk_process.py ./photos --mode generate --manifest photos.jsonl --limit 100
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+import itertools
+import mimetypes
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+# 실행 중인 서버가 /api/keys로 설정한 temp_keys.json을 환경변수 값으로 덮어쓰지 않도록 함
+# (controller.api_keys는 불러올 때 이 값이 없으면 임시 키 파일을 초기화함)
+os.environ.setdefault("API_KEYS_INITIALIZED", "1")
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from controller.background_removal import detect_edges, detect_edges_from_buffer
+from controller.background_replace import run_remove_and_generate
+from controller.responses import format_bria_response
+from controller.upstream import get_s3_object, list_s3_objects
+from controller.upstream_gate import UpstreamBusyError, upstream_slot_async
+from model.database import create_tables
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("bulk_process")
+
+MODES = ("generate", "edges")
+IMAGE_EXTENSIONS = {
+    "generate": (".jpg", ".jpeg", ".png", ".webp"),
+    # 윤곽선 추출은 메모리 매핑 가능한 원본 형식도 받음
+    "edges": (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff", ".pgm", ".ppm", ".npy"),
+}
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def _parse_s3_source(source: str) -> Optional[Tuple[str, str]]:
+    if not source.startswith("s3://"):
+        return None
+    bucket, _, prefix = source[len("s3://"):].partition("/")
+    return bucket, prefix
+
+
+def iter_sources(source: str, mode: str) -> Iterator[str]:
+    """
+    처리할 입력을 정렬된 순서로 하나씩 반환합니다 (로컬 경로 또는 s3://bucket/key).
+    전체 목록을 메모리에 만들지 않습니다 (S3 목록은 이미 키 순서로 정렬되어 옴).
+    """
+    extensions = IMAGE_EXTENSIONS[mode]
+    s3_source = _parse_s3_source(source)
+    if s3_source:
+        bucket, prefix = s3_source
+        for key, _ in list_s3_objects(bucket, prefix):
+            if key.lower().endswith(extensions):
+                yield f"s3://{bucket}/{key}"
+        return
+    for root, dirs, files in os.walk(os.path.abspath(source)):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if not name.startswith(".") and name.lower().endswith(extensions):
+                yield os.path.join(root, name)
+
+
+def _limited_sources(args) -> Iterator[str]:
+    sources = iter_sources(args.source, args.mode)
+    return itertools.islice(sources, args.limit) if args.limit else sources
+
+
+def _file_state(source: str) -> dict:
+    """로컬 파일의 크기와 수정 시간 (바뀌지 않았으면 다시 해시하지 않고 건너뛰기 위해 기록)"""
+    if _parse_s3_source(source):
+        return {}
+    stat = os.stat(source)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    처리 결과를 한 줄씩 기록하는 JSONL 매니페스트
+
+    각 줄은 기록 직후 fsync되므로 프로세스가 중단되어도 완료된 입력은 남습니다.
+    중단 시점에 잘린 마지막 줄은 읽을 때 무시합니다.
+    """
+
+    def __init__(self, path: str, job: str):
+        self.path = path
+        self.job = job
+        self.done_sources: Dict[str, dict] = {}
+        self.done_hashes: Dict[str, dict] = {}
+        if os.path.exists(path):
+            self._load()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # 잘린 줄 뒤에 이어 쓰지 않도록 줄을 바꿈
+            self._file.write("\n")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("job") != self.job or record.get("status") != "done":
+                    continue
+                self.done_sources[record["source"]] = record
+                self.done_hashes[record["sha256"]] = record
+
+    def append(self, record: dict):
+        record = {"job": self.job, **record, "finished_at": datetime.now(timezone.utc).isoformat()}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if record["status"] == "done":
+            self.done_sources[record["source"]] = record
+            self.done_hashes[record["sha256"]] = record
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    """
+    처리량과 남은 시간(ETA)을 계산합니다. 건너뛴 입력은 처리량 계산에서 제외합니다.
+    전체 입력 수는 처리와 함께 따로 세므로, 세기 전에는 total이 None이고 ETA를 표시하지 않습니다.
+    """
+
+    def __init__(self, total: Optional[int] = None):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.start_time = time.perf_counter()
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.start_time
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        finished = self.done + self.skipped + self.failed
+        eta = f"{(self.total - finished) / rate:.0f}초" if rate > 0 and self.total is not None else "-"
+        return (
+            f"{finished}/{self.total if self.total is not None else '?'} "
+            f"(완료 {self.done}, 건너뜀 {self.skipped}, 실패 {self.failed}) "
+            f"{rate:.2f}개/초, 남은 시간 {eta}"
+        )
+
+
+class BulkProcessor:
+    def __init__(self, args, manifest: Manifest, progress: Progress):
+        self.args = args
+        self.manifest = manifest
+        self.progress = progress
+        # 처리 중인 내용 해시 (같은 내용의 입력이 동시에 들어오면 하나만 처리)
+        self.in_flight: Dict[str, asyncio.Event] = {}
+
+    def _unchanged(self, source: str, record: dict, state: dict) -> bool:
+        """매니페스트에 완료로 기록된 입력이 그 뒤로 바뀌지 않았는지 확인합니다 (해시 없이 판단할 수 있는 경우)."""
+        if _parse_s3_source(source):
+            return True
+        return bool(state) and all(record.get(name) == value for name, value in state.items())
+
+    async def _load(self, source: str) -> Tuple[Optional[bytes], str]:
+        """입력을 읽고 내용 해시를 계산합니다. 로컬 윤곽선 추출은 파일을 메모리로 읽지 않습니다."""
+        s3_source = _parse_s3_source(source)
+        if s3_source:
+            async with upstream_slot_async("s3"):
+                data = await run_in_threadpool(get_s3_object, *s3_source)
+            return data, hashlib.sha256(data).hexdigest()
+        if self.args.mode == "edges":
+            return None, await run_in_threadpool(_hash_file, source)
+        with open(source, "rb") as f:
+            data = f.read()
+        return data, hashlib.sha256(data).hexdigest()
+
+    async def _run(self, source: str, data: Optional[bytes], sha256: str) -> dict:
+        # 같은 내용이면 같은 file_id/request_id가 되도록 해시에서 만듦
+        file_id = sha256[:32]
+        if self.args.mode == "edges":
+            if data is None:
+                path = await run_in_threadpool(detect_edges, source, file_id)
+            else:
+                path = await run_in_threadpool(detect_edges_from_buffer, data, file_id)
+            if path is None:
+                raise ValueError("윤곽선 추출 실패")
+            return {"file_id": file_id, "edge_path": path}
+
+        filename = os.path.basename(source)
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        content = await run_remove_and_generate(
+            data, filename, content_type, self.args.bg_prompt, self.args.num_results,
+            request_id=file_id, user_id=self.args.user_id
+        )
+        compact = format_bria_response(content, "compact")
+        return {"request_id": file_id, "original_url": compact["original_url"], "result_urls": compact["result_urls"]}
+
+    async def _run_with_retries(self, source: str, data: Optional[bytes], sha256: str) -> dict:
+        for attempt in range(self.args.retries + 1):
+            try:
+                return await self._run(source, data, sha256)
+            except HTTPException as e:
+                retryable = isinstance(e, UpstreamBusyError) or e.status_code == 429 or e.status_code >= 500
+                if not retryable or attempt == self.args.retries:
+                    raise
+                retry_after = (e.headers or {}).get("Retry-After")
+                delay = float(retry_after) if retry_after else 2 ** attempt
+                logger.warning("재시도 대기 %.0f초 (%s, HTTP %d)", delay, source, e.status_code)
+                await asyncio.sleep(delay)
+
+    async def process(self, source: str):
+        record = self.manifest.done_sources.get(source)
+        try:
+            state = _file_state(source)
+            if record and self._unchanged(source, record, state):
+                self.progress.skipped += 1
+                return
+            data, sha256 = await self._load(source)
+        except Exception as e:
+            logger.error("입력 읽기 실패: %s (%s)", source, e)
+            self.manifest.append({"source": source, "sha256": None, "status": "failed", "error": str(e)})
+            self.progress.failed += 1
+            return
+
+        while sha256 in self.in_flight:
+            await self.in_flight[sha256].wait()
+        previous = self.manifest.done_hashes.get(sha256)
+        if previous:
+            # 내용이 같은 입력을 이미 처리함: 결과를 이 경로로도 기록해 다음 실행에서는 해시 계산도 생략
+            # (같은 경로의 수정 시간만 바뀐 경우도 여기서 새 상태를 기록)
+            duplicate = {"duplicate_of": previous["source"]} if previous["source"] != source else {}
+            self.manifest.append({"source": source, "sha256": sha256, "status": "done",
+                                  "result": previous.get("result"), **state, **duplicate})
+            self.progress.skipped += 1
+            return
+
+        self.in_flight[sha256] = asyncio.Event()
+        try:
+            result = await self._run_with_retries(source, data, sha256)
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error("처리 실패: %s (%s)", source, detail)
+            self.manifest.append({"source": source, "sha256": sha256, "status": "failed", "error": str(detail)})
+            self.progress.failed += 1
+            return
+        finally:
+            self.in_flight.pop(sha256).set()
+        self.manifest.append({"source": source, "sha256": sha256, "status": "done", "result": result, **state})
+        self.progress.done += 1
+
+
+async def _report_progress(progress: Progress, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info("진행: %s", progress.summary())
+
+
+async def _count_sources(args, progress: Progress):
+    """입력 목록을 따로 한 번 훑어 전체 개수를 셉니다 (ETA 계산용, 처리와 동시에 실행)."""
+    progress.total = await run_in_threadpool(lambda: sum(1 for _ in _limited_sources(args)))
+
+
+async def run(args) -> Progress:
+    job = args.mode if args.mode == "edges" else f"generate:{args.num_results}:{args.bg_prompt}"
+    manifest = Manifest(args.manifest, job)
+    progress = Progress()
+    logger.info("매니페스트에 완료 기록 %d개 (%s)", len(manifest.done_sources), args.manifest)
+
+    if args.mode == "generate":
+        # 배경 생성 결과는 images 테이블에도 기록됨
+        create_tables()
+
+    processor = BulkProcessor(args, manifest, progress)
+    # 워커 --concurrency개가 입력 생성기에서 하나씩 꺼내 처리 (대기 중인 입력을 미리 만들지 않음)
+    sources = _limited_sources(args)
+    sources_lock = asyncio.Lock()
+
+    async def next_source() -> Optional[str]:
+        # 디렉토리/S3 목록 조회는 블로킹이므로 스레드에서 실행 (생성기는 한 번에 한 워커만 진행)
+        async with sources_lock:
+            return await run_in_threadpool(next, sources, None)
+
+    async def worker():
+        while (source := await next_source()) is not None:
+            await processor.process(source)
+
+    counter = asyncio.create_task(_count_sources(args, progress))
+    reporter = asyncio.create_task(_report_progress(progress, args.progress_interval))
+    try:
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        # 모든 입력을 처리했으므로 개수 세기가 끝나지 않았어도 전체 개수를 알 수 있음
+        progress.total = progress.done + progress.skipped + progress.failed
+    finally:
+        reporter.cancel()
+        counter.cancel()
+        manifest.close()
+    logger.info("완료: %s", progress.summary())
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="디렉토리 또는 S3 prefix의 이미지를 일괄 처리합니다 (중단 후 이어서 실행 가능).")
+    parser.add_argument("source", help="로컬 디렉토리 또는 s3://bucket/prefix")
+    parser.add_argument("--mode", choices=MODES, default="generate")
+    parser.add_argument("--manifest", default="bulk_manifest.jsonl", help="진행 상황을 기록할 JSONL 파일")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 처리할 입력 수")
+    parser.add_argument("--bg-prompt", default="beautiful natural scenery")
+    parser.add_argument("--num-results", type=int, default=4, choices=range(1, 11), metavar="1-10")
+    parser.add_argument("--user-id", type=int, help="결과 이미지를 기록할 사용자 (generate)")
+    parser.add_argument("--retries", type=int, default=2, help="업스트림 429/5xx 오류 시 재시도 횟수")
+    parser.add_argument("--limit", type=int, help="앞에서부터 N개만 처리")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="진행 상황 출력 간격 (초)")
+    args = parser.parse_args(argv)
+
+    if not _parse_s3_source(args.source) and not os.path.isdir(args.source):
+        parser.error(f"디렉토리가 아닙니다: {args.source}")
+    progress = asyncio.run(run(args))
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
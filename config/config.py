@@ -2,6 +2,9 @@
 
 
 PGSQL_TEST_DATABASE_STRING = "host=127.0.0.1 dbname=ai_photo_db user=dany password=010691 port=5432"
+# 읽기 전용 복제본 (비어 있으면 읽기도 기본 DB 사용)
+PGSQL_TEST_REPLICA_STRING = ""
 PGSQL_TEST_POOL_MIN_SIZE = 10
 PGSQL_TEST_POOL_MAX_SIZE = 10
-PGSQL_TEST_POOL_MAX_IDLE = 60
\ No newline at end of file
+PGSQL_TEST_POOL_MAX_IDLE = 60
+PGSQL_TEST_POOL_TIMEOUT = 10
\ No newline at end of file
@@ -0,0 +1,24 @@
+# controller/admin_auth.py
+import os
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 관리용 엔드포인트 접근 토큰 (설정하지 않으면 관리용 엔드포인트 비활성화)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """관리자 토큰이 맞는지 확인합니다 (의존성을 쓸 수 없는 미들웨어용)."""
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """X-Admin-Token 헤더를 확인하는 의존성"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="관리용 엔드포인트가 비활성화되어 있습니다. (ADMIN_TOKEN 미설정)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="관리자 토큰이 올바르지 않습니다.")
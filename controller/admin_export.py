@@ -0,0 +1,138 @@
+# controller/admin_export.py
+import io
+import os
+import csv
+import time
+import logging
+from contextlib import AbstractContextManager
+from typing import Iterator, List, Optional, Tuple
+import orjson
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from dotenv import load_dotenv
+from controller.admin_auth import require_admin
+from controller.metrics import EXPORT_BYTES, EXPORT_ROWS
+from model.admin_export import EXPORT_QUERIES, admin_batches, iter_query_csv, query_batches
+from model.pgsql_test import close_pool
+
+# 로깅 설정
+logger = logging.getLogger("admin_export")
+
+load_dotenv()
+
+# 서버 측 커서에서 한 번에 가져올 행 수
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+router = APIRouter(prefix="/api/admin/export", tags=["관리자 내보내기"], dependencies=[Depends(require_admin)])
+
+
+def _encode_csv(columns: List[str], batches, header: bool = True) -> Iterator[Tuple[bytes, int]]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8"), len(rows)
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8"), 0
+
+
+def _encode_ndjson(columns: List[str], batches) -> Iterator[Tuple[bytes, int]]:
+    for rows in batches:
+        chunk = b"".join(
+            orjson.dumps(dict(zip(columns, row)), default=str) + b"\n" for row in rows
+        )
+        yield chunk, len(rows)
+
+
+def _encode(source: AbstractContextManager, export: str, fmt: str) -> Iterator[bytes]:
+    """커서의 배치를 요청한 형식으로 바꾸면서 지표를 기록합니다 (연결은 끝까지 읽거나 닫힐 때 반환)."""
+    with source as (columns, batches):
+        chunks = _encode_csv(columns, batches) if fmt == "csv" else _encode_ndjson(columns, batches)
+        for chunk, rows in chunks:
+            EXPORT_ROWS.labels(export, fmt).inc(rows)
+            EXPORT_BYTES.labels(export, fmt).inc(len(chunk))
+            yield chunk
+
+
+def _copy_csv(export: str) -> Iterator[bytes]:
+    for chunk in iter_query_csv(export):
+        EXPORT_BYTES.labels(export, "csv").inc(len(chunk))
+        yield chunk
+
+
+def _open_export(export: str, fmt: str, batch_size: int) -> Iterator[bytes]:
+    if export == "admins":
+        return _encode(admin_batches(batch_size), export, fmt)
+    if fmt == "csv":
+        # CSV는 PostgreSQL이 직접 만들도록 COPY 사용 (Python에서 행을 만들지 않음)
+        return _copy_csv(export)
+    return _encode(query_batches(export, batch_size), export, fmt)
+
+
+def _first_chunk(chunks: Iterator[bytes]) -> Optional[bytes]:
+    return next(chunks, None)
+
+
+def _stream(first: Optional[bytes], chunks: Iterator[bytes], export: str, start_time: float) -> Iterator[bytes]:
+    try:
+        if first is not None:
+            yield first
+        yield from chunks
+    finally:
+        # 클라이언트가 중간에 연결을 끊어도 커서와 연결을 정리
+        chunks.close()
+        logger.info("내보내기 종료", extra={"export": export, "duration": round(time.perf_counter() - start_time, 3)})
+
+
+@router.get("/{export}")
+async def export_rows(export: str, format: str = "csv", batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    관리자/리포트 쿼리 결과를 CSV 또는 NDJSON으로 스트리밍합니다.
+
+    - export: admins(sp_l_admin 프로시저) 또는 users, images, user_images
+    - format: csv(기본값) 또는 ndjson
+    - batch_size: 서버 측 커서에서 한 번에 가져올 행 수
+
+    결과 전체를 메모리에 올리지 않으므로 행 수와 관계없이 메모리 사용량이 일정합니다.
+    """
+    if export != "admins" and export not in EXPORT_QUERIES:
+        raise HTTPException(status_code=404, detail="알 수 없는 내보내기 대상입니다.")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format은 {', '.join(EXPORT_FORMATS)} 중 하나여야 합니다.")
+    batch_size = max(1, min(batch_size, 100_000))
+
+    start_time = time.perf_counter()
+    chunks = _open_export(export, format, batch_size)
+    # 응답 헤더를 보내기 전에 쿼리를 시작해 연결/쿼리 오류를 상태 코드로 반환
+    try:
+        first = await run_in_threadpool(_first_chunk, chunks)
+    except Exception as e:
+        chunks.close()
+        logger.error("내보내기 쿼리 실패", extra={"export": export, "error": str(e)})
+        raise HTTPException(status_code=503, detail=f"내보내기 쿼리 실패: {str(e)}")
+
+    filename = f"{export}-{time.strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        _stream(first, chunks, export, start_time),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+async def shutdown():
+    """내보내기용 연결 풀을 닫습니다."""
+    await run_in_threadpool(close_pool)
@@ -2,12 +2,14 @@ from fastapi import APIRouter, HTTPException, Body
 from fastapi.responses import JSONResponse
 import os
 import json
+import hashlib
+import threading
 from dotenv import load_dotenv
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import logging
+from controller.locks import file_lock
 
 # 로깅 설정
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("api_keys")
 
 # 환경 변수 로드
@@ -15,6 +17,11 @@ load_dotenv()
 
 # API 키 저장용 임시 파일 설정
 TEMP_KEYS_FILE = os.path.join(os.getcwd(), "temp_keys.json")
+TEMP_KEYS_LOCK = f"{TEMP_KEYS_FILE}.lock"
+KEY_NAMES = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "REMOVE_BG_API_KEY", "BRIA_API_TOKEN"]
+# 등록된 API 클라이언트 ("클라이언트 이름:키", 쉼표로 구분)
+# X-API-Client 헤더에 키를 보내면 요청 제한을 클라이언트 이름별로 적용
+API_CLIENT_KEYS = os.getenv("API_CLIENT_KEYS", "")
 
 # 라우터 설정
 router = APIRouter(prefix="/api/keys", tags=["API 키 관리"])
@@ -31,14 +38,74 @@ def initialize_temp_keys():
     
     # 임시 파일에 저장
     try:
-        with open(TEMP_KEYS_FILE, "w") as f:
-            json.dump(api_keys, f)
+        with file_lock(TEMP_KEYS_LOCK):
+            _write_keys(api_keys)
         logger.info("임시 API 키 파일 초기화됨")
     except Exception as e:
-        logger.error(f"임시 API 키 파일 초기화 실패: {str(e)}")
+        logger.error("임시 API 키 파일 초기화 실패: %s", e)
+
+
+def _write_keys(api_keys: Dict[str, str]):
+    """임시 파일에 쓴 뒤 교체하여 다른 워커가 쓰다 만 파일을 읽지 않도록 합니다."""
+    temp_path = f"{TEMP_KEYS_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(api_keys, f)
+    os.replace(temp_path, TEMP_KEYS_FILE)
+
+
+# 워커별 키 캐시 (파일 수정 시간이 바뀌면 다시 읽음)
+_cache_lock = threading.Lock()
+_cached_keys: Tuple[float, Dict[str, str]] = (-1.0, {})
+
+
+def get_api_key(name: str) -> str:
+    """
+    현재 API 키 값을 반환합니다.
+
+    /api/keys로 설정한 키는 모든 워커가 공유하는 임시 파일에 저장되므로,
+    다른 워커에서 바꾼 키도 파일 수정 시간을 확인하여 바로 반영합니다.
+    파일에 값이 없으면 환경변수 값을 사용합니다.
+    """
+    global _cached_keys
+    try:
+        mtime = os.stat(TEMP_KEYS_FILE).st_mtime
+    except OSError:
+        return os.getenv(name, "")
+    with _cache_lock:
+        if _cached_keys[0] != mtime:
+            try:
+                with open(TEMP_KEYS_FILE, "r") as f:
+                    _cached_keys = (mtime, json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning("임시 API 키 파일 읽기 실패: %s", e)
+        keys = _cached_keys[1]
+    return keys.get(name) or os.getenv(name, "")
+
+
+def _parse_client_keys(value: str) -> Dict[str, str]:
+    # 키 원문 대신 해시로 찾아 비교 시간으로 키를 추측할 수 없도록 함
+    clients = {}
+    for item in value.split(","):
+        name, _, key = item.strip().partition(":")
+        if name and key:
+            clients[hashlib.sha256(key.encode()).hexdigest()] = name
+    return clients
+
+
+_client_keys = _parse_client_keys(API_CLIENT_KEYS)
+
+
+def registered_client(key: str) -> Optional[str]:
+    """API_CLIENT_KEYS에 등록된 키이면 클라이언트 이름을, 아니면 None을 반환합니다."""
+    if not key:
+        return None
+    return _client_keys.get(hashlib.sha256(key.encode()).hexdigest())
+
 
 # 애플리케이션 시작 시 초기화
-initialize_temp_keys()
+# (gunicorn은 마스터 프로세스에서 한 번만 초기화하여 워커가 재시작될 때 설정한 키가 지워지지 않도록 함)
+if os.getenv("API_KEYS_INITIALIZED") != "1":
+    initialize_temp_keys()
 
 # API 키 가져오기 엔드포인트
 @router.get("")
@@ -71,7 +138,7 @@ async def get_api_keys():
         return {"keys": masked_keys}
     
     except Exception as e:
-        logger.error(f"API 키 조회 실패: {str(e)}")
+        logger.error("API 키 조회 실패: %s", e)
         raise HTTPException(status_code=500, detail=f"API 키 조회 실패: {str(e)}")
 
 # API 키 설정 엔드포인트
@@ -82,30 +149,30 @@ async def set_api_keys(keys: Dict[str, str] = Body(...)):
     임시 파일에 저장되며, 서버 재시작 시에는 .env 파일의 값으로 초기화됩니다.
     """
     try:
-        # 현재 키 읽기
-        current_keys = {}
-        if os.path.exists(TEMP_KEYS_FILE):
-            with open(TEMP_KEYS_FILE, "r") as f:
-                current_keys = json.load(f)
-        
-        # 새로 설정된 키만 업데이트
-        for key, value in keys.items():
-            if key in ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "REMOVE_BG_API_KEY", "BRIA_API_TOKEN"]:
-                current_keys[key] = value
-        
-        # 업데이트된 키를 파일에 저장
-        with open(TEMP_KEYS_FILE, "w") as f:
-            json.dump(current_keys, f)
+        # 다른 워커와 동시에 수정하지 않도록 잠금 안에서 읽고 저장
+        with file_lock(TEMP_KEYS_LOCK):
+            current_keys = {}
+            if os.path.exists(TEMP_KEYS_FILE):
+                with open(TEMP_KEYS_FILE, "r") as f:
+                    current_keys = json.load(f)
+
+            # 새로 설정된 키만 업데이트
+            for key, value in keys.items():
+                if key in KEY_NAMES:
+                    current_keys[key] = value
+
+            # 업데이트된 키를 파일에 저장
+            _write_keys(current_keys)
         
-        # 환경변수에도 임시로 설정
+        # 환경변수에도 임시로 설정 (다른 워커는 get_api_key로 파일에서 읽음)
         for key, value in current_keys.items():
             os.environ[key] = value
         
-        logger.info("API 키가 성공적으로 업데이트되었습니다.")
+        logger.info("API 키가 성공적으로 업데이트되었습니다.", extra={"updated_keys": sorted(k for k in keys if k in current_keys)})
         return {"status": "success", "message": "API 키가 성공적으로 설정되었습니다."}
     
     except Exception as e:
-        logger.error(f"API 키 설정 실패: {str(e)}")
+        logger.error("API 키 설정 실패: %s", e)
         raise HTTPException(status_code=500, detail=f"API 키 설정 실패: {str(e)}")
 
 # 특정 API 키 상태 확인 엔드포인트
@@ -114,9 +181,7 @@ async def check_api_key(key: str):
     """
     특정 API 키가 설정되어 있는지 확인합니다.
     """
-    allowed_keys = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "REMOVE_BG_API_KEY", "BRIA_API_TOKEN"]
-    
-    if key not in allowed_keys:
+    if key not in KEY_NAMES:
         raise HTTPException(status_code=400, detail=f"지원되지 않는 API 키입니다: {key}")
     
     try:
@@ -133,5 +198,5 @@ async def check_api_key(key: str):
         return {"key": key, "is_set": bool(value)}
     
     except Exception as e:
-        logger.error(f"API 키 상태 확인 실패: {str(e)}")
+        logger.error("API 키 상태 확인 실패: %s", e)
         raise HTTPException(status_code=500, detail=f"API 키 상태 확인 실패: {str(e)}") 
\ No newline at end of file
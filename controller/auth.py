@@ -0,0 +1,306 @@
+# controller/auth.py
+import os
+import time
+import secrets
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from model.database import get_db, get_read_db, User
+from controller.metrics import USER_CACHE_LOOKUPS
+
+# 로깅 설정
+logger = logging.getLogger("auth")
+
+load_dotenv()
+
+# JWT 서명 키 (프로세스 시작 시 한 번 읽어 메모리에 보관)
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "")
+JWT_KEY_ID = os.getenv("JWT_KEY_ID", "v1")
+# 키 교체 중 이전 키로 서명된 토큰도 검증 ("kid:secret,kid:secret")
+JWT_PREVIOUS_KEYS = os.getenv("JWT_PREVIOUS_KEYS", "")
+JWT_ALGORITHM = "HS256"
+JWT_ISSUER = os.getenv("JWT_ISSUER", "ai-image-optimizer")
+JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "60"))
+# 토큰 없이 user_id 파라미터만으로 사용자를 지정하는 기존 방식 허용 여부 (클라이언트 전환 기간용, 기본 비활성)
+# 허용하더라도 크레딧 차감, 사용량 조회, 우선순위 등급에는 토큰이 필요 (authenticated_user_id)
+AUTH_ALLOW_USER_ID_PARAM = os.getenv("AUTH_ALLOW_USER_ID_PARAM", "false").lower() == "true"
+
+# 사용자 정보 캐시 (크레딧 확인용 스냅숏, 차감은 항상 DB에서 원자적으로 처리)
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+if not JWT_SECRET_KEY:
+    # 워커마다 다른 키가 되므로 여러 워커로 실행할 때는 반드시 설정 (gunicorn.conf.py는 시작 시 하나를 만들어 공유)
+    JWT_SECRET_KEY = secrets.token_urlsafe(32)
+    logger.warning("JWT_SECRET_KEY가 설정되지 않아 임시 키를 생성했습니다. 재시작하면 기존 토큰은 무효가 됩니다.")
+
+
+def _load_signing_keys() -> Dict[str, str]:
+    keys = {JWT_KEY_ID: JWT_SECRET_KEY}
+    for entry in JWT_PREVIOUS_KEYS.split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if kid and secret:
+            keys.setdefault(kid, secret)
+    return keys
+
+
+_signing_keys = _load_signing_keys()
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 존재하지 않는 사용자로 로그인할 때도 같은 시간이 걸리도록 사용하는 해시
+_DUMMY_HASH = pwd_context.hash(secrets.token_urlsafe(16))
+
+router = APIRouter(prefix="/api/auth", tags=["인증"])
+
+
+class AuthError(HTTPException):
+    """토큰이 없거나 올바르지 않은 경우 (401)"""
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+class InsufficientCreditsError(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="크레딧이 부족합니다.")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """비밀번호를 확인하고 (일치 여부, 다시 저장할 해시 또는 None)을 반환합니다."""
+    try:
+        return pwd_context.verify_and_update(password, password_hash)
+    except ValueError:
+        # 알 수 없는 해시 형식
+        return False, None
+
+
+def create_access_token(user_id: int, expires_minutes: int = JWT_EXPIRE_MINUTES) -> str:
+    now = datetime.utcnow()
+    claims = {
+        "sub": str(user_id),
+        "iss": JWT_ISSUER,
+        "iat": now,
+        "exp": now + timedelta(minutes=expires_minutes),
+    }
+    return jwt.encode(claims, _signing_keys[JWT_KEY_ID], algorithm=JWT_ALGORITHM, headers={"kid": JWT_KEY_ID})
+
+
+def decode_token(token: str) -> dict:
+    """서명, 만료 시간, 발급자를 확인하고 클레임을 반환합니다 (DB 조회 없음)."""
+    try:
+        kid = jwt.get_unverified_header(token).get("kid", JWT_KEY_ID)
+        key = _signing_keys.get(kid)
+        if key is None:
+            raise AuthError("알 수 없는 서명 키입니다.")
+        claims = jwt.decode(token, key, algorithms=[JWT_ALGORITHM], issuer=JWT_ISSUER)
+        claims["user_id"] = int(claims["sub"])
+        return claims
+    except (JWTError, KeyError, ValueError):
+        raise AuthError("토큰이 올바르지 않거나 만료되었습니다.")
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token.strip():
+                return token.strip()
+    return None
+
+
+def claims_from_scope(scope) -> Optional[dict]:
+    """
+    Authorization: Bearer 토큰의 클레임을 반환합니다 (토큰이 없으면 None, 올바르지 않으면 AuthError).
+    결과를 요청 state에 저장해 미들웨어와 의존성이 같은 토큰을 두 번 검증하지 않습니다.
+    """
+    state = scope.setdefault("state", {})
+    if "auth_claims" not in state:
+        token = _bearer_token(scope)
+        try:
+            state["auth_claims"] = decode_token(token) if token else None
+        except AuthError as e:
+            state["auth_claims"] = e
+    result = state["auth_claims"]
+    if isinstance(result, AuthError):
+        raise result
+    return result
+
+
+def token_user_id(scope) -> Optional[int]:
+    """올바른 토큰의 사용자 ID (토큰이 없거나 올바르지 않으면 None, 미들웨어용)"""
+    try:
+        claims = claims_from_scope(scope)
+    except AuthError:
+        return None
+    return claims["user_id"] if claims else None
+
+
+def _resolve_user_id(request: Request, user_id: Optional[int], allow_param: bool) -> Optional[int]:
+    claims = claims_from_scope(request.scope)
+    if claims:
+        if user_id is not None and user_id != claims["user_id"]:
+            raise HTTPException(status_code=403, detail="다른 사용자의 요청을 처리할 수 없습니다.")
+        return claims["user_id"]
+    if user_id is not None and not allow_param:
+        raise AuthError("인증이 필요합니다.")
+    return user_id
+
+
+def current_user_id(request: Request, user_id: Optional[int] = None) -> Optional[int]:
+    """
+    요청한 사용자 ID를 정하는 의존성 (비인증 요청이면 None)
+
+    - Bearer 토큰이 있으면 토큰의 사용자 (user_id 파라미터가 다르면 403)
+    - 토큰이 없으면 AUTH_ALLOW_USER_ID_PARAM=true일 때만 user_id 파라미터를 그대로 사용
+    """
+    return _resolve_user_id(request, user_id, AUTH_ALLOW_USER_ID_PARAM)
+
+
+def authenticated_user_id(request: Request, user_id: Optional[int] = None) -> Optional[int]:
+    """
+    current_user_id와 같지만 user_id 파라미터만으로는 사용자를 지정할 수 없습니다.
+    크레딧 차감, 사용량 조회처럼 다른 사용자를 사칭하면 안 되는 라우트에 사용합니다.
+    """
+    return _resolve_user_id(request, user_id, False)
+
+
+def require_user_id(user_id: Optional[int] = Depends(authenticated_user_id)) -> int:
+    if user_id is None:
+        raise AuthError("인증이 필요합니다.")
+    return user_id
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    user_id: int
+    email: str
+    credits: int
+
+
+class UserCache:
+    """
+    짧은 TTL의 프로세스 내 사용자 캐시
+
+    크레딧 확인과 우선순위 등급 결정에만 사용합니다. 다른 워커에서 바뀐 크레딧은
+    최대 TTL만큼 늦게 반영되지만, 실제 차감은 charge_credits가 DB에서 조건부로 처리하므로
+    크레딧이 음수가 되지는 않습니다.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[int, Tuple[float, CachedUser]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> Optional[CachedUser]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry and entry[0] > now:
+            USER_CACHE_LOOKUPS.labels("hit").inc()
+            return entry[1]
+
+        USER_CACHE_LOOKUPS.labels("miss").inc()
+        row = db.query(User.user_id, User.email, User.credits).filter(User.user_id == user_id).first()
+        if row is None:
+            return None
+        user = CachedUser(row.user_id, row.email, row.credits)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict(now)
+            self._entries[user_id] = (now + self.ttl, user)
+        return user
+
+    def _evict(self, now: float):
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        # 만료된 항목이 없으면 가장 오래된 항목부터 제거 (dict는 삽입 순서 유지)
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def set_credits(self, user_id: int, credits: int):
+        """이 워커에서 크레딧을 바꾼 뒤 캐시를 갱신합니다 (커밋 후 호출)."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry:
+                user = entry[1]
+                self._entries[user_id] = (entry[0], CachedUser(user.user_id, user.email, credits))
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
+
+def charge_credits(db: Session, user_id: int, amount: int = 1) -> int:
+    """
+    크레딧이 충분할 때만 차감하고 남은 크레딧을 반환합니다 (커밋은 호출한 쪽에서).
+    읽고 나서 쓰지 않고 조건부 UPDATE 한 번으로 처리하므로 동시 요청에도 음수가 되지 않습니다.
+    """
+    remaining = db.execute(
+        update(User)
+        .where(User.user_id == user_id, User.credits >= amount)
+        .values(credits=User.credits - amount)
+        .returning(User.credits)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if remaining is None:
+        raise InsufficientCreditsError()
+    return remaining
+
+
+@router.post("/token")
+def issue_token(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    """
+    이메일(username)과 비밀번호로 액세스 토큰을 발급합니다.
+
+    이후 요청에는 Authorization: Bearer <access_token> 헤더를 사용합니다.
+    """
+    user = db.query(User).filter(User.email == form.username).first()
+    if user is None:
+        pwd_context.verify(form.password, _DUMMY_HASH)
+        raise AuthError("이메일 또는 비밀번호가 올바르지 않습니다.")
+    valid, new_hash = verify_password(form.password, user.password_hash)
+    if not valid:
+        raise AuthError("이메일 또는 비밀번호가 올바르지 않습니다.")
+
+    if new_hash:
+        user.password_hash = new_hash
+    user.last_login = datetime.utcnow()
+    db.commit()
+    user_cache.invalidate(user.user_id)
+
+    return {
+        "access_token": create_access_token(user.user_id),
+        "token_type": "bearer",
+        "expires_in": JWT_EXPIRE_MINUTES * 60,
+    }
+
+
+@router.get("/me")
+def read_me(user_id: int = Depends(require_user_id), db: Session = Depends(get_read_db)):
+    """토큰의 사용자 정보 (캐시에서 조회, 없으면 복제본에서 조회)"""
+    user = user_cache.get(db, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="사용자를 찾을 수 없습니다.")
+    return {"user_id": user.user_id, "email": user.email, "credits": user.credits}
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form, Body
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form, Request
 from fastapi.responses import JSONResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import os
 import uuid
 import shutil
-import base64
-from typing import Optional, Dict, Any
+import time
+from typing import Optional
 from datetime import datetime
 import cv2
 import numpy as np
-from model.database import get_db, User, Image, UserImage
+from model.database import get_db, Image, UserImage
+from controller.metrics import stage_timer
+from controller.storage_paths import storage_path, resolve_path, url_for_path
+from controller.result_publishing import publishing_enabled, published_url, redirect_to, result_url
+from controller.usage import record_usage
+from controller.auth import authenticated_user_id, charge_credits, user_cache
+from controller.streaming_io import (
+    CHUNK_SIZE, Base64StreamDecoder, JsonStringFieldReader, PngStreamWriter, InvalidImageError, PayloadTooLargeError
+)
 
 router = APIRouter(
     prefix="/api/backgroundBG",
@@ -17,103 +26,263 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# 업로드 및 결과 저장 디렉토리
-UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
-RESULT_BG_DIR = os.path.join(os.getcwd(), "uploads", "bg_results")
+# 저장 가능한 최대 이미지 크기 (바이트)
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "10485760"))
+
+# /save는 본문을 직접 스트리밍으로 읽으므로 API 문서용 요청 본문 스키마를 따로 지정
+SAVE_REQUEST_BODY = {"required": True, "content": {"application/json": {"schema": {
+    "type": "object",
+    "required": ["imageData"],
+    "properties": {
+        "imageData": {"type": "string", "description": "PNG의 base64 문자열 또는 data URL"},
+        "processingType": {"type": "string"},
+        "originalImageUrl": {"type": "string"},
+    },
+}}}}
+
+def _get_user_for_save(db: Session, user_id: Optional[int]):
+    """저장 전에 사용자와 크레딧을 확인합니다 (파일을 쓰기 전에 실패하도록, 사용자 캐시 사용)."""
+    if not user_id:
+        return None
+    user = user_cache.get(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="사용자를 찾을 수 없습니다.")
+    
+    # 크레딧 확인
+    if user.credits < 1:
+        raise HTTPException(status_code=400, detail="크레딧이 부족합니다.")
+    return user
 
-# 디렉토리 생성
-for directory in [UPLOAD_DIR, RESULT_BG_DIR]:
-    if not os.path.exists(directory):
-        os.makedirs(directory)
 
-@router.post("/save")
+def _record_saved_image(
+    db: Session,
+    user,
+    file_id: str,
+    output_file_path: str,
+    result_image_url: str,
+    original_image_url: str,
+    processing_type: str,
+    start_time: float
+) -> dict:
+    """저장된 결과 이미지의 메타데이터를 기록하고 응답을 만듭니다."""
+    # 비인증 사용자의 경우
+    if user is None:
+        return {
+            "status": "success",
+            "message": "배경 제거 이미지가 성공적으로 저장되었습니다.",
+            "result_image_url": result_image_url
+        }
+    
+    # 이미지 메타데이터 저장
+    new_image = Image(
+        user_id=user.user_id,
+        original_image_url=original_image_url,
+        generated_image_url=output_file_path,
+        background_style="removed",
+        model_version=processing_type,
+        processing_time=time.perf_counter() - start_time,  # 서버에서 측정한 처리 시간 (초)
+        created_at=datetime.utcnow()
+    )
+    db.add(new_image)
+    db.flush()
+    
+    # 사용자 이미지 처리 기록 저장
+    user_image = UserImage(
+        user_id=user.user_id,
+        image_id=new_image.image_id,
+        credits_used=1  # 기본 크레딧 사용량
+    )
+    db.add(user_image)
+    record_usage(db, new_image, user_image.credits_used)
+    
+    # 사용자 크레딧 차감 (캐시된 값과 달리 DB에서 부족하면 400)
+    remaining_credits = charge_credits(db, user.user_id)
+    with stage_timer("db_commit"):
+        db.commit()
+    user_cache.set_credits(user.user_id, remaining_credits)
+    
+    return {
+        "status": "success",
+        "message": "배경 제거 이미지가 성공적으로 저장되었습니다.",
+        "image_id": new_image.image_id,
+        "result_image_url": result_image_url,
+        "remaining_credits": remaining_credits
+    }
+
+
+async def _finish_save(
+    db: Session,
+    user,
+    file_id: str,
+    output_file_path: str,
+    original_image_url: str,
+    processing_type: str,
+    start_time: float
+) -> dict:
+    """
+    저장한 파일의 URL을 만들고 기록합니다.
+    게시, 크레딧 차감, 커밋 중 하나라도 실패하면 기록되지 않은 파일이 남지 않도록 파일을 지웁니다.
+    """
+    try:
+        # 클라이언트에서 접근 가능한 URL (RESULT_PUBLISH_MODE=s3이면 서명 URL)
+        result_image_url = await run_in_threadpool(result_url, "bg_results", output_file_path)
+        return _record_saved_image(
+            db, user, file_id, output_file_path, result_image_url,
+            original_image_url, processing_type, start_time
+        )
+    except BaseException:
+        db.rollback()
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+        raise
+
+
+def _storage_error(e: ValueError) -> HTTPException:
+    if isinstance(e, PayloadTooLargeError):
+        return HTTPException(status_code=413, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/save", openapi_extra={"requestBody": SAVE_REQUEST_BODY})
 async def save_processed_image(
-    image_data: Dict[str, Any] = Body(...),
-    user_id: Optional[int] = None,
+    request: Request,
+    user_id: Optional[int] = Depends(authenticated_user_id),
     db: Session = Depends(get_db)
 ):
     """
     클라이언트에서 배경이 제거된 이미지 데이터를 받아 서버에 저장
+    
+    요청 본문: {"imageData": "<base64 또는 data URL>", "processingType": ..., "originalImageUrl": ...}
+    본문을 한 번에 읽지 않고 imageData 값을 받는 대로 조각 단위로 디코딩하면서 파일에 기록합니다.
+    가능하면 base64 인코딩이 필요 없는 /save-binary 사용을 권장합니다.
     """
+    start_time = time.perf_counter()
     try:
-        # Base64 이미지 데이터 추출
-        if "imageData" not in image_data:
-            raise HTTPException(status_code=400, detail="이미지 데이터가 제공되지 않았습니다.")
+        user = _get_user_for_save(db, user_id)
+        
+        # 파일 저장
+        file_id = str(uuid.uuid4())
+        output_file_path = storage_path("bg_results", f"{file_id}_nobg.png")
         
-        base64_data = image_data["imageData"].split(",")[1] if "," in image_data["imageData"] else image_data["imageData"]
-        image_bytes = base64.b64decode(base64_data)
+        # JSON 본문에서 imageData 값을 받는 대로 꺼내 디코딩하며 저장
+        reader = JsonStringFieldReader("imageData")
+        decoder = Base64StreamDecoder()
+        try:
+            with stage_timer("upload_read"):
+                async with PngStreamWriter(output_file_path, MAX_FILE_SIZE) as writer:
+                    async for chunk in request.stream():
+                        await writer.write(decoder.feed(reader.feed(chunk)))
+                    fields = reader.finish()
+                    if not reader.found:
+                        raise HTTPException(status_code=400, detail="이미지 데이터가 제공되지 않았습니다.")
+                    await writer.write(decoder.finish())
+                    await writer.commit()
+        except (InvalidImageError, PayloadTooLargeError) as e:
+            raise _storage_error(e)
         
         # 이미지 타입과 처리 방식 추출
-        processing_type = image_data.get("processingType", "selectable-object-bg-removal")
+        processing_type = fields.get("processingType", "selectable-object-bg-removal")
+        original_image_url = fields.get("originalImageUrl", "")
+        if not isinstance(processing_type, str) or not isinstance(original_image_url, str):
+            raise HTTPException(status_code=400, detail="processingType과 originalImageUrl은 문자열이어야 합니다.")
+        
+        return await _finish_save(
+            db, user, file_id, output_file_path, original_image_url, processing_type, start_time
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"이미지 저장 중 오류 발생: {str(e)}")
+
+
+async def _iter_multipart_file(request: Request):
+    form = await request.form()
+    upload = form.get("file")
+    if upload is None or isinstance(upload, str):
+        raise HTTPException(status_code=400, detail="file 필드가 제공되지 않았습니다.")
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await form.close()
+
+
+async def _iter_base64_body(request: Request):
+    decoder = Base64StreamDecoder()
+    async for chunk in request.stream():
+        yield decoder.feed(chunk)
+    yield decoder.finish()
+
+
+@router.post("/save-binary")
+async def save_processed_image_binary(
+    request: Request,
+    processing_type: str = "selectable-object-bg-removal",
+    original_image_url: str = "",
+    user_id: Optional[int] = Depends(authenticated_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    배경이 제거된 PNG 이미지를 base64 인코딩 없이 받아 바로 파일로 스트리밍 저장
+    
+    요청 본문 형식 (Content-Type):
+    - image/png (또는 application/octet-stream): PNG 바이너리 그대로
+    - multipart/form-data: file 필드에 PNG 파일
+    - text/plain: base64 문자열 또는 data URL (기존 클라이언트 호환용)
+    
+    메타데이터는 쿼리 파라미터로 전달합니다 (processing_type, original_image_url, user_id).
+    """
+    start_time = time.perf_counter()
+    try:
+        user = _get_user_for_save(db, user_id)
+        
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "multipart/form-data":
+            chunks = _iter_multipart_file(request)
+        elif content_type == "text/plain":
+            chunks = _iter_base64_body(request)
+        elif content_type in ("image/png", "application/octet-stream", ""):
+            chunks = request.stream()
+        else:
+            raise HTTPException(status_code=415, detail=f"지원하지 않는 Content-Type입니다: {content_type}")
         
         # 파일 저장
         file_id = str(uuid.uuid4())
-        output_file_path = os.path.join(RESULT_BG_DIR, f"{file_id}_nobg.png")
-        
-        # 이미지 데이터 저장
-        with open(output_file_path, "wb") as file:
-            file.write(image_bytes)
+        output_file_path = storage_path("bg_results", f"{file_id}_nobg.png")
         
-        # 사용자 정보 업데이트 (인증된 사용자의 경우)
-        if user_id:
-            user = db.query(User).filter(User.user_id == user_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="사용자를 찾을 수 없습니다.")
-            
-            # 크레딧 확인
-            if user.credits < 1:
-                raise HTTPException(status_code=400, detail="크레딧이 부족합니다.")
-            
-            # 이미지 메타데이터 저장
-            new_image = Image(
-                user_id=user_id,
-                original_image_url=image_data.get("originalImageUrl", ""),
-                generated_image_url=output_file_path,
-                background_style="removed",
-                model_version=processing_type,
-                processing_time=image_data.get("processingTime", 0.0),
-                created_at=datetime.utcnow()
-            )
-            db.add(new_image)
-            db.flush()
-            
-            # 사용자 이미지 처리 기록 저장
-            user_image = UserImage(
-                user_id=user_id,
-                image_id=new_image.image_id,
-                credits_used=1  # 기본 크레딧 사용량
-            )
-            db.add(user_image)
-            
-            # 사용자 크레딧 차감
-            user.credits -= 1
-            db.commit()
-            
-            return {
-                "status": "success",
-                "message": "배경 제거 이미지가 성공적으로 저장되었습니다.",
-                "image_id": new_image.image_id,
-                "result_image_url": f"/uploads/bg_results/{file_id}_nobg.png",  # 클라이언트에서 접근 가능한 URL
-                "remaining_credits": user.credits
-            }
+        try:
+            with stage_timer("upload_read"):
+                async with PngStreamWriter(output_file_path, MAX_FILE_SIZE) as writer:
+                    async for chunk in chunks:
+                        await writer.write(chunk)
+                    await writer.commit()
+        except (InvalidImageError, PayloadTooLargeError) as e:
+            raise _storage_error(e)
         
-        # 비인증 사용자의 경우
-        return {
-            "status": "success",
-            "message": "배경 제거 이미지가 성공적으로 저장되었습니다.",
-            "result_image_url": f"/uploads/bg_results/{file_id}_nobg.png"  # 클라이언트에서 접근 가능한 URL
-        }
+        return await _finish_save(
+            db, user, file_id, output_file_path, original_image_url, processing_type, start_time
+        )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"이미지 저장 중 오류 발생: {str(e)}")
 
 @router.get("/result/{file_id}")
 async def get_result_image(file_id: str):
     """
-    배경 제거 결과 이미지 반환
+    배경 제거 결과 이미지 반환 (RESULT_PUBLISH_MODE=s3이면 서명 URL로 리다이렉트)
     """
-    result_file_path = os.path.join(RESULT_BG_DIR, f"{file_id}_nobg.png")
-    if not os.path.exists(result_file_path):
+    result_file_path = resolve_path("bg_results", f"{file_id}_nobg.png")
+    if publishing_enabled():
+        url = await run_in_threadpool(published_url, "bg_results", f"{file_id}_nobg.png", result_file_path)
+        if url:
+            return redirect_to(url)
+    if not result_file_path:
         raise HTTPException(status_code=404, detail="결과 이미지를 찾을 수 없습니다.")
     
     return FileResponse(result_file_path)
@@ -122,7 +291,7 @@ async def get_result_image(file_id: str):
 async def upload_and_save_image(
     file: UploadFile = File(...),
     processing_type: str = Form("selectable-object-bg-removal"),
-    user_id: Optional[int] = None,
+    user_id: Optional[int] = Depends(authenticated_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -132,7 +301,7 @@ async def upload_and_save_image(
         # 원본 파일 저장
         file_id = str(uuid.uuid4())
         file_extension = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
-        input_file_path = os.path.join(UPLOAD_DIR, f"{file_id}{file_extension}")
+        input_file_path = storage_path("originals", f"{file_id}{file_extension}")
         
         with open(input_file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
@@ -141,7 +310,7 @@ async def upload_and_save_image(
             "status": "success",
             "message": "이미지가 성공적으로 업로드되었습니다.",
             "file_id": file_id,
-            "original_image_url": f"/uploads/{file_id}{file_extension}"
+            "original_image_url": url_for_path(input_file_path)
         }
         
     except Exception as e:
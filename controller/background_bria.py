@@ -1,37 +1,37 @@
 # controller/background_bria.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-import boto3
-import requests
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
+from fastapi.concurrency import run_in_threadpool
 import os
+import time
+from typing import Optional
 from dotenv import load_dotenv
 import uuid
-from fastapi.responses import JSONResponse
-import io
+from fastapi.responses import ORJSONResponse
 import logging
+from controller.image_normalizer import normalize_upload
+from controller.upstream import call_bria_replace, upload_to_s3
+from controller.upstream_gate import UpstreamBusyError, request_priority, upstream_slot_async
+from controller.metrics import stage_timer
+from controller.api_keys import get_api_key
+from controller.bria_mirror import mirror_bria_results
+from controller.auth import authenticated_user_id
+from controller.responses import RESPONSE_FORMAT, format_bria_response, validate_response_format
+from opentelemetry import trace
 
 # 로깅 설정
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("bria_api")
 
 load_dotenv()
 
 router = APIRouter(tags=["배경 교체"])
-BUCKET_NAME = "briadownload"
-REGION = "ap-northeast-2"  # 서울 리전
 
-# S3 클라이언트 설정
-s3_client = boto3.client(
-    's3',
-    region_name=REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-)
-
-@router.post("/replace-bg")
+@router.post("/replace-bg", dependencies=[Depends(request_priority)])
 async def replace_bg(
     file: UploadFile = File(...), 
     bg_prompt: str = Form("beautiful natural scenery"),
-    num_results: int = Form(4)
+    num_results: int = Form(4),
+    response_format: str = Form(RESPONSE_FORMAT),
+    user_id: Optional[int] = Depends(authenticated_user_id)
 ):
     """
     배경이 제거된 이미지를 S3에 업로드하고 BRIA API를 사용하여 새 배경을 생성합니다.
@@ -39,10 +39,14 @@ async def replace_bg(
     - file: 배경이 제거된 이미지 파일
     - bg_prompt: 새 배경을 위한 프롬프트 (기본값: "beautiful natural scenery")
     - num_results: 생성할 이미지 결과 개수 (기본값: 4, 최대: 10)
+    - response_format: full(기본값) 또는 compact(결과 이미지 URL만 반환)
+    - user_id: 결과 이미지를 기록할 사용자 (Bearer 토큰의 사용자만, 토큰이 없으면 기록하지 않음)
     """
+    response_format = validate_response_format(response_format)
+    start_time = time.perf_counter()
     try:
         # 디버그: 전달된 파라미터 기록
-        logger.info(f"요청 받음: 프롬프트='{bg_prompt}', 결과 개수={num_results}")
+        logger.debug("요청 받음", extra={"bg_prompt": bg_prompt, "num_results": num_results})
         
         # 유효한 결과 개수 확인
         if num_results < 1:
@@ -50,36 +54,32 @@ async def replace_bg(
         elif num_results > 10:  # 최대 개수 제한 (BRIA API에 따라 조정 필요)
             num_results = 10
             
-        # 파일 읽기
-        contents = await file.read()
+        # 파일 읽기 및 정규화 (EXIF 회전, 축소, 메타데이터 제거)
+        with stage_timer("upload_read"):
+            contents = await file.read()
+        normalized = await normalize_upload(contents, file.content_type, file.filename)
         
         # 고유한 파일 이름 생성 (UUID + 원본 파일명)
         # 원본 파일명에서 확장자 분리
         original_filename = file.filename
         file_name, file_ext = os.path.splitext(original_filename)
+        file_ext = normalized.extension or file_ext
         
         # UUID와 원본 파일명을 조합하여 고유한 키 생성
         request_id = str(uuid.uuid4())
+        trace.get_current_span().set_attribute("app.request_id", request_id)
         unique_filename = f"{request_id}_{file_name}{file_ext}"
         
         # 디버그 로그
-        logger.info(f"업로드 파일명: {unique_filename}")
-        logger.info(f"배경 프롬프트: '{bg_prompt}'")
+        logger.debug("업로드 파일명 생성", extra={"s3_key": unique_filename, "app_request_id": request_id})
         
         # S3에 파일 직접 업로드
-        s3_client.upload_fileobj(
-            io.BytesIO(contents),
-            BUCKET_NAME,
-            unique_filename,
-            ExtraArgs={'ContentType': file.content_type}
-        )
-        
-        # S3 URL 생성
-        file_url = f"https://{BUCKET_NAME}.s3.{REGION}.amazonaws.com/{unique_filename}"
-        logger.info(f"S3 업로드 완료: {file_url}")
+        async with upstream_slot_async("s3"):
+            file_url = await run_in_threadpool(upload_to_s3, normalized.data, unique_filename, normalized.content_type)
+        logger.info("S3 업로드 완료", extra={"s3_key": unique_filename, "bytes": normalized.normalized_size})
         
         # BRIA API 호출
-        bria_api_token = os.getenv("BRIA_API_TOKEN")
+        bria_api_token = get_api_key("BRIA_API_TOKEN")
         if not bria_api_token:
             raise HTTPException(status_code=500, detail="BRIA API 토큰이 설정되지 않았습니다.")
         
@@ -99,44 +99,42 @@ async def replace_bg(
             }
         }
         
-        # 요청 데이터 기록
-        logger.info(f"BRIA API 요청 데이터: {request_data}")
+        # 요청 데이터 기록 (이미지 URL과 메타데이터는 제외)
+        logger.debug("BRIA API 요청", extra={"bg_prompt": bg_prompt, "num_results": num_results})
         
-        response = requests.post(
-            "https://engine.prod.bria-api.com/v1/background/replace",
-            headers={
-                "Content-Type": "application/json",
-                "api_token": bria_api_token,
-                "Cache-Control": "no-cache"
-            },
-            json=request_data,
-            timeout=60
-        )
+        async with upstream_slot_async("bria"):
+            response = await run_in_threadpool(call_bria_replace, request_data, bria_api_token)
         
         # API 응답 확인
         if response.status_code != 200:
-            logger.error(f"BRIA API 오류: {response.status_code} - {response.text}")
+            logger.error("BRIA API 오류", extra={"status_code": response.status_code, "response_body": response.text[:500]})
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"BRIA API 오류: {response.text}"
             )
         
         result = response.json()
-        logger.info(f"BRIA API 응답 성공: {len(result.get('result', []))}개 이미지 생성됨")
+        logger.info("BRIA API 응답 성공", extra={"result_count": len(result.get('result', []))})
+        
+        # BRIA 결과를 동시에 내려받아 저장하고 결과별로 기록
+        result = await mirror_bria_results(result, start_time, file_url, bg_prompt, user_id)
         
         # 성공 응답
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
-            content={
+            content=format_bria_response({
                 "status": "success",
                 "original_url": file_url,
                 "bria_results": result,
                 "result_count": num_results,
                 "request_prompt": bg_prompt,
-                "request_id": request_id
-            }
+                "request_id": request_id,
+                "normalization": normalized.stats()
+            }, response_format)
         )
         
+    except UpstreamBusyError:
+        raise
     except Exception as e:
-        logger.error(f"이미지 처리 중 오류 발생: {str(e)}")
+        logger.exception("이미지 처리 중 오류 발생")
         raise HTTPException(status_code=500, detail=f"이미지 처리 중 오류 발생: {str(e)}")
@@ -1,16 +1,40 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import os
-import requests
+import time
 import uuid
 import shutil
-from typing import Optional
+from typing import Iterator, Optional
 from datetime import datetime
 import cv2
 import numpy as np
 from dotenv import load_dotenv
-from model.database import get_db, User, Image, UserImage
+import logging
+from model.database import get_db, Image, UserImage
+from controller.image_normalizer import normalize_upload
+from controller.upstream import call_remove_bg
+from controller.upstream_gate import UpstreamBusyError, request_priority, upstream_slot_async
+from controller.metrics import stage_timer
+from controller.tracing import bind_context
+from controller.perceptual_hash import dhash, duplicate_index, ensure_index_loaded, index_image, index_refresh_due, to_signed64
+from controller.storage_paths import storage_path, resolve_path
+from controller.api_keys import get_api_key
+from controller.lifecycle import submit_background
+from controller.usage import record_usage
+from controller.auth import InsufficientCreditsError, authenticated_user_id, charge_credits, user_cache
+from controller.image_pipeline import (
+    ArrayRaster, Buffer, canny_edges, contours_json, contours_svg, decode_image, edge_contours, encode_png,
+    iter_edge_bands, iter_unpacked_bands, open_raster, pack_edge_bands, pack_edges, read_packed_header, tiled_canny_edges,
+    iter_png_bands, unpack_edges, write_file, write_files
+)
+from controller.result_publishing import (
+    existing_result_url, publish_file, published_url, publishing_enabled, redirect_to, result_url
+)
+
+# 로깅 설정
+logger = logging.getLogger("background_removal")
 
 load_dotenv()
 
@@ -20,41 +44,49 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# 업로드 및 결과 저장 디렉토리
-UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
-RESULT_DIR = os.path.join(os.getcwd(), "uploads", "results")
-EDGE_DIR = os.path.join(os.getcwd(), "uploads", "edges")
+# 윤곽선 저장 형식: packed(1비트 마스크 + zlib, 기본값) 또는 png(8비트 PNG)
+EDGE_STORAGE_FORMAT = os.getenv("EDGE_STORAGE_FORMAT", "packed").lower()
+# /edge/{file_id}?format= 으로 요청할 수 있는 형식
+EDGE_FORMATS = ("png", "packed", "json", "svg")
+EDGE_FILE_NAMES = {"png": "{}_edge.png", "packed": "{}_edge.bits"}
+# 벡터 윤곽선 단순화 허용 오차 (픽셀)
+EDGE_CONTOUR_EPSILON = float(os.getenv("EDGE_CONTOUR_EPSILON", "1.5"))
+# 윤곽선 이미지는 file_id별로 바뀌지 않으므로 캐시 허용
+EDGE_CACHE_CONTROL = "public, max-age=86400"
+# 이 픽셀 수 이상이면 겹치는 타일 단위로 윤곽선을 추출 (블러/Canny 중간 결과를 타일 크기로 제한)
+EDGE_TILED_MIN_PIXELS = int(os.getenv("EDGE_TILED_MIN_PIXELS", "16000000"))
+# 타일 처리 중 블러/Canny 작업과 출력 밴드에 쓰는 메모리 한도
+EDGE_TILE_MEMORY_MB = int(os.getenv("EDGE_TILE_MEMORY_MB", "64"))
 
-# 디렉토리 생성
-for directory in [UPLOAD_DIR, RESULT_DIR, EDGE_DIR]:
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
-# Remove.bg API 키 가져오기
-REMOVE_BG_API_KEY = os.getenv("REMOVE_BG_API_KEY", "")
-if not REMOVE_BG_API_KEY:
-    print("경고: REMOVE_BG_API_KEY가 설정되지 않았습니다.")
+# Remove.bg API 키 확인 (요청마다 get_api_key로 최신 값을 읽음)
+if not get_api_key("REMOVE_BG_API_KEY"):
+    logger.warning("경고: REMOVE_BG_API_KEY가 설정되지 않았습니다.")
 else:
-    print(f"Remove.bg API 키 로드됨: {REMOVE_BG_API_KEY[:5]}...")
+    logger.info("Remove.bg API 키 로드됨")
 
-@router.post("/remove")
+@router.post("/remove", dependencies=[Depends(request_priority)])
 async def remove_background(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    user_id: Optional[int] = None,
+    user_id: Optional[int] = Depends(authenticated_user_id),
+    reuse_duplicate: bool = False,
     db: Session = Depends(get_db)
 ):
     """
     Remove.bg API를 사용하여 배경 제거
+    
+    - reuse_duplicate: True이면 같은 사용자가 이전에 처리한 거의 동일한 이미지의 결과를 재사용 (크레딧 차감 없음)
     """
-    print(f"배경 제거 API 호출됨: 파일명={file.filename}, 크기={file.size if hasattr(file, 'size') else '알 수 없음'}")
+    start_time = time.perf_counter()
+    logger.debug("배경 제거 API 호출됨", extra={"upload_filename": file.filename, "user_id": user_id})
     
-    if not REMOVE_BG_API_KEY:
+    remove_bg_api_key = get_api_key("REMOVE_BG_API_KEY")
+    if not remove_bg_api_key:
         raise HTTPException(status_code=500, detail="API 키가 설정되지 않았습니다.")
     
-    # 사용자 확인 (실제 구현에서는 인증 시스템에서 가져올 것)
+    # 사용자 확인 (토큰 또는 user_id, 크레딧은 캐시된 값으로 먼저 확인하고 차감 시 DB에서 다시 확인)
+    user = None
     if user_id:
-        user = db.query(User).filter(User.user_id == user_id).first()
+        user = user_cache.get(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="사용자를 찾을 수 없습니다.")
         
@@ -62,39 +94,67 @@ async def remove_background(
         if user.credits < 1:
             raise HTTPException(status_code=400, detail="크레딧이 부족합니다.")
     
-    # 파일 저장
-    file_id = str(uuid.uuid4())
-    file_extension = os.path.splitext(file.filename)[1]
-    input_file_path = os.path.join(UPLOAD_DIR, f"{file_id}{file_extension}")
-    output_file_path = os.path.join(RESULT_DIR, f"{file_id}_nobg.png")
+    # 업로드 이미지 정규화 (EXIF 회전, 축소, 메타데이터 제거)
+    with stage_timer("upload_read"):
+        contents = await file.read()
+    normalized = await normalize_upload(contents, file.content_type, file.filename)
+    
+    # 지각 해시 계산 (재압축/크기 변경된 중복 업로드 탐지용)
+    try:
+        perceptual_hash = await run_in_threadpool(dhash, normalized.data)
+    except Exception as e:
+        logger.warning("지각 해시 계산 실패: %s", e)
+        perceptual_hash = None
     
-    print(f"파일 저장 경로: {input_file_path}")
+    if user_id and perceptual_hash is not None and index_refresh_due():
+        # 인덱스 적재/갱신은 DB를 동기로 읽으므로 스레드 풀에서 실행
+        await run_in_threadpool(ensure_index_loaded, db)
     
-    with open(input_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 사용자가 동의한 경우 이전 결과 재사용
+    if user_id and reuse_duplicate and perceptual_hash is not None:
+        match = duplicate_index.nearest(perceptual_hash, owner=user_id)
+        if match:
+            previous = db.query(Image).filter(Image.image_id == match[0]).first()
+            if previous and previous.generated_image_url and os.path.exists(previous.generated_image_url):
+                logger.info("중복 이미지 결과 재사용", extra={"image_id": previous.image_id, "hamming_distance": match[1]})
+                return {
+                    "status": "success",
+                    "message": "이전에 처리한 유사 이미지의 결과를 재사용했습니다.",
+                    "image_id": previous.image_id,
+                    "result_image_url": await run_in_threadpool(existing_result_url, "results", previous.generated_image_url),
+                    "remaining_credits": user.credits,
+                    "reused": True,
+                    "hamming_distance": match[1]
+                }
+    
+    # 파일 저장
+    file_id = str(uuid.uuid4())
+    file_extension = normalized.extension or os.path.splitext(file.filename)[1]
+    input_file_path = storage_path("originals", f"{file_id}{file_extension}")
+    output_file_path = storage_path("results", f"{file_id}_nobg.png")
     
     try:
-        print(f"Remove.bg API 호출 시작")
         # Remove.bg API 호출
-        response = requests.post(
-            'https://api.remove.bg/v1.0/removebg',
-            files={'image_file': open(input_file_path, 'rb')},
-            data={'size': 'auto'},
-            headers={'X-Api-Key': REMOVE_BG_API_KEY},
-        )
+        async with upstream_slot_async("remove_bg"):
+            response = await run_in_threadpool(
+                call_remove_bg, normalized.data, f"{file_id}{file_extension}", normalized.content_type, remove_bg_api_key
+            )
         
-        print(f"Remove.bg API 응답 코드: {response.status_code}")
+        logger.debug("Remove.bg API 응답", extra={"status_code": response.status_code})
         
         if response.status_code != 200:
             error_detail = f"Remove.bg API 오류: {response.text}"
-            print(error_detail)
+            logger.error("Remove.bg API 오류", extra={"status_code": response.status_code, "response_body": response.text[:500]})
             raise HTTPException(status_code=response.status_code, detail=error_detail)
         
-        # 결과 저장
-        with open(output_file_path, 'wb') as out:
-            out.write(response.content)
+        # 원본과 결과를 메모리에서 바로 한 번씩 기록 (업로드 파일을 다시 읽지 않음)
+        with stage_timer("storage_write"):
+            await write_files([(input_file_path, normalized.data), (output_file_path, response.content)])
             
-        print(f"결과 이미지 저장됨: {output_file_path}")
+        logger.info("결과 이미지 저장됨", extra={"file_id": file_id, "bytes": len(response.content)})
+        
+        # 클라이언트에서 접근 가능한 URL (RESULT_PUBLISH_MODE=s3이면 업로드 후 서명 URL)
+        result_image_url = await run_in_threadpool(result_url, "results", output_file_path)
         
         # 사용자 정보 업데이트 (인증된 사용자의 경우)
         if user_id and user:
@@ -105,7 +165,8 @@ async def remove_background(
                 generated_image_url=output_file_path,
                 background_style="removed",
                 model_version="remove.bg-api",
-                processing_time=0.0,  # 실제 API 응답 시간을 측정할 수 있습니다
+                processing_time=time.perf_counter() - start_time,  # 서버에서 측정한 처리 시간 (초)
+                perceptual_hash=to_signed64(perceptual_hash) if perceptual_hash is not None else None,
                 created_at=datetime.utcnow()
             )
             db.add(new_image)
@@ -118,29 +179,38 @@ async def remove_background(
                 credits_used=1  # 기본 크레딧 사용량
             )
             db.add(user_image)
+            record_usage(db, new_image, user_image.credits_used)
             
-            # 사용자 크레딧 차감
-            user.credits -= 1
-            db.commit()
+            # 사용자 크레딧 차감 (부족하면 InsufficientCreditsError)
+            remaining_credits = charge_credits(db, user_id)
+            with stage_timer("db_commit"):
+                db.commit()
+            user_cache.set_credits(user_id, remaining_credits)
             
-            # Edge 감지 작업 백그라운드로 실행
-            background_tasks.add_task(detect_edges, input_file_path, file_id)
+            # 중복 탐지 인덱스에 등록
+            if perceptual_hash is not None:
+                index_image(new_image.image_id, perceptual_hash, owner=user_id)
+            
+            # Edge 감지 작업 백그라운드로 실행 (종료 시 lifecycle.drain이 완료를 기다림)
+            submit_background(bind_context(detect_edges_from_buffer), normalized.data, file_id)
             
             return {
                 "status": "success",
                 "message": "배경이 성공적으로 제거되었습니다.",
                 "image_id": new_image.image_id,
-                "result_image_url": f"/uploads/results/{file_id}_nobg.png",  # 클라이언트에서 접근 가능한 URL
-                "remaining_credits": user.credits
+                "result_image_url": result_image_url,
+                "remaining_credits": remaining_credits,
+                "normalization": normalized.stats()
             }
         
         # 비인증 사용자의 경우 Edge 감지 작업 백그라운드로 실행
-        background_tasks.add_task(detect_edges, input_file_path, file_id)
+        submit_background(bind_context(detect_edges_from_buffer), normalized.data, file_id)
         
         return {
             "status": "success",
             "message": "배경이 성공적으로 제거되었습니다.",
-            "result_image_url": f"/uploads/results/{file_id}_nobg.png"  # 클라이언트에서 접근 가능한 URL
+            "result_image_url": result_image_url,
+            "normalization": normalized.stats()
         }
     
     except Exception as e:
@@ -149,54 +219,183 @@ async def remove_background(
             os.remove(input_file_path)
         if os.path.exists(output_file_path):
             os.remove(output_file_path)
+        # 업스트림 혼잡으로 인한 거부(429와 Retry-After)와 크레딧 부족(400)은 그대로 전달
+        if isinstance(e, (UpstreamBusyError, InsufficientCreditsError)):
+            raise
         raise HTTPException(status_code=500, detail=f"배경 제거 중 오류 발생: {str(e)}")
 
 @router.get("/result/{file_id}")
 async def get_result_image(file_id: str):
     """
-    배경 제거 결과 이미지 반환
+    배경 제거 결과 이미지 반환 (RESULT_PUBLISH_MODE=s3이면 서명 URL로 리다이렉트)
     """
-    result_file_path = os.path.join(RESULT_DIR, f"{file_id}_nobg.png")
-    if not os.path.exists(result_file_path):
+    result_file_path = resolve_path("results", f"{file_id}_nobg.png")
+    if publishing_enabled():
+        url = await run_in_threadpool(published_url, "results", f"{file_id}_nobg.png", result_file_path)
+        if url:
+            return redirect_to(url)
+    if not result_file_path:
         raise HTTPException(status_code=404, detail="결과 이미지를 찾을 수 없습니다.")
     
     return FileResponse(result_file_path)
 
 @router.get("/edge/{file_id}")
-async def get_edge_image(file_id: str):
+async def get_edge_image(file_id: str, format: str = "png", epsilon: float = EDGE_CONTOUR_EPSILON):
     """
-    Edge 감지 결과 이미지 반환
+    Edge 감지 결과 반환
+    
+    - format: png(기본값), packed(1비트 마스크 + zlib), json(단순화한 윤곽선 좌표), svg(윤곽선 path)
+    - epsilon: json/svg 윤곽선 단순화 허용 오차 (픽셀, 클수록 점이 적음)
+    
+    png/packed는 파일로 반환합니다 (RESULT_PUBLISH_MODE=s3이면 서명 URL로 리다이렉트).
+    저장된 형식과 다르면 저장된 파일에서 변환해 바로 응답합니다.
+    변환한 사본은 저장하지 않고 Cache-Control(EDGE_CACHE_CONTROL)로 CDN/브라우저 캐시에 맡깁니다.
     """
-    edge_file_path = os.path.join(EDGE_DIR, f"{file_id}_edge.png")
-    if not os.path.exists(edge_file_path):
+    if format not in EDGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format은 {', '.join(EDGE_FORMATS)} 중 하나여야 합니다.")
+    
+    # 저장 형식이 바뀌었을 수 있으므로 두 형식 모두 확인 (요청한 형식 우선)
+    stored = None
+    for stored_format in sorted(EDGE_FILE_NAMES, key=lambda name: name != format):
+        name = EDGE_FILE_NAMES[stored_format].format(file_id)
+        path = resolve_path("edges", name)
+        if path:
+            stored = (stored_format, name, path)
+            break
+    
+    if format in EDGE_FILE_NAMES:
+        name = EDGE_FILE_NAMES[format].format(file_id)
+        path = stored[2] if stored and stored[0] == format else None
+        if publishing_enabled():
+            url = await run_in_threadpool(published_url, "edges", name, path)
+            if url:
+                return redirect_to(url)
+        if path:
+            media_type = "application/octet-stream" if format == "packed" else None
+            return FileResponse(path, media_type=media_type, headers={"Cache-Control": EDGE_CACHE_CONTROL})
+        if stored is None:
+            raise HTTPException(status_code=404, detail="윤곽선 이미지를 찾을 수 없습니다.")
+        # 요청한 형식의 파일이 없으면 저장된 파일에서 변환해 디스크에 사본을 만들지 않고 바로 응답
+        headers = {"Cache-Control": EDGE_CACHE_CONTROL}
+        if format == "png":
+            chunks = await run_in_threadpool(stream_packed_png, stored[2])
+            return StreamingResponse(chunks, media_type="image/png", headers=headers)
+        content = await run_in_threadpool(pack_png_edges, stored[2])
+        return Response(content, media_type="application/octet-stream", headers=headers)
+    
+    if stored is None:
         raise HTTPException(status_code=404, detail="윤곽선 이미지를 찾을 수 없습니다.")
     
-    return FileResponse(edge_file_path)
+    # 저장된 파일에서 윤곽선 좌표로 변환
+    stored_format, _, path = stored
+    content, media_type = await run_in_threadpool(render_edges, path, stored_format, format, epsilon)
+    if media_type == "application/json":
+        return ORJSONResponse(content, headers={"Cache-Control": EDGE_CACHE_CONTROL})
+    return Response(content, media_type=media_type, headers={"Cache-Control": EDGE_CACHE_CONTROL})
+
+def stream_packed_png(path: str) -> Iterator[bytes]:
+    """
+    압축 윤곽선 파일을 PNG 조각으로 풀어 돌려줍니다 (헤더는 바로 확인하여 응답 전에 실패하도록 함).
+    밴드 단위로 풀어 EDGE_TILE_MEMORY_MB 안에서 처리하며, 조각은 응답으로 바로 스트리밍합니다.
+    """
+    f = open(path, "rb")
+    try:
+        width, height = read_packed_header(f)
+    except BaseException:
+        f.close()
+        raise
+
+    def chunks():
+        with f:
+            bands = iter_unpacked_bands(f, width, height, EDGE_TILE_MEMORY_MB * 1024 * 1024)
+            yield from iter_png_bands(width, height, bands)
+    return chunks()
+
+def pack_png_edges(path: str) -> bytes:
+    """PNG로 저장된 윤곽선을 압축 형식(packed)으로 변환합니다 (결과가 작으므로 메모리에서 처리)."""
+    with stage_timer("edge_render"):
+        return pack_edges(load_edges(path, "png"))
+
+def load_edges(path: str, stored_format: str):
+    """저장된 윤곽선 파일을 0/255 값의 그레이스케일 배열로 읽습니다."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if stored_format == "packed":
+        return unpack_edges(data)
+    return decode_image(data, cv2.IMREAD_GRAYSCALE)
+
+def render_edges(path: str, stored_format: str, format: str, epsilon: float):
+    """
+    저장된 윤곽선을 윤곽선 좌표(json/svg)로 변환합니다. (본문, media type)을 반환합니다.
+    """
+    with stage_timer("edge_render"):
+        edges = load_edges(path, stored_format)
+        height, width = edges.shape[:2]
+        contours = edge_contours(edges, epsilon=max(epsilon, 0.0))
+        if format == "json":
+            return contours_json(contours, width, height), "application/json"
+        return contours_svg(contours, width, height), "image/svg+xml"
 
 def detect_edges(image_path: str, file_id: str):
     """
-    OpenCV를 사용하여 윤곽선(Edge Map) 추출
+    OpenCV를 사용하여 윤곽선(Edge Map) 추출 (저장된 파일 기준)
+
+    .npy, 바이너리 PGM/PPM은 메모리 매핑으로 필요한 행만 읽고, 그 외 형식은 그레이스케일로 디코딩합니다.
     """
     try:
-        # 이미지 로드
-        image = cv2.imread(image_path)
-        
-        # 그레이스케일 변환
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # 가우시안 블러 적용 (노이즈 제거)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        
-        # 캐니 에지 감지
-        edges = cv2.Canny(blurred, 50, 150)
+        raster = open_raster(image_path)
+    except (OSError, ValueError):
+        logger.exception("윤곽선 추출 실패", extra={"file_id": file_id})
+        return None
+    try:
+        return _detect_edges(raster, file_id)
+    finally:
+        raster.close()
+
+def detect_edges_from_buffer(data: Buffer, file_id: str):
+    """
+    메모리의 이미지 데이터에서 윤곽선(Edge Map) 추출
+
+    디스크에 저장된 원본을 다시 읽지 않고, 그레이스케일로 바로 디코딩한 뒤
+    인코딩한 결과를 한 번의 write로 저장합니다.
+    """
+    # 이미지 디코딩 (복사 없이 버퍼를 참조, 그레이스케일로 바로 변환)
+    gray = decode_image(data, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        logger.error("윤곽선 추출 실패: 이미지를 해석할 수 없습니다.", extra={"file_id": file_id})
+        return None
+    return _detect_edges(ArrayRaster(gray), file_id)
+
+def _encode_edges(raster) -> Buffer:
+    """
+    윤곽선을 추출해 EDGE_STORAGE_FORMAT으로 인코딩합니다.
+    큰 이미지는 타일 단위로 처리하고, packed 형식이면 전체 윤곽선 맵도 만들지 않고 밴드별로 압축합니다.
+    """
+    width, height = raster.width, raster.height
+    if width * height < EDGE_TILED_MIN_PIXELS:
+        edges = canny_edges(raster.read(0, height, 0, width))
+        return encode_png(edges) if EDGE_STORAGE_FORMAT == "png" else pack_edges(edges)
+    memory_limit = EDGE_TILE_MEMORY_MB * 1024 * 1024
+    if EDGE_STORAGE_FORMAT == "png":
+        return encode_png(tiled_canny_edges(raster, memory_limit))
+    return pack_edge_bands(width, height, iter_edge_bands(raster, memory_limit))
+
+def _detect_edges(raster, file_id: str):
+    try:
+        with stage_timer("edge_detection"):
+            data = _encode_edges(raster)
+            
+            # 결과 저장 (EDGE_STORAGE_FORMAT=packed이면 PNG 대신 1비트 마스크로 저장)
+            edge_file_path = storage_path("edges", EDGE_FILE_NAMES["png" if EDGE_STORAGE_FORMAT == "png" else "packed"].format(file_id))
+            write_file(edge_file_path, data)
         
-        # 결과 저장
-        edge_file_path = os.path.join(EDGE_DIR, f"{file_id}_edge.png")
-        cv2.imwrite(edge_file_path, edges)
+        # 윤곽선 이미지도 오브젝트 스토리지에 게시
+        if publishing_enabled():
+            publish_file("edges", edge_file_path)
         
-        print(f"Edge detection completed for {file_id}")
+        logger.debug("윤곽선 추출 완료", extra={"file_id": file_id})
         return edge_file_path
     
     except Exception as e:
-        print(f"Edge detection failed: {str(e)}")
+        logger.exception("윤곽선 추출 실패", extra={"file_id": file_id})
         return None 
\ No newline at end of file
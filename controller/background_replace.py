@@ -1,16 +1,29 @@
 # controller/background_replace.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-import boto3
-import requests
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
+from fastapi.concurrency import run_in_threadpool
 import os
+import json
+import time
 import uuid
+import asyncio
+from typing import Optional
 from dotenv import load_dotenv
 import logging
-import io
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from controller.image_normalizer import normalize_upload
+from controller.upstream import call_remove_bg, call_bria_replace, upload_to_s3
+from controller.metrics import stage_timer
+from controller.event_bus import event_bus
+from controller.upstream_gate import UpstreamBusyError, request_priority, upstream_slot_async
+from controller.storage_paths import storage_path, url_for_path
+from controller.lifecycle import track_task
+from controller.bria_mirror import mirror_bria_results
+from controller.auth import authenticated_user_id
+from controller.responses import RESPONSE_FORMAT, format_bria_response, validate_response_format
+from controller.api_keys import get_api_key
+from opentelemetry import trace
 
 # 로깅 설정
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("background_replace")
 
 # 환경 변수 로드
@@ -19,95 +32,101 @@ load_dotenv()
 # 라우터 설정
 router = APIRouter(tags=["이미지 배경 제거 및 생성"])
 
-# AWS S3 설정
-BUCKET_NAME = "briadownload"
-REGION = "ap-northeast-2"  # 서울 리전
+# SSE 연결 유지를 위한 keep-alive 주석 전송 간격 (초)
+SSE_KEEPALIVE_SECONDS = 15
 
-# S3 클라이언트 설정
-s3_client = boto3.client(
-    's3',
-    region_name=REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-)
+def _clamp_num_results(num_results: int) -> int:
+    # 유효한 결과 개수 확인
+    if num_results < 1:
+        return 1
+    if num_results > 10:
+        return 10
+    return num_results
 
-@router.post("/remove-and-generate")
-async def remove_and_generate(
-    file: UploadFile = File(...),
-    bg_prompt: str = Form("beautiful natural scenery"),
-    num_results: int = Form(4)
-):
+
+def _save_cutout(path: str, data: bytes):
+    with open(path, "wb") as out:
+        out.write(data)
+
+
+async def run_remove_and_generate(
+    contents: bytes,
+    filename: str,
+    content_type: str,
+    bg_prompt: str,
+    num_results: int,
+    request_id: str,
+    user_id: Optional[int] = None,
+    start_time: Optional[float] = None,
+    save_preview: bool = False
+) -> dict:
     """
-    이미지 배경을 제거한 후 BRIA API를 통해 새로운 배경을 생성합니다.
+    배경 제거 → S3 업로드 → BRIA 배경 생성 파이프라인을 실행합니다.
     
-    Args:
-        file: 배경을 제거할 원본 이미지 파일
-        bg_prompt: 생성할 배경에 대한 설명 프롬프트
-        num_results: 생성할 이미지 결과 개수 (기본값: 4)
+    각 단계가 끝날 때마다 request_id 토픽으로 진행 이벤트를 발행합니다.
+    - upload_received, cutout_ready, s3_stored, bria_result(결과별), completed, failed
     
-    Returns:
-        BRIA API 응답 결과와 원본 이미지 URL 등을 포함한 JSON 응답
+    업스트림 호출은 스레드 풀에서 실행되어 이벤트 루프를 막지 않습니다.
+    BRIA 결과 이미지는 모두 동시에 내려받아 저장하고, 결과별로 images 테이블에 기록합니다.
+    save_preview이면 배경 제거 결과를 previews에 저장하고 cutout_ready 이벤트로 URL을 알립니다
+    (스트리밍 엔드포인트 전용, 보존 정책의 RETENTION_PREVIEWS_DAYS가 지나면 삭제).
     """
+    if start_time is None:
+        start_time = time.perf_counter()
     try:
-        # 유효한 결과 개수 확인
-        if num_results < 1:
-            num_results = 1
-        elif num_results > 10:
-            num_results = 10
-            
-        # 파일 읽기
-        contents = await file.read()
+        trace.get_current_span().set_attribute("app.request_id", request_id)
+        event_bus.publish(request_id, "upload_received", bytes=len(contents), filename=filename)
+        
+        # 파일 정규화 (EXIF 회전, 축소, 메타데이터 제거)
+        normalized = await normalize_upload(contents, content_type, filename)
         
         # Remove.bg API를 사용하여 배경 제거
-        logger.info("Remove.bg API 호출 시작")
+        logger.debug("Remove.bg API 호출 시작", extra={"bytes": normalized.normalized_size})
         
-        remove_bg_api_key = os.getenv("REMOVE_BG_API_KEY")
+        remove_bg_api_key = get_api_key("REMOVE_BG_API_KEY")
         if not remove_bg_api_key:
             raise HTTPException(status_code=500, detail="Remove.bg API 키가 설정되지 않았습니다.")
         
-        remove_bg_response = requests.post(
-            'https://api.remove.bg/v1.0/removebg',
-            files={'image_file': contents},
-            data={'size': 'auto'},
-            headers={'X-Api-Key': remove_bg_api_key},
-        )
+        async with upstream_slot_async("remove_bg"):
+            remove_bg_response = await run_in_threadpool(
+                call_remove_bg, normalized.data, f"upload{normalized.extension}", normalized.content_type, remove_bg_api_key
+            )
         
         if remove_bg_response.status_code != 200:
-            logger.error(f"Remove.bg API 오류: {remove_bg_response.status_code} - {remove_bg_response.text}")
+            logger.error("Remove.bg API 오류", extra={"status_code": remove_bg_response.status_code, "response_body": remove_bg_response.text[:500]})
             raise HTTPException(
                 status_code=remove_bg_response.status_code,
                 detail=f"Remove.bg API 오류: {remove_bg_response.text}"
             )
         
-        logger.info("배경 제거 완료, S3 업로드 준비")
-        
         # 배경이 제거된 이미지 데이터
         no_bg_image = remove_bg_response.content
         
+        # 스트리밍 요청이면 미리보기용으로 로컬에 저장
+        if save_preview:
+            cutout_path = storage_path("previews", f"{request_id}_nobg.png")
+            await run_in_threadpool(_save_cutout, cutout_path, no_bg_image)
+            event_bus.publish(
+                request_id, "cutout_ready",
+                url=url_for_path(cutout_path), bytes=len(no_bg_image)
+            )
+        
         # 고유한 파일 이름 생성
-        request_id = str(uuid.uuid4())
-        original_filename = file.filename
-        file_name, file_ext = os.path.splitext(original_filename)
+        file_name, file_ext = os.path.splitext(filename or "upload")
         unique_filename = f"{request_id}_{file_name}_nobg.png"
         
         # S3에 파일 업로드
-        logger.info(f"S3 업로드: {unique_filename}")
-        
-        s3_client.upload_fileobj(
-            io.BytesIO(no_bg_image),
-            BUCKET_NAME,
-            unique_filename,
-            ExtraArgs={'ContentType': 'image/png'}
-        )
+        logger.debug("S3 업로드 시작", extra={"s3_key": unique_filename, "app_request_id": request_id})
         
-        # S3 URL 생성
-        file_url = f"https://{BUCKET_NAME}.s3.{REGION}.amazonaws.com/{unique_filename}"
-        logger.info(f"S3 업로드 완료: {file_url}")
+        async with upstream_slot_async("s3"):
+            file_url = await run_in_threadpool(upload_to_s3, no_bg_image, unique_filename, 'image/png')
+        logger.info("S3 업로드 완료", extra={"s3_key": unique_filename, "bytes": len(no_bg_image)})
+        event_bus.publish(request_id, "s3_stored", url=file_url)
         
         # BRIA API 호출
-        logger.info("BRIA API 호출 시작")
+        logger.debug("BRIA API 호출 시작")
         
-        bria_api_token = os.getenv("BRIA_API_TOKEN")
+        bria_api_token = get_api_key("BRIA_API_TOKEN")
         if not bria_api_token:
             raise HTTPException(status_code=500, detail="BRIA API 토큰이 설정되지 않았습니다.")
         
@@ -127,44 +146,156 @@ async def remove_and_generate(
             }
         }
         
-        # 요청 데이터 기록
-        logger.info(f"BRIA API 요청 데이터: {request_data}")
-        
-        bria_response = requests.post(
-            "https://engine.prod.bria-api.com/v1/background/replace",
-            headers={
-                "Content-Type": "application/json",
-                "api_token": bria_api_token,
-                "Cache-Control": "no-cache"
-            },
-            json=request_data,
-            timeout=60
-        )
+        # 요청 데이터 기록 (이미지 URL과 메타데이터는 제외)
+        logger.debug("BRIA API 요청", extra={"bg_prompt": bg_prompt, "num_results": num_results})
+        
+        async with upstream_slot_async("bria"):
+            bria_response = await run_in_threadpool(call_bria_replace, request_data, bria_api_token)
         
         # API 응답 확인
         if bria_response.status_code != 200:
-            logger.error(f"BRIA API 오류: {bria_response.status_code} - {bria_response.text}")
+            logger.error("BRIA API 오류", extra={"status_code": bria_response.status_code, "response_body": bria_response.text[:500]})
             raise HTTPException(
                 status_code=bria_response.status_code,
                 detail=f"BRIA API 오류: {bria_response.text}"
             )
         
         result = bria_response.json()
-        logger.info(f"BRIA API 응답 성공: {len(result.get('result', []))}개 이미지 생성됨")
+        bria_results = result.get('result', [])
+        logger.info("BRIA API 응답 성공", extra={"result_count": len(bria_results)})
         
-        # 성공 응답
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "success",
-                "original_url": file_url,
-                "bria_results": result,
-                "result_count": num_results,
-                "request_prompt": bg_prompt,
-                "request_id": request_id
-            }
+        # BRIA 결과를 동시에 내려받아 저장 (결과별 이벤트는 저장이 끝나는 대로 발행)
+        result = await mirror_bria_results(
+            result, start_time, file_url, bg_prompt, user_id,
+            on_result=lambda index, url: event_bus.publish(request_id, "bria_result", index=index, url=url)
         )
         
+        response_content = {
+            "status": "success",
+            "original_url": file_url,
+            "bria_results": result,
+            "result_count": num_results,
+            "request_prompt": bg_prompt,
+            "request_id": request_id,
+            "normalization": normalized.stats()
+        }
+        event_bus.publish(request_id, "completed", **response_content)
+        return response_content
+    
+    except HTTPException as e:
+        event_bus.publish(request_id, "failed", status_code=e.status_code, detail=e.detail)
+        raise
     except Exception as e:
-        logger.error(f"이미지 처리 중 오류 발생: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"이미지 처리 중 오류 발생: {str(e)}") 
\ No newline at end of file
+        event_bus.publish(request_id, "failed", status_code=500, detail=f"이미지 처리 중 오류 발생: {str(e)}")
+        raise
+
+
+@router.post("/remove-and-generate", dependencies=[Depends(request_priority)])
+async def remove_and_generate(
+    file: UploadFile = File(...),
+    bg_prompt: str = Form("beautiful natural scenery"),
+    num_results: int = Form(4),
+    response_format: str = Form(RESPONSE_FORMAT),
+    user_id: Optional[int] = Depends(authenticated_user_id)
+):
+    """
+    이미지 배경을 제거한 후 BRIA API를 통해 새로운 배경을 생성합니다.
+    
+    Args:
+        file: 배경을 제거할 원본 이미지 파일
+        bg_prompt: 생성할 배경에 대한 설명 프롬프트
+        num_results: 생성할 이미지 결과 개수 (기본값: 4)
+        response_format: full(기본값) 또는 compact(결과 이미지 URL만 반환)
+        user_id: 결과 이미지를 기록할 사용자 (Bearer 토큰의 사용자만, 토큰이 없으면 기록하지 않음)
+    
+    Returns:
+        BRIA API 응답 결과와 원본 이미지 URL 등을 포함한 JSON 응답
+    """
+    response_format = validate_response_format(response_format)
+    start_time = time.perf_counter()
+    try:
+        # 파일 읽기
+        with stage_timer("upload_read"):
+            contents = await file.read()
+        
+        response_content = await run_remove_and_generate(
+            contents, file.filename, file.content_type, bg_prompt,
+            _clamp_num_results(num_results), str(uuid.uuid4()),
+            user_id=user_id, start_time=start_time
+        )
+        
+        # 성공 응답
+        return ORJSONResponse(status_code=200, content=format_bria_response(response_content, response_format))
+        
+    except UpstreamBusyError:
+        raise
+    except Exception as e:
+        logger.exception("이미지 처리 중 오류 발생")
+        raise HTTPException(status_code=500, detail=f"이미지 처리 중 오류 발생: {str(e)}")
+
+
+def _format_sse(event) -> str:
+    payload = json.dumps(event.data, ensure_ascii=False, default=str)
+    return f"id: {event.sequence}\nevent: {event.type}\ndata: {payload}\n\n"
+
+
+async def _stream_events(subscription, task: asyncio.Task):
+    try:
+        while True:
+            event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+            if event is None:
+                if task.done() and subscription.queue.empty():
+                    break
+                # 프록시가 연결을 끊지 않도록 주석 전송
+                yield ": keep-alive\n\n"
+                continue
+            yield _format_sse(event)
+            if event.type in ("completed", "failed"):
+                break
+    finally:
+        subscription.close()
+
+
+def _log_task_result(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("스트리밍 파이프라인 실패: %s", task.exception())
+
+
+@router.post("/remove-and-generate/stream", dependencies=[Depends(request_priority)])
+async def remove_and_generate_stream(
+    file: UploadFile = File(...),
+    bg_prompt: str = Form("beautiful natural scenery"),
+    num_results: int = Form(4),
+    user_id: Optional[int] = Depends(authenticated_user_id)
+):
+    """
+    /remove-and-generate와 같은 처리를 하되, 단계별 진행 상황을 Server-Sent Events로 전송합니다.
+    
+    이벤트 종류:
+        upload_received, cutout_ready(url), s3_stored(url), bria_result(index, url), completed, failed
+    """
+    start_time = time.perf_counter()
+    with stage_timer("upload_read"):
+        contents = await file.read()
+    
+    request_id = str(uuid.uuid4())
+    
+    # 이벤트를 놓치지 않도록 파이프라인 시작 전에 구독
+    subscription = event_bus.subscribe(request_id)
+    task = asyncio.create_task(run_remove_and_generate(
+        contents, file.filename, file.content_type, bg_prompt,
+        _clamp_num_results(num_results), request_id,
+        user_id=user_id, start_time=start_time, save_preview=True
+    ))
+    track_task(task)
+    task.add_done_callback(_log_task_result)
+    
+    return StreamingResponse(
+        _stream_events(subscription, task),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Pipeline-Request-Id": request_id
+        }
+    )
@@ -0,0 +1,214 @@
+# controller/bria_mirror.py
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import mimetypes
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import aiofiles
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from model.database import SessionLocal, Image, User, UserImage
+from controller.metrics import stage_timer, record_upstream
+from controller.storage_paths import category_dir, resolve_path, storage_path
+from controller.streaming_io import CHUNK_SIZE, PayloadTooLargeError
+from controller.responses import bria_result_urls
+from controller.result_publishing import result_url
+from controller.usage import record_usage
+
+# 로깅 설정
+logger = logging.getLogger("bria_mirror")
+
+load_dotenv()
+
+# BRIA 결과 이미지 미러링 설정
+BRIA_MIRROR_ENABLED = os.getenv("BRIA_MIRROR_ENABLED", "true").lower() == "true"
+# 전체 요청에 걸친 동시 다운로드 수
+BRIA_MIRROR_CONCURRENCY = int(os.getenv("BRIA_MIRROR_CONCURRENCY", "16"))
+BRIA_MIRROR_TIMEOUT = float(os.getenv("BRIA_MIRROR_TIMEOUT", "30"))
+BRIA_MIRROR_MAX_BYTES = int(os.getenv("BRIA_MIRROR_MAX_BYTES", str(50 * 1024 * 1024)))
+
+MODEL_VERSION = "bria-replace-bg"
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _download_slots() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(BRIA_MIRROR_CONCURRENCY)
+    return _semaphore
+
+
+@dataclass
+class MirroredImage:
+    """미러링한 결과 이미지 한 개"""
+    index: int
+    source_url: str
+    path: str
+    content_hash: str
+    size: int
+    elapsed: float  # 파이프라인 시작부터 이 결과의 저장이 끝날 때까지 (초)
+    deduplicated: bool
+    url: str = ""
+    image_id: Optional[int] = None
+
+
+async def _download(client: httpx.AsyncClient, index: int, url: str, start_time: float) -> MirroredImage:
+    """
+    결과 이미지를 내려받으면서 임시 파일에 바로 기록하고 SHA-256을 계산합니다.
+    같은 내용의 파일이 이미 있으면 임시 파일을 지우고 기존 파일을 사용합니다.
+    """
+    temp_path = os.path.join(category_dir("bria_results"), f".{uuid.uuid4().hex}.part")
+    os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with _download_slots():
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "image/png").split(";")[0].strip()
+                async with aiofiles.open(temp_path, "wb") as out:
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > BRIA_MIRROR_MAX_BYTES:
+                            raise PayloadTooLargeError(f"결과 이미지가 너무 큽니다 (최대 {BRIA_MIRROR_MAX_BYTES}바이트).")
+                        hasher.update(chunk)
+                        await out.write(chunk)
+            record_upstream("bria_cdn", response.status_code, received_bytes=size)
+
+        content_hash = hasher.hexdigest()
+        extension = mimetypes.guess_extension(content_type) or ".png"
+        name = f"{content_hash}{extension}"
+        existing = resolve_path("bria_results", name)
+        if existing:
+            os.remove(temp_path)
+            path, deduplicated = existing, True
+        else:
+            path = storage_path("bria_results", name)
+            os.replace(temp_path, path)
+            deduplicated = False
+        return MirroredImage(index, url, path, content_hash, size, time.perf_counter() - start_time, deduplicated)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def record_mirrored_images(
+    mirrored: List[MirroredImage],
+    user_id: Optional[int],
+    original_image_url: str,
+    bg_prompt: str
+):
+    """
+    미러링한 결과를 images 테이블에 결과별로 기록합니다.
+    같은 사용자의 같은 내용(content_hash) 결과가 이미 있으면 새 행을 만들지 않고 기존 행을 사용합니다.
+    """
+    db = SessionLocal()
+    try:
+        if user_id and db.query(User.user_id).filter(User.user_id == user_id).scalar() is None:
+            logger.warning("미러링 결과 기록: 사용자를 찾을 수 없어 사용자 없이 기록합니다.", extra={"user_id": user_id})
+            user_id = None
+
+        hashes = [item.content_hash for item in mirrored]
+        existing = {}
+        for image in db.query(Image).filter(Image.content_hash.in_(hashes), Image.user_id == user_id):
+            existing.setdefault(image.content_hash, image)
+
+        for item in mirrored:
+            image = existing.get(item.content_hash)
+            if image is None:
+                image = Image(
+                    user_id=user_id,
+                    original_image_url=original_image_url,
+                    generated_image_url=item.path,
+                    background_style=bg_prompt,
+                    model_version=MODEL_VERSION,
+                    processing_time=item.elapsed,
+                    content_hash=item.content_hash,
+                    created_at=datetime.utcnow()
+                )
+                db.add(image)
+                db.flush()
+                if user_id:
+                    # 배경 생성 엔드포인트는 크레딧을 차감하지 않음
+                    db.add(UserImage(user_id=user_id, image_id=image.image_id, credits_used=0))
+                record_usage(db, image, 0)
+                existing[item.content_hash] = image
+            item.image_id = image.image_id
+        with stage_timer("db_commit"):
+            db.commit()
+    finally:
+        db.close()
+
+
+async def mirror_bria_results(
+    bria_response: Dict[str, Any],
+    start_time: float,
+    original_image_url: str,
+    bg_prompt: str,
+    user_id: Optional[int] = None,
+    on_result: Optional[Callable[[int, str], None]] = None
+) -> Dict[str, Any]:
+    """
+    BRIA 결과 이미지를 모두 동시에 내려받아 저장하고, 토큰의 사용자(user_id)가 있으면 images 테이블에 기록합니다.
+
+    응답의 결과 URL을 우리 저장소 URL(/uploads 또는 RESULT_PUBLISH_MODE=s3이면 서명 URL)로 바꾸고
+    image_ids를 추가한 사본을 반환합니다. 미러링에 실패한 결과는 BRIA URL을 그대로 둡니다.
+    on_result는 결과마다 저장이 끝나는 대로 (순번, URL)로 호출됩니다.
+    """
+    urls = bria_result_urls(bria_response)
+    if not BRIA_MIRROR_ENABLED or not urls:
+        if on_result:
+            for index, url in enumerate(urls):
+                on_result(index, url)
+        return bria_response
+
+    async def mirror_one(client: httpx.AsyncClient, index: int, url: str) -> Optional[MirroredImage]:
+        try:
+            item = await _download(client, index, url, start_time)
+            item.url = await run_in_threadpool(result_url, "bria_results", item.path)
+        except Exception as e:
+            record_upstream("bria_cdn", "error")
+            logger.warning("BRIA 결과 미러링 실패", extra={"index": index, "error": str(e)})
+            item = None
+        if on_result:
+            on_result(index, item.url if item else url)
+        return item
+
+    with stage_timer("bria_mirror"):
+        async with httpx.AsyncClient(timeout=BRIA_MIRROR_TIMEOUT, follow_redirects=True) as client:
+            results = await asyncio.gather(*(mirror_one(client, index, url) for index, url in enumerate(urls)))
+        mirrored = [item for item in results if item is not None]
+        # 누구의 결과인지 확인할 수 없는 비인증 요청은 기록하지 않음 (image_ids는 None)
+        if mirrored and user_id:
+            await run_in_threadpool(record_mirrored_images, mirrored, user_id, original_image_url, bg_prompt)
+
+    logger.info("BRIA 결과 미러링 완료", extra={
+        "mirrored": len(mirrored), "failed": len(urls) - len(mirrored),
+        "deduplicated": sum(1 for item in mirrored if item.deduplicated),
+        "bytes": sum(item.size for item in mirrored)
+    })
+
+    by_index = {item.index: item for item in mirrored}
+    rewritten = []
+    url_index = 0
+    for item in bria_response.get("result", []):
+        url = item[0] if isinstance(item, list) and item else item
+        if isinstance(url, str):
+            mirror = by_index.get(url_index)
+            url_index += 1
+            if mirror:
+                item = [mirror.url, *item[1:]] if isinstance(item, list) else mirror.url
+        rewritten.append(item)
+    return {
+        **bria_response,
+        "result": rewritten,
+        "image_ids": [by_index[i].image_id if i in by_index else None for i in range(len(urls))],
+    }
@@ -0,0 +1,133 @@
+# controller/compression.py
+import os
+import gzip
+import logging
+from typing import List, Optional
+from dotenv import load_dotenv
+from controller.metrics import RESPONSE_BYTES
+
+try:
+    import brotli
+except ImportError:  # brotli가 없으면 gzip만 사용
+    brotli = None
+
+# 로깅 설정
+logger = logging.getLogger("compression")
+
+load_dotenv()
+
+# 응답 압축 설정
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# 이 크기(바이트)보다 작은 응답은 압축하지 않음
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# brotli 품질 (0~11). 요청마다 압축하므로 높은 값은 CPU 비용이 큼
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# 압축 효과가 있는 응답 형식
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml", "application/x-ndjson")
+
+
+def available_encodings() -> List[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Accept-Encoding 헤더에서 사용할 압축 방식을 고릅니다 (br > gzip, q=0은 제외).
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    for encoding in available_encodings():
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _is_compressible(headers) -> bool:
+    content_type = ""
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value.decode("latin-1").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+class CompressionMiddleware:
+    """
+    JSON 등 텍스트 응답을 brotli(설치된 경우) 또는 gzip으로 압축하는 ASGI 미들웨어
+
+    한 번에 전송되는 응답만 압축하고, SSE나 파일 같은 스트리밍 응답은 버퍼링하지 않도록 그대로 전달합니다.
+    minimum_size보다 작은 응답은 압축 효과보다 비용이 크므로 압축하지 않습니다.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if not COMPRESSION_ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        started = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, started
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or started:
+                await send(message)
+                return
+
+            started = True
+            # 캐시가 압축 여부별로 응답을 구분하도록 Vary 헤더 추가
+            response_headers = [(name, value) for name, value in start_message.get("headers", []) if name != b"vary"]
+            vary = b", ".join(value for name, value in start_message.get("headers", []) if name == b"vary")
+            if b"accept-encoding" not in vary.lower():
+                vary = vary + b", Accept-Encoding" if vary else b"Accept-Encoding"
+            response_headers.append((b"vary", vary))
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size or not _is_compressible(response_headers):
+                await send({**start_message, "headers": response_headers})
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            RESPONSE_BYTES.labels(encoding, "raw").inc(len(body))
+            RESPONSE_BYTES.labels(encoding, "sent").inc(len(compressed))
+            response_headers = [(name, value) for name, value in response_headers if name != b"content-length"]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,122 @@
+# controller/event_bus.py
+import time
+import asyncio
+import logging
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# 로깅 설정
+logger = logging.getLogger("event_bus")
+
+
+@dataclass
+class Event:
+    """파이프라인 진행 이벤트"""
+    topic: str
+    type: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    sequence: int = 0
+    timestamp: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        return {
+            "topic": self.topic,
+            "type": self.type,
+            "sequence": self.sequence,
+            "timestamp": self.timestamp,
+            "data": self.data,
+        }
+
+
+class Subscription:
+    """특정 토픽의 이벤트를 순서대로 받는 비동기 이터레이터"""
+
+    def __init__(self, bus: "EventBus", topic: str, loop: asyncio.AbstractEventLoop):
+        self.bus = bus
+        self.topic = topic
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def _deliver(self, event: Event):
+        # 다른 스레드에서 발행된 이벤트도 구독자의 이벤트 루프에서 큐에 넣음
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            # 이벤트 루프가 이미 종료된 경우
+            pass
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """다음 이벤트를 기다립니다. 시간 초과 시 None을 반환합니다."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        return await self.queue.get()
+
+
+class EventBus:
+    """
+    프로세스 내부 발행/구독 이벤트 버스
+
+    토픽(요청 ID 등) 단위 구독과 전체 이벤트 리스너를 지원합니다.
+    SSE 진행 상황 스트리밍뿐 아니라 이후 작업/알림 시스템도 같은 이벤트를 받을 수 있습니다.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[str, List[Subscription]] = {}
+        self._listeners: List[Callable[[Event], None]] = []
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(self, topic, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(topic, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.topic, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.topic, None)
+
+    def add_listener(self, listener: Callable[[Event], None]):
+        """모든 토픽의 이벤트를 받는 리스너를 등록합니다 (발행한 스레드에서 호출됨)."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Event], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def publish(self, topic: str, event_type: str, **data) -> Event:
+        """이벤트를 발행합니다. 이벤트 루프와 작업 스레드 어디서나 호출할 수 있습니다."""
+        event = Event(topic=topic, type=event_type, data=data, sequence=next(self._sequence))
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, ()))
+            listeners = list(self._listeners)
+        for subscription in subscriptions:
+            subscription._deliver(event)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("이벤트 리스너 실행 실패", extra={"event_type": event_type})
+        return event
+
+
+# 애플리케이션 전역 이벤트 버스
+event_bus = EventBus()
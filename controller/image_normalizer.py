@@ -0,0 +1,272 @@
+# controller/image_normalizer.py
+import os
+import io
+import time
+import asyncio
+import contextvars
+import functools
+import logging
+from dataclasses import dataclass
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage, ImageOps
+from controller.metrics import STAGE_LATENCY, NORMALIZATION_BYTES_SAVED
+from controller.tracing import tracer
+
+# 로깅 설정
+logger = logging.getLogger("image_normalizer")
+
+# 정규화 설정 (환경 변수로 조정 가능)
+IMAGE_NORMALIZE_ENABLED = os.getenv("IMAGE_NORMALIZE_ENABLED", "true").lower() == "true"
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "2500"))
+IMAGE_NORMALIZE_FORMAT = os.getenv("IMAGE_NORMALIZE_FORMAT", "auto").lower()  # auto, jpeg, png, webp
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "90"))
+IMAGE_NORMALIZE_WORKERS = int(os.getenv("IMAGE_NORMALIZE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Pillow의 인코딩/디코딩은 GIL을 해제하므로 스레드 풀로 충분합니다
+_executor = ThreadPoolExecutor(max_workers=IMAGE_NORMALIZE_WORKERS, thread_name_prefix="normalize")
+
+# 출력 포맷별 확장자와 Content-Type
+_FORMAT_INFO = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+}
+
+
+@dataclass
+class NormalizedImage:
+    """정규화된 이미지와 처리 통계"""
+    data: bytes
+    content_type: str
+    extension: str
+    original_size: int
+    normalized_size: int
+    width: int
+    height: int
+    elapsed: float
+    changed: bool
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - self.normalized_size
+
+    def stats(self) -> dict:
+        return {
+            "original_bytes": self.original_size,
+            "normalized_bytes": self.normalized_size,
+            "bytes_saved": self.bytes_saved,
+            "width": self.width,
+            "height": self.height,
+            "elapsed_ms": round(self.elapsed * 1000, 2),
+            "changed": self.changed,
+        }
+
+
+def _has_alpha(image: PILImage.Image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _target_format(image: PILImage.Image) -> str:
+    if IMAGE_NORMALIZE_FORMAT == "jpeg":
+        # JPEG는 투명도를 지원하지 않으므로 알파 채널이 있으면 PNG로 유지
+        return "PNG" if _has_alpha(image) else "JPEG"
+    if IMAGE_NORMALIZE_FORMAT in ("png", "webp"):
+        return IMAGE_NORMALIZE_FORMAT.upper()
+    return "PNG" if _has_alpha(image) else "JPEG"
+
+
+# 무손실로 지우는 JPEG 세그먼트: APP1(EXIF/XMP), APP3~APP13(IPTC 등), APP15, COM
+# (APP0 JFIF, APP14 Adobe 색 변환은 디코딩에 필요하고, APP2는 ICC 프로필만 유지)
+_JPEG_METADATA_MARKERS = {0xE1, *range(0xE3, 0xEE), 0xEF, 0xFE}
+# 무손실로 지우는 PNG 청크 (EXIF, 텍스트, 수정 시간)
+_PNG_METADATA_CHUNKS = {b"eXIf", b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+
+
+def _strip_jpeg_metadata(contents: bytes) -> Optional[bytes]:
+    if contents[:2] != b"\xff\xd8":
+        return None
+    parts = [contents[:2]]
+    i = 2
+    while i + 4 <= len(contents):
+        if contents[i] != 0xFF:
+            return None
+        marker = contents[i + 1]
+        if marker == 0xFF:
+            # 채움 바이트
+            i += 1
+            continue
+        if marker == 0xDA:
+            # 스캔 데이터부터는 그대로 유지
+            parts.append(contents[i:])
+            return b"".join(parts)
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            parts.append(contents[i:i + 2])
+            i += 2
+            continue
+        end = i + 2 + int.from_bytes(contents[i + 2:i + 4], "big")
+        if end > len(contents):
+            return None
+        segment = contents[i:end]
+        if marker == 0xE2:
+            keep = segment[4:16] == b"ICC_PROFILE\0"
+        else:
+            keep = marker not in _JPEG_METADATA_MARKERS
+        if keep:
+            parts.append(segment)
+        i = end
+    return None
+
+
+def _strip_png_metadata(contents: bytes) -> Optional[bytes]:
+    signature = b"\x89PNG\r\n\x1a\n"
+    if contents[:8] != signature:
+        return None
+    parts = [signature]
+    i = 8
+    while i + 12 <= len(contents):
+        length = int.from_bytes(contents[i:i + 4], "big")
+        kind = contents[i + 4:i + 8]
+        end = i + 12 + length
+        if end > len(contents):
+            return None
+        if kind not in _PNG_METADATA_CHUNKS:
+            parts.append(contents[i:end])
+        i = end
+        if kind == b"IEND":
+            return b"".join(parts)
+    return None
+
+
+def strip_metadata(contents: bytes, image_format: str) -> Optional[bytes]:
+    """
+    재인코딩 없이 메타데이터(EXIF/GPS, XMP, IPTC, 텍스트)만 지운 바이트를 반환합니다.
+    JPEG/PNG가 아니거나 구조를 해석할 수 없으면 None을 반환합니다.
+    """
+    if image_format == "JPEG":
+        return _strip_jpeg_metadata(contents)
+    if image_format == "PNG":
+        return _strip_png_metadata(contents)
+    return None
+
+
+def normalize_image(contents: bytes, content_type: str = None, filename: str = None) -> NormalizedImage:
+    """
+    업스트림 API로 보내기 전에 이미지를 정규화합니다.
+
+    - EXIF 방향 정보에 따라 회전
+    - 긴 변을 IMAGE_MAX_EDGE 이하로 축소
+    - 메타데이터 제거 후 효율적인 포맷으로 재인코딩
+
+    재인코딩 결과가 원본보다 크고 회전/축소가 필요 없었다면 원본에서 메타데이터만 무손실로 지워 사용합니다.
+    (JPEG/PNG가 아니어서 무손실로 지울 수 없으면 재인코딩 결과를 사용하므로 메타데이터는 항상 제거됨)
+    """
+    start_time = time.perf_counter()
+    original_size = len(contents)
+    original_ext = os.path.splitext(filename)[1].lower() if filename else ""
+
+    image = PILImage.open(io.BytesIO(contents))
+    source_format = image.format
+    original_dimensions = image.size
+
+    # JPEG는 디코딩 단계에서 축소하여 메모리 사용량을 줄임
+    if image.format == "JPEG" and max(image.size) > IMAGE_MAX_EDGE:
+        image.draft(image.mode, (IMAGE_MAX_EDGE, IMAGE_MAX_EDGE))
+
+    # EXIF 방향 적용
+    rotated = image.getexif().get(0x0112, 1) != 1
+    image = ImageOps.exif_transpose(image)
+
+    # 긴 변 제한
+    if max(image.size) > IMAGE_MAX_EDGE:
+        image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), PILImage.Resampling.LANCZOS)
+    resized = max(image.size) < max(original_dimensions)
+
+    target_format = _target_format(image)
+    if target_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif target_format in ("PNG", "WEBP") and image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+
+    # 메타데이터 없이 재인코딩
+    output = io.BytesIO()
+    save_options = {}
+    if target_format == "JPEG":
+        save_options = {"quality": IMAGE_JPEG_QUALITY, "optimize": True}
+    elif target_format == "PNG":
+        save_options = {"optimize": True}
+    elif target_format == "WEBP":
+        save_options = {"quality": IMAGE_JPEG_QUALITY, "method": 4}
+    image.save(output, format=target_format, **save_options)
+    data = output.getvalue()
+    extension, normalized_type = _FORMAT_INFO[target_format]
+
+    changed = True
+    if len(data) >= original_size and not (rotated or resized):
+        # 재인코딩 이득이 없으면 원본 화질을 유지하고 메타데이터만 제거
+        stripped = strip_metadata(contents, source_format)
+        if stripped is not None:
+            data = stripped
+            extension = original_ext or extension
+            normalized_type = content_type or normalized_type
+            changed = len(stripped) != original_size
+
+    return NormalizedImage(
+        data=data,
+        content_type=normalized_type,
+        extension=extension,
+        original_size=original_size,
+        normalized_size=len(data),
+        width=image.size[0],
+        height=image.size[1],
+        elapsed=time.perf_counter() - start_time,
+        changed=changed,
+    )
+
+
+def _traced_normalize(contents: bytes, content_type: str, filename: str) -> NormalizedImage:
+    with tracer.start_as_current_span("normalize") as span:
+        result = normalize_image(contents, content_type, filename)
+        span.set_attribute("image.original_bytes", result.original_size)
+        span.set_attribute("image.normalized_bytes", result.normalized_size)
+        return result
+
+
+async def normalize_upload(contents: bytes, content_type: str = None, filename: str = None) -> NormalizedImage:
+    """
+    스레드 풀에서 이미지를 정규화합니다.
+    정규화가 비활성화되어 있거나 이미지를 해석할 수 없으면 원본을 그대로 반환합니다.
+    """
+    if not IMAGE_NORMALIZE_ENABLED:
+        return _passthrough(contents, content_type, filename, 0.0)
+
+    start_time = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        # 트레이스 컨텍스트가 작업 스레드에서도 유지되도록 컨텍스트를 복사하여 실행
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, _traced_normalize, contents, content_type, filename)
+        result = await loop.run_in_executor(_executor, call)
+    except Exception as e:
+        logger.warning("이미지 정규화 실패, 원본 사용: %s", e)
+        return _passthrough(contents, content_type, filename, time.perf_counter() - start_time)
+
+    STAGE_LATENCY.labels("normalize").observe(time.perf_counter() - start_time)
+    NORMALIZATION_BYTES_SAVED.inc(max(result.bytes_saved, 0))
+    logger.debug("이미지 정규화 완료", extra=result.stats())
+    return result
+
+
+def _passthrough(contents: bytes, content_type: str, filename: str, elapsed: float) -> NormalizedImage:
+    extension = os.path.splitext(filename)[1].lower() if filename else ""
+    return NormalizedImage(
+        data=contents,
+        content_type=content_type or "application/octet-stream",
+        extension=extension,
+        original_size=len(contents),
+        normalized_size=len(contents),
+        width=0,
+        height=0,
+        elapsed=elapsed,
+        changed=False,
+    )
@@ -0,0 +1,372 @@
+# controller/image_pipeline.py
+import os
+import math
+import mmap
+import zlib
+import struct
+import asyncio
+import logging
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+import aiofiles
+import cv2
+import numpy as np
+
+# 로깅 설정
+logger = logging.getLogger("image_pipeline")
+
+# 단계 사이에 전달하는 이미지 데이터 (bytes는 복사 없이 memoryview/ndarray로 참조)
+Buffer = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+def as_array(data: Buffer) -> np.ndarray:
+    """바이트 버퍼를 복사 없이 uint8 배열로 참조합니다."""
+    if isinstance(data, np.ndarray):
+        return data
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def decode_image(data: Buffer, flags: int = cv2.IMREAD_COLOR) -> Optional[np.ndarray]:
+    """
+    메모리의 인코딩된 이미지를 디코딩합니다 (디스크를 거치지 않음).
+    해석할 수 없으면 None을 반환합니다.
+    """
+    return cv2.imdecode(as_array(data), flags)
+
+
+def encode_png(image: np.ndarray) -> memoryview:
+    """PNG로 인코딩한 결과를 복사 없이 memoryview로 반환합니다."""
+    ok, encoded = cv2.imencode(".png", image)
+    if not ok:
+        raise ValueError("PNG 인코딩 실패")
+    return memoryview(encoded)
+
+
+def canny_edges(gray: np.ndarray) -> np.ndarray:
+    """그레이스케일 이미지에서 윤곽선(Edge Map)을 추출합니다."""
+    # 가우시안 블러 적용 (노이즈 제거)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    # 캐니 에지 감지
+    return cv2.Canny(blurred, 50, 150)
+
+
+# 압축 윤곽선 파일 형식: 매직(4바이트) + 너비/높이(uint32 LE) + zlib(np.packbits(마스크))
+EDGE_MAGIC = b"EDG1"
+
+
+def pack_edges(edges: np.ndarray, level: int = 1) -> bytes:
+    """
+    이진 윤곽선 맵을 픽셀당 1비트로 묶고 zlib으로 압축합니다.
+    윤곽선 맵은 대부분 0이므로 deflate가 연속 구간을 런 길이처럼 줄여 줍니다.
+    윤곽선이 촘촘한 사진에서는 높은 압축 수준의 이득이 작고 시간만 늘어나므로 기본값은 1입니다.
+    """
+    height, width = edges.shape[:2]
+    bits = np.packbits(edges > 0)
+    return EDGE_MAGIC + struct.pack("<II", width, height) + zlib.compress(bits.tobytes(), level)
+
+
+def unpack_edges(data: Buffer) -> np.ndarray:
+    """pack_edges 결과를 0/255 값의 uint8 윤곽선 맵으로 되돌립니다."""
+    data = memoryview(as_array(data))
+    if bytes(data[:4]) != EDGE_MAGIC:
+        raise ValueError("압축 윤곽선 파일 형식이 아닙니다.")
+    width, height = struct.unpack_from("<II", data, 4)
+    bits = np.frombuffer(zlib.decompress(data[12:]), dtype=np.uint8)
+    return np.unpackbits(bits, count=width * height).reshape(height, width) * np.uint8(255)
+
+
+def read_packed_header(f) -> Tuple[int, int]:
+    """압축 윤곽선 파일의 헤더를 읽고 (너비, 높이)를 반환합니다 (파일 위치는 압축 데이터 시작)."""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != EDGE_MAGIC:
+        raise ValueError("압축 윤곽선 파일 형식이 아닙니다.")
+    return struct.unpack_from("<II", header, 4)
+
+
+def iter_unpacked_bands(f, width: int, height: int, memory_limit: int, chunk_size: int = 65536) -> Iterable[np.ndarray]:
+    """
+    압축 윤곽선 파일을 0/255 값의 행 밴드로 나눠 풉니다 (전체 윤곽선 맵을 만들지 않음).
+    희소한 마스크는 압축률이 매우 높으므로 압축 해제 출력도 밴드 크기로 제한합니다.
+    """
+    # 밴드, 비트 버퍼, PNG 행 복사본을 합쳐 memory_limit 안에 들도록 하고, 밴드 경계가 바이트에 맞도록 8행 단위로 자름
+    rows = max(8, memory_limit // (width * 3) // 8 * 8)
+    decompressor = zlib.decompressobj()
+    y = 0
+    while y < height:
+        count = min(rows, height - y) * width
+        needed = (count + 7) // 8
+        bits = bytearray()
+        while len(bits) < needed and not decompressor.eof:
+            data = decompressor.unconsumed_tail or f.read(chunk_size)
+            if not data:
+                break
+            bits += decompressor.decompress(data, needed - len(bits))
+        if len(bits) < needed:
+            raise ValueError("압축 윤곽선 데이터가 잘렸습니다.")
+        band = np.unpackbits(np.frombuffer(bits, dtype=np.uint8), count=count).reshape(-1, width)
+        del bits
+        yield np.multiply(band, 255, out=band)
+        y += count // width
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def iter_png_bands(width: int, height: int, bands: Iterable[np.ndarray], level: int = 1) -> Iterator[bytes]:
+    """
+    8비트 그레이스케일 밴드를 PNG 조각으로 나눠 돌려줍니다 (행마다 필터 0, 밴드마다 IDAT).
+    encode_png와 같은 0/255 PNG를 만들지만 전체 이미지를 메모리에 올리지 않으므로 응답으로 바로 스트리밍할 수 있습니다.
+    """
+    yield b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+    compressor = zlib.compressobj(level)
+    for band in bands:
+        rows = np.zeros((band.shape[0], width + 1), dtype=np.uint8)
+        rows[:, 1:] = band
+        data = compressor.compress(memoryview(rows).cast("B"))
+        if data:
+            yield _png_chunk(b"IDAT", data)
+    yield _png_chunk(b"IDAT", compressor.flush()) + _png_chunk(b"IEND", b"")
+
+
+# 타일 단위 윤곽선 추출 (대형 이미지)
+# 5x5 가우시안(2픽셀) + Sobel(1) + 비최대 억제(1)만 보면 4픽셀 겹침으로 타일 안쪽 결과가 전체 처리와 같고,
+# 나머지 여유는 약한 윤곽선이 타일 경계를 넘어 이어지는 히스테리시스 연결을 위한 것
+TILE_OVERLAP = 32
+# 타일 하나를 처리할 때 픽셀당 필요한 메모리 (입력, 블러, Sobel dx/dy int16, Canny 맵, 출력)
+CANNY_BYTES_PER_PIXEL = 12
+
+
+class ArrayRaster:
+    """메모리에 있는 그레이스케일 배열 (타일 처리 입력)"""
+
+    def __init__(self, gray: np.ndarray):
+        self.gray = gray
+        self.height, self.width = gray.shape[:2]
+
+    def read(self, y0: int, y1: int, x0: int, x1: int) -> np.ndarray:
+        return self.gray[y0:y1, x0:x1]
+
+    def release(self, y: int):
+        pass
+
+    def close(self):
+        self.gray = None
+
+
+class MappedRaster:
+    """
+    압축하지 않은 래스터 파일(.npy, 바이너리 PGM/PPM)을 메모리 매핑으로 읽습니다 (타일 처리 입력).
+    다 읽은 행은 madvise(MADV_DONTNEED)로 내려서 이미지가 커져도 RSS가 늘지 않습니다.
+    """
+
+    def __init__(self, path: str, offset: int, height: int, width: int, channels: int, color_code: Optional[int] = None):
+        self.height, self.width = height, width
+        self.offset = offset
+        self.row_bytes = width * channels
+        self.color_code = color_code
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        self._pixels = np.frombuffer(self._mmap, np.uint8, count=height * self.row_bytes, offset=offset).reshape(shape)
+        self._released = 0
+
+    def read(self, y0: int, y1: int, x0: int, x1: int) -> np.ndarray:
+        tile = self._pixels[y0:y1, x0:x1]
+        return cv2.cvtColor(tile, self.color_code) if self.color_code is not None else tile
+
+    def release(self, y: int):
+        """y 이전 행은 다시 읽지 않으므로 해당 페이지를 매핑에서 내립니다."""
+        end = (self.offset + y * self.row_bytes) // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > self._released:
+            self._mmap.madvise(mmap.MADV_DONTNEED, self._released, end - self._released)
+            self._released = end
+
+    def close(self):
+        self._pixels = None
+        self._mmap.close()
+        self._file.close()
+
+
+def _read_pnm_header(f) -> Optional[Tuple[str, int, int, int]]:
+    """바이너리 PGM(P5)/PPM(P6) 헤더를 읽어 (매직, 너비, 높이, 최댓값)을 반환합니다."""
+    magic = f.read(2)
+    if magic not in (b"P5", b"P6"):
+        return None
+    values = []
+    token = b""
+    while len(values) < 3:
+        char = f.read(1)
+        if not char:
+            return None
+        if char == b"#":
+            f.readline()
+        elif char.isspace():
+            if token:
+                values.append(int(token))
+                token = b""
+        else:
+            token += char
+    # 최댓값 뒤의 공백 한 글자까지 읽은 위치부터 픽셀 데이터
+    return magic.decode(), values[0], values[1], values[2]
+
+
+def _open_mapped(path: str) -> Optional[MappedRaster]:
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        if extension == ".npy":
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                return None
+            if dtype != np.uint8 or fortran_order or len(shape) not in (2, 3) or (len(shape) == 3 and shape[2] != 3):
+                return None
+            channels = 1 if len(shape) == 2 else 3
+            # OpenCV로 만든 배열로 보고 BGR 순서로 해석
+            return MappedRaster(path, f.tell(), shape[0], shape[1], channels, cv2.COLOR_BGR2GRAY if channels == 3 else None)
+        if extension in (".pgm", ".ppm", ".pnm"):
+            header = _read_pnm_header(f)
+            if header is None or header[3] > 255:
+                return None
+            magic, width, height, _ = header
+            channels = 1 if magic == "P5" else 3
+            return MappedRaster(path, f.tell(), height, width, channels, cv2.COLOR_RGB2GRAY if channels == 3 else None)
+    return None
+
+
+def open_raster(path: str):
+    """
+    타일 처리용 입력을 엽니다.
+    메모리 매핑할 수 있는 형식이면 필요한 행만 읽고, 그 외(JPEG, PNG 등)는 그레이스케일로 한 번 디코딩합니다
+    (픽셀당 1바이트, 컬러 디코딩과 블러/Canny 중간 결과는 만들지 않음).
+    """
+    raster = _open_mapped(path)
+    if raster is not None:
+        return raster
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("이미지를 해석할 수 없습니다.")
+    return ArrayRaster(gray)
+
+
+def tile_plan(width: int, memory_limit: int, overlap: int = TILE_OVERLAP) -> Tuple[int, int]:
+    """
+    메모리 한도 안에서 처리할 (밴드 높이, 타일 너비)를 정합니다.
+    한도의 절반은 밴드(출력 밴드와 매핑된 입력 행, 행당 이미지 너비 x 2바이트),
+    나머지 절반은 타일 하나의 작업 메모리에 씁니다.
+    밴드 높이는 8의 배수이므로 밴드별 packbits 결과를 이어 붙이면 전체를 한 번에 묶은 것과 같습니다.
+    """
+    half = memory_limit // 2
+    band_height = min(half // (2 * max(width, 1)) - 2 * overlap, int(math.sqrt(half / CANNY_BYTES_PER_PIXEL)))
+    band_height = max(8, band_height // 8 * 8)
+    tile_width = max(64, half // (CANNY_BYTES_PER_PIXEL * (band_height + 2 * overlap)) - 2 * overlap)
+    return band_height, tile_width
+
+
+def iter_edge_bands(raster, memory_limit: int, overlap: int = TILE_OVERLAP) -> Iterable[np.ndarray]:
+    """
+    이미지를 겹치는 타일로 나눠 Canny를 적용하고 가로 밴드 단위로 결과를 돌려줍니다.
+    각 타일은 겹침을 포함해 처리한 뒤 가운데만 사용하므로 타일 경계에 이음매가 생기지 않습니다.
+    """
+    height, width = raster.height, raster.width
+    band_height, tile_width = tile_plan(width, memory_limit, overlap)
+    for y0 in range(0, height, band_height):
+        y1 = min(height, y0 + band_height)
+        top, bottom = max(0, y0 - overlap), min(height, y1 + overlap)
+        band = np.empty((y1 - y0, width), dtype=np.uint8)
+        for x0 in range(0, width, tile_width):
+            x1 = min(width, x0 + tile_width)
+            left, right = max(0, x0 - overlap), min(width, x1 + overlap)
+            edges = canny_edges(raster.read(top, bottom, left, right))
+            band[:, x0:x1] = edges[y0 - top:y1 - top, x0 - left:x1 - left]
+        yield band
+        # 다음 밴드는 y1 - overlap 행부터 읽음
+        raster.release(max(0, y1 - overlap))
+
+
+def tiled_canny_edges(raster, memory_limit: int, overlap: int = TILE_OVERLAP) -> np.ndarray:
+    """타일 단위로 추출한 윤곽선 맵 전체 (PNG처럼 전체 배열이 필요한 경우)"""
+    edges = np.empty((raster.height, raster.width), dtype=np.uint8)
+    y = 0
+    for band in iter_edge_bands(raster, memory_limit, overlap):
+        edges[y:y + band.shape[0]] = band
+        y += band.shape[0]
+    return edges
+
+
+def pack_edge_bands(width: int, height: int, bands: Iterable[np.ndarray], level: int = 1) -> bytes:
+    """
+    밴드 단위 윤곽선을 pack_edges와 같은 형식으로 압축합니다 (전체 윤곽선 맵을 만들지 않음).
+    마지막 밴드를 제외한 밴드의 픽셀 수는 8의 배수여야 합니다 (tile_plan이 보장).
+    """
+    compressor = zlib.compressobj(level)
+    chunks = [EDGE_MAGIC, struct.pack("<II", width, height)]
+    for band in bands:
+        # packbits는 0이 아닌 값을 1로 묶으므로 0/255 밴드를 그대로 사용 (불리언 배열을 따로 만들지 않음)
+        chunks.append(compressor.compress(np.packbits(band).tobytes()))
+    chunks.append(compressor.flush())
+    return b"".join(chunks)
+
+
+def edge_contours(edges: np.ndarray, epsilon: float = 1.5, min_length: float = 8.0) -> List[np.ndarray]:
+    """
+    윤곽선 맵을 단순화한 다각형 목록으로 바꿉니다 (각 항목은 (N, 2) 정수 좌표 배열).
+    epsilon은 approxPolyDP 허용 오차(픽셀), min_length보다 짧은 윤곽선은 버립니다.
+    """
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    simplified = []
+    for contour in contours:
+        if cv2.arcLength(contour, True) < min_length:
+            continue
+        simplified.append(cv2.approxPolyDP(contour, epsilon, True).reshape(-1, 2))
+    return simplified
+
+
+def contours_json(contours: List[np.ndarray], width: int, height: int) -> dict:
+    """윤곽선 목록을 {"width", "height", "contours": [[x0, y0, x1, y1, ...], ...]} 형태로 만듭니다."""
+    return {
+        "width": width,
+        "height": height,
+        "contours": [contour.ravel().tolist() for contour in contours],
+    }
+
+
+def contours_svg(contours: List[np.ndarray], width: int, height: int) -> str:
+    """윤곽선 목록을 path 하나로 그리는 SVG 문서를 만듭니다."""
+    path = "".join(
+        "M" + "L".join(f"{x} {y}" for x, y in contour.tolist()) + "Z" for contour in contours
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        f'<path d="{path}" fill="none" stroke="#000" stroke-width="1"/></svg>'
+    )
+
+
+def write_file(path: str, data: Buffer):
+    """버퍼를 한 번의 write로 파일에 기록합니다 (백그라운드 스레드용)."""
+    with open(path, "wb") as out:
+        out.write(data)
+
+
+async def _write_async(path: str, data: Buffer):
+    async with aiofiles.open(path, "wb") as out:
+        await out.write(data)
+
+
+async def write_files(items: Iterable[Tuple[str, Buffer]]):
+    """
+    처리가 끝난 뒤 여러 파일을 동시에 비동기로 기록합니다.
+    하나라도 실패하면 이미 기록한 파일을 지우고 예외를 다시 발생시킵니다.
+    """
+    items = list(items)
+    results = await asyncio.gather(*(_write_async(path, data) for path, data in items), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        for path, _ in items:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        raise errors[0]
@@ -0,0 +1,134 @@
+# controller/lifecycle.py
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Set
+from dotenv import load_dotenv
+
+# 로깅 설정
+logger = logging.getLogger("lifecycle")
+
+load_dotenv()
+
+# 종료 시 처리 중인 요청과 백그라운드 작업을 기다리는 최대 시간 (초)
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "30"))
+# 종료 신호를 받은 뒤 /api/health가 503을 반환하면서 요청을 계속 받는 시간 (초)
+# (로드밸런서가 상태 확인 실패를 감지해 이 워커를 빼는 데 걸리는 시간보다 길게 설정)
+DRAIN_PRESTOP_SECONDS = float(os.getenv("DRAIN_PRESTOP_SECONDS", "10"))
+# 윤곽선 추출 등 응답 후 실행하는 작업용 스레드 수
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="background")
+_futures: Set[Future] = set()
+_tasks: Set[asyncio.Task] = set()
+_lock = threading.Lock()
+
+_draining = False
+_in_flight = 0
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+def in_flight_requests() -> int:
+    return _in_flight
+
+
+def begin_drain():
+    """상태 확인(/api/health)이 503을 반환하고 이후 응답에 Connection: close를 붙이도록 바꿉니다."""
+    global _draining
+    if not _draining:
+        _draining = True
+        logger.info("종료 준비 시작", extra={"in_flight": _in_flight})
+
+
+def _finish_future(future: Future):
+    with _lock:
+        _futures.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("백그라운드 작업 실패", exc_info=future.exception())
+
+
+def submit_background(func: Callable, *args, **kwargs) -> Future:
+    """
+    응답과 관계없이 실행할 작업을 백그라운드 스레드 풀에 넣습니다.
+    종료 시 drain()이 남은 작업이 끝날 때까지 기다립니다.
+    """
+    future = _executor.submit(func, *args, **kwargs)
+    with _lock:
+        _futures.add(future)
+    future.add_done_callback(_finish_future)
+    return future
+
+
+def track_task(task: asyncio.Task) -> asyncio.Task:
+    """종료 시 기다려야 하는 asyncio 작업을 등록합니다 (가비지 컬렉션도 방지)."""
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+class InFlightMiddleware:
+    """
+    처리 중인 HTTP 요청 수를 세는 ASGI 미들웨어 (스트리밍 응답은 전송이 끝날 때까지 포함)
+    종료 준비 중에는 keep-alive 클라이언트가 다른 워커로 다시 연결하도록 Connection: close를 붙입니다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if _draining and message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"connection", b"close")]
+            await send(message)
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _in_flight -= 1
+
+
+async def drain(timeout: float = DRAIN_TIMEOUT_SECONDS):
+    """
+    종료 전에 응답 후 실행되는 작업을 기다립니다 (lifespan 종료 단계에서 호출).
+
+    uvicorn은 리스너를 닫고 열린 연결이 끝난 뒤에 lifespan 종료 단계를 실행하므로,
+    여기서는 처리 중인 요청이 아니라 스트리밍 파이프라인 작업과 백그라운드 스레드 작업을 기다립니다.
+    /api/health를 503으로 바꾸는 것은 종료 신호를 받을 때 DrainingServer가 begin_drain()으로 처리합니다.
+    """
+    begin_drain()
+    deadline = time.monotonic() + timeout
+    logger.info("종료 준비: 백그라운드 작업 대기", extra={
+        "tasks": len(_tasks), "background_jobs": len(_futures)
+    })
+
+    pending_tasks = [task for task in _tasks if not task.done()]
+    if pending_tasks:
+        await asyncio.wait(pending_tasks, timeout=max(0.0, deadline - time.monotonic()))
+
+    with _lock:
+        pending_futures = list(_futures)
+    if pending_futures:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, wait, pending_futures, max(0.0, deadline - time.monotonic()))
+
+    remaining = {
+        "tasks": sum(1 for task in _tasks if not task.done()),
+        "background_jobs": sum(1 for future in _futures if not future.done()),
+    }
+    if any(remaining.values()):
+        logger.warning("종료 대기 시간 초과: 끝나지 않은 작업이 있습니다", extra=remaining)
+    else:
+        logger.info("처리 중인 작업 정리 완료")
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,59 @@
+# controller/locks.py
+import os
+import zlib
+import fcntl
+import logging
+from contextlib import contextmanager
+from sqlalchemy import text
+from model.database import engine
+
+# 로깅 설정
+logger = logging.getLogger("locks")
+
+LOCK_DIR = os.getenv("LOCK_DIR", os.getcwd())
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """
+    같은 서버의 여러 프로세스(워커) 사이에서 사용하는 파일 잠금 (fcntl.flock)
+
+    blocking=False이면 잠금을 얻지 못했을 때 기다리지 않고 False를 반환합니다.
+    사용 예:
+        with file_lock("temp_keys.json.lock"):
+            ...
+    """
+    with open(path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def singleton_lock(name: str):
+    """
+    여러 워커/서버 중 하나만 작업을 실행하도록 하는 잠금 (기다리지 않음)
+
+    PostgreSQL을 사용하면 세션 advisory lock으로 여러 서버 사이에서도 동작하고,
+    그 외 데이터베이스에서는 같은 서버 안의 파일 잠금을 사용합니다.
+    잠금을 얻었으면 True, 다른 곳에서 실행 중이면 False를 반환합니다.
+    """
+    if engine.dialect.name == "postgresql":
+        key = zlib.crc32(name.encode())
+        with engine.connect() as conn:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        return
+
+    with file_lock(os.path.join(LOCK_DIR, f".{name}.lock"), blocking=False) as acquired:
+        yield acquired
@@ -0,0 +1,214 @@
+# controller/logging_config.py
+import os
+import re
+import json
+import uuid
+import queue
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# 로깅 설정 (환경 변수로 조정 가능)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json, text
+# 로거별 샘플링 비율 (WARNING 미만 로그에만 적용), 예: "bria_api=0.1,background_removal=0.5"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# 요청 상관관계 ID
+request_id_var: ContextVar[str] = ContextVar("request_id", default="")
+
+# LogRecord 기본 속성 (extra로 전달된 필드를 구분하기 위해 사용)
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# 민감 정보 마스킹 패턴
+_SENSITIVE_KEYS = re.compile(r"(api[_-]?key|api[_-]?token|token|secret|password|authorization|credential)", re.IGNORECASE)
+_SENSITIVE_PATTERNS = [
+    # key=value, key: value, "key": "value" 형태
+    re.compile(
+        r"(?P<key>(?:x-)?(?:api[_-]?key|api[_-]?token|access[_-]?token|token|secret(?:[_-]?access[_-]?key)?|password|authorization)"
+        r"[\"']?\s*[:=]\s*[\"']?)(?:bearer\s+)?(?P<value>[^\s\"',}&]+)",
+        re.IGNORECASE,
+    ),
+    # AWS 액세스 키 ID
+    re.compile(r"(?P<key>)(?P<value>\b(?:AKIA|ASIA)[0-9A-Z]{16}\b)"),
+]
+REDACTED = "***"
+
+
+def get_request_id() -> str:
+    return request_id_var.get()
+
+
+def redact(text: str) -> str:
+    """문자열에 포함된 토큰, 키, 비밀번호 값을 마스킹합니다."""
+    for pattern in _SENSITIVE_PATTERNS:
+        text = pattern.sub(lambda m: m.group("key") + REDACTED, text)
+    return text
+
+
+def _redact_value(key: str, value):
+    if _SENSITIVE_KEYS.search(key):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: _redact_value(str(k), v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact_value(key, v) for v in value]
+    if isinstance(value, str):
+        return redact(value)
+    return value
+
+
+class RequestContextFilter(logging.Filter):
+    """요청 ID와 트레이스 ID를 로그 레코드에 추가합니다 (호출 스레드에서 실행)."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        try:
+            from controller.tracing import current_trace_id
+            record.trace_id = current_trace_id()
+        except Exception:
+            record.trace_id = ""
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    로거별로 WARNING 미만 로그를 지정된 비율만 통과시킵니다.
+    자주 호출되는 경로의 디버그/정보 로그 양을 줄이는 용도입니다.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(record.name)
+        if rate is None:
+            return True
+        return random.random() < rate
+
+
+class RedactionFilter(logging.Filter):
+    """메시지와 extra 필드에서 민감 정보를 마스킹합니다 (큐 리스너 스레드에서 실행)."""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key, value in list(vars(record).items()):
+            if key not in _RESERVED_ATTRS and key not in ("request_id", "trace_id"):
+                setattr(record, key, _redact_value(key, value))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄에 하나의 JSON 객체로 로그를 출력합니다."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", ""):
+            entry["request_id"] = record.request_id
+        if getattr(record, "trace_id", ""):
+            entry["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and key not in entry and key not in ("request_id", "trace_id"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _parse_sample_rates(value: str) -> dict:
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+_listener = None
+
+
+def setup_logging():
+    """
+    루트 로거를 비동기 큐 기반 구조화 로깅으로 설정합니다.
+
+    요청 처리 스레드는 레코드를 큐에 넣기만 하고, 마스킹과 포맷팅, 출력은
+    별도의 리스너 스레드에서 수행합니다.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output_handler = logging.StreamHandler()
+    output_handler.addFilter(RedactionFilter())
+    if LOG_FORMAT == "json":
+        output_handler.setFormatter(JsonFormatter())
+    else:
+        output_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(_parse_sample_rates(LOG_SAMPLE_RATES)))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """큐에 남은 로그를 모두 출력하고 리스너를 종료합니다."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    X-Request-ID 헤더를 이어받거나 새로 생성하여 요청 컨텍스트에 저장하고
+    응답 헤더로 돌려주는 ASGI 미들웨어
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = ""
+        for key, value in scope["headers"]:
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,206 @@
+# controller/metrics.py
+import time
+from contextlib import contextmanager
+from fastapi import APIRouter, Response
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from opentelemetry import trace
+from controller.tracing import tracer, route_label
+
+# 라우터 설정
+router = APIRouter(tags=["모니터링"])
+
+# 요청 단위 지표
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP 요청 처리 시간",
+    ["method", "route", "status"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "처리 중인 HTTP 요청 수",
+    ["route"],
+)
+
+# 파이프라인 단계별 지표
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds",
+    "파이프라인 단계별 처리 시간",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+STAGES_IN_FLIGHT = Gauge(
+    "pipeline_stage_in_flight",
+    "진행 중인 파이프라인 단계 수",
+    ["stage"],
+)
+
+# 업스트림(Remove.bg, BRIA, S3) 지표
+UPSTREAM_RESPONSES = Counter(
+    "upstream_responses_total",
+    "업스트림 응답 상태 코드",
+    ["upstream", "status"],
+)
+UPSTREAM_BYTES = Counter(
+    "upstream_bytes_total",
+    "업스트림과 주고받은 바이트 수",
+    ["upstream", "direction"],
+)
+NORMALIZATION_BYTES_SAVED = Counter(
+    "image_normalization_bytes_saved_total",
+    "업로드 정규화로 절약한 바이트 수",
+)
+
+
+# 보존 정책(retention) 지표
+RETENTION_FILES = Counter(
+    "retention_files_total",
+    "보존 정책 작업으로 처리된 파일 수",
+    ["category", "action"],
+)
+RETENTION_BYTES = Counter(
+    "retention_bytes_total",
+    "보존 정책 작업으로 처리된 파일 크기",
+    ["category", "action"],
+)
+
+
+# 요청 제한 및 업스트림 동시성 제한 지표
+RATE_LIMITED_REQUESTS = Counter(
+    "rate_limited_requests_total",
+    "요청 제한으로 거부된 요청 수",
+    ["route", "scope"],
+)
+UPSTREAM_ACTIVE = Gauge(
+    "upstream_gate_active",
+    "업스트림별 실행 중인 호출 수",
+    ["upstream"],
+)
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "upstream_gate_queue_depth",
+    "업스트림별, 우선순위 등급별 대기 중인 호출 수",
+    ["upstream", "tier"],
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "upstream_gate_wait_seconds",
+    "업스트림 호출 전 대기열에서 기다린 시간 (우선순위 등급별)",
+    ["upstream", "tier"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30),
+)
+UPSTREAM_REJECTED = Counter(
+    "upstream_gate_rejected_total",
+    "대기열이 가득 차거나 대기 시간을 넘겨 거부된 업스트림 호출 수",
+    ["upstream", "tier", "reason"],
+)
+UPSTREAM_STARVATION_PROMOTIONS = Counter(
+    "upstream_gate_starvation_promotions_total",
+    "오래 기다려 우선순위와 관계없이 먼저 처리된 호출 수",
+    ["upstream", "tier"],
+)
+
+# 응답 압축 지표
+RESPONSE_BYTES = Counter(
+    "http_response_body_bytes_total",
+    "압축 대상 응답 본문 크기 (raw: 압축 전, sent: 전송된 크기)",
+    ["encoding", "kind"],
+)
+
+# 사용자 캐시 지표
+USER_CACHE_LOOKUPS = Counter(
+    "user_cache_lookups_total",
+    "사용자 캐시 조회 수 (hit, miss)",
+    ["result"],
+)
+
+# 관리자 내보내기 지표
+EXPORT_ROWS = Counter(
+    "admin_export_rows_total",
+    "내보낸 행 수 (COPY로 만든 CSV는 제외)",
+    ["export", "format"],
+)
+EXPORT_BYTES = Counter(
+    "admin_export_bytes_total",
+    "내보낸 본문 크기",
+    ["export", "format"],
+)
+
+# 이벤트 루프 지연 지표 (LOOP_MONITOR_ENABLED=true일 때만 기록)
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "이벤트 루프 하트비트가 예정보다 늦어진 시간",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+LOOP_BLOCKS = Counter(
+    "event_loop_blocked_total",
+    "이벤트 루프가 LOOP_BLOCK_THRESHOLD_SECONDS 이상 막힌 횟수",
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    파이프라인 단계의 처리 시간을 기록하고 같은 이름의 트레이스 span을 생성합니다.
+
+    사용 예:
+        with stage_timer("remove_bg"):
+            response = requests.post(...)
+    """
+    STAGES_IN_FLIGHT.labels(stage).inc()
+    start_time = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(stage):
+            yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start_time)
+        STAGES_IN_FLIGHT.labels(stage).dec()
+
+
+def record_upstream(upstream: str, status, sent_bytes: int = 0, received_bytes: int = 0):
+    """업스트림 호출 결과(상태 코드, 송수신 바이트)를 기록합니다."""
+    span = trace.get_current_span()
+    span.set_attribute("upstream.name", upstream)
+    span.set_attribute("http.status_code", str(status))
+    span.set_attribute("upstream.bytes_sent", sent_bytes)
+    span.set_attribute("upstream.bytes_received", received_bytes)
+    UPSTREAM_RESPONSES.labels(upstream, str(status)).inc()
+    if sent_bytes:
+        UPSTREAM_BYTES.labels(upstream, "sent").inc(sent_bytes)
+    if received_bytes:
+        UPSTREAM_BYTES.labels(upstream, "received").inc(received_bytes)
+
+
+class MetricsMiddleware:
+    """라우트별 요청 처리 시간과 처리 중인 요청 수를 기록하는 ASGI 미들웨어"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_label(scope)
+        status_code = 500
+        start_time = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.labels(route).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.labels(route).dec()
+            REQUEST_LATENCY.labels(scope["method"], route, str(status_code)).observe(
+                time.perf_counter() - start_time
+            )
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus 수집 엔드포인트"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,191 @@
+# controller/perceptual_hash.py
+import os
+import io
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple, Hashable
+import numpy as np
+from PIL import Image as PILImage, ImageOps
+
+# 로깅 설정
+logger = logging.getLogger("perceptual_hash")
+
+# 중복으로 판단할 최대 해밍 거리 (64비트 dHash 기준)
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "4"))
+# 다른 워커가 저장한 이미지를 인덱스에 반영하는 주기 (초)
+DUPLICATE_INDEX_REFRESH_SECONDS = float(os.getenv("DUPLICATE_INDEX_REFRESH_SECONDS", "2"))
+
+HASH_BITS = 64
+
+
+def dhash(contents: bytes, hash_size: int = 8) -> int:
+    """
+    difference hash(dHash)를 계산합니다.
+    재압축이나 크기 변경에는 거의 변하지 않는 64비트 정수를 반환합니다.
+    """
+    image = PILImage.open(io.BytesIO(contents))
+    # JPEG는 디코딩 단계에서 축소하여 빠르게 처리
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    image = ImageOps.exif_transpose(image).convert("L").resize((hash_size + 1, hash_size), PILImage.Resampling.LANCZOS)
+    pixels = np.asarray(image, dtype=np.int16)
+
+    # 인접 픽셀 간 밝기 비교 결과를 비트로 압축
+    diff = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(diff.flatten()).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed64(value: int) -> int:
+    """PostgreSQL BIGINT 컬럼에 저장하기 위해 부호 있는 정수로 변환"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class HammingIndex:
+    """
+    다중 인덱스 해싱(multi-index hashing) 기반의 해밍 거리 검색 구조
+
+    64비트 해시를 max_distance + 1개의 조각으로 나누면, 비둘기집 원리에 의해
+    거리가 max_distance 이하인 해시는 적어도 한 조각이 정확히 일치합니다.
+    따라서 조각별 해시 테이블에서 후보만 뽑아 실제 거리를 확인하면 됩니다.
+    """
+
+    def __init__(self, max_distance: int = DUPLICATE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._chunks = self._chunk_layout(max_distance + 1)
+        self._tables: Dict[Tuple[Hashable, int, int], List[Tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+        self._size = 0
+
+    @staticmethod
+    def _chunk_layout(count: int) -> List[Tuple[int, int]]:
+        # (시프트, 마스크) 목록: 64비트를 가능한 한 균등하게 분할
+        layout = []
+        offset = 0
+        for i in range(count):
+            width = HASH_BITS // count + (1 if i < HASH_BITS % count else 0)
+            layout.append((offset, (1 << width) - 1))
+            offset += width
+        return layout
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, item_id: int, owner: Hashable = None):
+        with self._lock:
+            for i, (shift, mask) in enumerate(self._chunks):
+                key = (owner, i, (value >> shift) & mask)
+                self._tables.setdefault(key, []).append((value, item_id))
+            self._size += 1
+
+    def remove(self, value: int, item_id: int, owner: Hashable = None):
+        with self._lock:
+            removed = False
+            for i, (shift, mask) in enumerate(self._chunks):
+                key = (owner, i, (value >> shift) & mask)
+                bucket = self._tables.get(key)
+                if not bucket:
+                    continue
+                remaining = [entry for entry in bucket if entry[1] != item_id]
+                removed = removed or len(remaining) != len(bucket)
+                if remaining:
+                    self._tables[key] = remaining
+                else:
+                    del self._tables[key]
+            if removed:
+                self._size -= 1
+
+    def search(self, value: int, owner: Hashable = None, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        거리가 max_distance 이하인 (item_id, 거리) 목록을 거리 순으로 반환합니다.
+        """
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        found: Dict[int, int] = {}
+        with self._lock:
+            for i, (shift, mask) in enumerate(self._chunks):
+                for candidate, item_id in self._tables.get((owner, i, (value >> shift) & mask), ()):
+                    if item_id in found:
+                        continue
+                    distance = hamming_distance(value, candidate)
+                    if distance <= limit:
+                        found[item_id] = distance
+        return sorted(found.items(), key=lambda entry: entry[1])
+
+    def nearest(self, value: int, owner: Hashable = None, max_distance: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        matches = self.search(value, owner, max_distance)
+        return matches[0] if matches else None
+
+
+# 프로세스 전역 인덱스 (DB에서 적재하고, 다른 워커가 추가한 이미지는 주기적으로 반영)
+duplicate_index = HammingIndex()
+_indexed_ids: Set[int] = set()
+_loaded_max_id = 0
+_last_refresh = 0.0
+_load_lock = threading.Lock()
+
+
+def index_image(image_id: int, value: int, owner: Hashable = None):
+    """새로 저장한 이미지를 인덱스에 등록합니다 (이미 등록된 경우 무시)."""
+    with _load_lock:
+        if image_id in _indexed_ids:
+            return
+        _indexed_ids.add(image_id)
+    duplicate_index.add(value, image_id, owner=owner)
+
+
+def index_refresh_due() -> bool:
+    """ensure_index_loaded가 DB를 읽을 차례인지 (요청 경로에서 스레드로 넘길지 판단하는 용도)"""
+    return time.monotonic() - _last_refresh >= DUPLICATE_INDEX_REFRESH_SECONDS
+
+
+def warm_index():
+    """서버 시작 시 인덱스를 미리 적재합니다 (lifespan에서 백그라운드 스레드로 실행)."""
+    from model.database import SessionLocal
+
+    with SessionLocal() as db:
+        ensure_index_loaded(db)
+
+
+def ensure_index_loaded(db):
+    """
+    images 테이블의 perceptual_hash로 인덱스를 채웁니다.
+
+    처음 호출할 때 전체를 적재하고, 이후에는 DUPLICATE_INDEX_REFRESH_SECONDS마다
+    마지막으로 적재한 image_id 이후의 행만 읽어 다른 워커/서버가 저장한 이미지를 반영합니다.
+    DB를 동기로 읽으므로 이벤트 루프가 아닌 스레드에서 호출해야 합니다.
+    """
+    global _loaded_max_id, _last_refresh
+    if time.monotonic() - _last_refresh < DUPLICATE_INDEX_REFRESH_SECONDS:
+        return
+    with _load_lock:
+        if time.monotonic() - _last_refresh < DUPLICATE_INDEX_REFRESH_SECONDS:
+            return
+        from model.database import Image
+
+        rows = (
+            db.query(Image.image_id, Image.user_id, Image.perceptual_hash)
+            .filter(Image.perceptual_hash.isnot(None), Image.image_id > _loaded_max_id)
+            .order_by(Image.image_id)
+            .yield_per(10000)
+        )
+        added = 0
+        for image_id, user_id, perceptual_hash in rows:
+            _loaded_max_id = max(_loaded_max_id, image_id)
+            if image_id in _indexed_ids:
+                continue
+            _indexed_ids.add(image_id)
+            duplicate_index.add(from_signed64(perceptual_hash), image_id, owner=user_id)
+            added += 1
+        first_load = _last_refresh == 0.0
+        _last_refresh = time.monotonic()
+    if first_load:
+        logger.info("중복 이미지 인덱스 적재 완료", extra={"entries": len(duplicate_index)})
+    elif added:
+        logger.debug("중복 이미지 인덱스 갱신", extra={"added": added})
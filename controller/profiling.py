@@ -0,0 +1,362 @@
+# controller/profiling.py
+import os
+import io
+import sys
+import time
+import uuid
+import pstats
+import asyncio
+import cProfile
+import logging
+import threading
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse
+from dotenv import load_dotenv
+from controller.admin_auth import require_admin, is_admin_token
+from controller.metrics import LOOP_LAG, LOOP_BLOCKS
+from controller.logging_config import get_request_id
+from controller.tracing import route_label
+
+# 로깅 설정
+logger = logging.getLogger("profiling")
+
+load_dotenv()
+
+# 샘플링 프로파일러 (요청한 동안에만 스레드를 띄우므로 평소에는 비용 없음)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DEFAULT_INTERVAL_MS = float(os.getenv("PROFILE_DEFAULT_INTERVAL_MS", "5"))
+
+# 요청별 cProfile (X-Profile: 1 헤더와 관리자 토큰이 함께 있을 때만)
+PROFILE_REQUESTS_ENABLED = os.getenv("PROFILE_REQUESTS_ENABLED", "true").lower() == "true"
+# 결과 파일은 같은 서버의 다른 워커에서도 조회할 수 있도록 디스크에 저장
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+# 이벤트 루프 지연 감시
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+LOOP_MONITOR_INTERVAL_SECONDS = float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", "0.05"))
+# 루프가 이 시간 이상 응답하지 않으면 막고 있는 스택을 기록
+LOOP_BLOCK_THRESHOLD_SECONDS = float(os.getenv("LOOP_BLOCK_THRESHOLD_SECONDS", "0.2"))
+LOOP_BLOCK_HISTORY = 50
+# 기록할 스택 깊이 (안쪽 프레임부터)
+STACK_DEPTH = 20
+
+# 대기 중인 스레드의 스택 (마지막 프레임 기준, include_idle=false이면 제외)
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("handlers.py", "dequeue"),
+}
+
+router = APIRouter(prefix="/api/admin/profile", tags=["프로파일링"], dependencies=[Depends(require_admin)])
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # collapsed 형식에서 ';'와 공백은 구분자이므로 사용하지 않음
+    return f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}".replace(";", ":").replace(" ", "_")
+
+
+def _stack(frame) -> list:
+    """바깥 프레임부터 안쪽 프레임까지의 목록"""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES
+
+
+# ---------------------------------------------------------------------------
+# 샘플링 프로파일러
+# ---------------------------------------------------------------------------
+
+_sampler_lock = threading.Lock()
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> Tuple[Counter, int]:
+    """
+    seconds 동안 interval마다 이 프로세스의 모든 스레드 스택을 기록합니다.
+    flamegraph.pl, speedscope 등에서 읽을 수 있는 collapsed 형식의 (스택 -> 횟수)를 반환합니다.
+    """
+    own_ident = threading.get_ident()
+    counts: Counter = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or (not include_idle and _is_idle(frame)):
+                continue
+            thread_name = names.get(ident, str(ident)).replace(" ", "_").replace(";", ":")
+            counts[";".join([thread_name, *(_frame_label(f) for f in _stack(frame))])] += 1
+        samples += 1
+        time.sleep(interval)
+    return counts, samples
+
+
+@router.get("/sample")
+async def profile_sample(seconds: float = 10, interval_ms: float = PROFILE_DEFAULT_INTERVAL_MS, include_idle: bool = False):
+    """
+    이 워커를 seconds 동안 샘플링하고 collapsed 스택 파일을 반환합니다.
+
+    `flamegraph.pl profile.collapsed > profile.svg` 또는 speedscope에서 열 수 있습니다.
+    여러 워커로 실행 중이면 요청을 받은 워커만 기록합니다.
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds는 0보다 크고 {PROFILE_MAX_SECONDS} 이하여야 합니다.")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms는 1~1000 사이여야 합니다.")
+    if not _sampler_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="이 워커에서 이미 프로파일링이 실행 중입니다.")
+    try:
+        counts, samples = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000, include_idle)
+    finally:
+        _sampler_lock.release()
+
+    body = "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+    filename = f"profile-{os.getpid()}-{int(time.time())}.collapsed"
+    return PlainTextResponse(body, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Profile-Samples": str(samples),
+        "X-Profile-Pid": str(os.getpid()),
+    })
+
+
+# ---------------------------------------------------------------------------
+# 요청별 cProfile
+# ---------------------------------------------------------------------------
+
+# cProfile은 스레드마다 하나만 켤 수 있으므로 동시에 한 요청만 프로파일링
+_request_profile_lock = threading.Lock()
+
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+
+
+def _save_profile(profiler: cProfile.Profile, profile_id: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(_profile_path(profile_id))
+    # 오래된 결과부터 삭제
+    entries = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".prof")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in entries[:max(0, len(entries) - PROFILE_KEEP)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    X-Profile: 1 헤더와 올바른 X-Admin-Token이 있는 요청만 cProfile로 기록하는 ASGI 미들웨어
+
+    이벤트 루프 스레드에서 기록하므로 같은 시간에 루프에서 실행된 다른 요청도 포함되고,
+    스레드풀에서 실행되는 동기 엔드포인트 본문은 포함되지 않습니다 (그 경우 /sample 사용).
+    결과 ID는 X-Profile-Id 응답 헤더로 반환하고 /api/admin/profile/requests/{id}로 조회합니다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not PROFILE_REQUESTS_ENABLED
+            or scope["type"] != "http"
+            or _header(scope, b"x-profile") != "1"
+            or not is_admin_token(_header(scope, b"x-admin-token"))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if not _request_profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, self._with_headers(send, [(b"x-profile-status", b"busy")]))
+            return
+
+        profile_id = uuid.uuid4().hex
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, self._with_headers(send, [(b"x-profile-id", profile_id.encode())]))
+            finally:
+                profiler.disable()
+        finally:
+            _request_profile_lock.release()
+        try:
+            await run_in_threadpool(_save_profile, profiler, profile_id)
+            logger.info("요청 프로파일 저장", extra={"profile_id": profile_id, "route": route_label(scope), "profiled_request_id": get_request_id()})
+        except Exception as e:
+            logger.warning("요청 프로파일 저장 실패", extra={"profile_id": profile_id, "error": str(e)})
+
+    @staticmethod
+    def _with_headers(send, headers: List[Tuple[bytes, bytes]]):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *headers]}
+            await send(message)
+        return wrapped
+
+
+@router.get("/requests")
+def list_request_profiles():
+    """저장된 요청 프로파일 목록 (최근 순)"""
+    if not os.path.isdir(PROFILE_DIR):
+        return {"profiles": []}
+    entries = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".prof")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    return {"profiles": [
+        {"id": entry.name[:-len(".prof")], "created_at": entry.stat().st_mtime, "bytes": entry.stat().st_size}
+        for entry in entries
+    ]}
+
+
+@router.get("/requests/{profile_id}")
+def get_request_profile(profile_id: str, format: str = "text", sort: str = "cumulative", limit: int = 50):
+    """
+    요청 프로파일 조회
+
+    - format=text: pstats 요약 (sort 기준 상위 limit개 함수)
+    - format=pstats: 원본 파일 (snakeviz, `python -m pstats`에서 열 수 있음)
+    """
+    path = _profile_path(os.path.basename(profile_id))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="프로파일을 찾을 수 없습니다.")
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
+    if format != "text":
+        raise HTTPException(status_code=400, detail="format은 text 또는 pstats여야 합니다.")
+
+    output = io.StringIO()
+    try:
+        pstats.Stats(path, stream=output).sort_stats(sort).print_stats(limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 정렬 기준입니다: {sort}")
+    return PlainTextResponse(output.getvalue())
+
+
+# ---------------------------------------------------------------------------
+# 이벤트 루프 지연 감시
+# ---------------------------------------------------------------------------
+
+class LoopMonitor:
+    """
+    이벤트 루프가 막히는 구간을 찾습니다.
+
+    루프에서 도는 작업이 interval마다 하트비트를 남기고 실제로 늦어진 시간을 LOOP_LAG로 기록합니다.
+    별도 감시 스레드는 하트비트가 threshold 넘게 끊기면 그 순간 루프 스레드의 스택을 저장하므로
+    (예: async 핸들러 안의 동기 requests.post) 루프를 막은 코드를 알 수 있습니다.
+    """
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.blocks: deque = deque(maxlen=LOOP_BLOCK_HISTORY)
+        self._heartbeat = time.monotonic()
+        self._loop_ident: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def _beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, time.monotonic() - self._heartbeat - self.interval))
+
+    def _watch(self):
+        current: Optional[dict] = None
+        while not self._stop.wait(self.interval):
+            stalled_for = time.monotonic() - self._heartbeat - self.interval
+            if stalled_for >= self.threshold:
+                if current is None:
+                    frame = sys._current_frames().get(self._loop_ident)
+                    stack = _stack(frame)[-STACK_DEPTH:] if frame is not None else []
+                    current = {
+                        "detected_at": time.time(),
+                        "stack": [f"{f.f_code.co_filename}:{f.f_lineno} {f.f_code.co_name}" for f in stack],
+                    }
+                current["blocked_seconds"] = round(stalled_for, 3)
+            elif current is not None:
+                self._record(current)
+                current = None
+
+    def _record(self, block: dict):
+        LOOP_BLOCKS.inc()
+        self.blocks.append(block)
+        logger.warning("이벤트 루프가 막혔습니다", extra={
+            "blocked_seconds": block["blocked_seconds"],
+            "at": block["stack"][-1] if block["stack"] else None,
+        })
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_ident = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._thread = None
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self._task is not None,
+            "interval_seconds": self.interval,
+            "threshold_seconds": self.threshold,
+            "blocks": list(reversed(self.blocks)),
+        }
+
+
+loop_monitor = LoopMonitor(LOOP_MONITOR_INTERVAL_SECONDS, LOOP_BLOCK_THRESHOLD_SECONDS)
+
+
+def start_loop_monitor():
+    """LOOP_MONITOR_ENABLED=true이면 이벤트 루프 지연 감시를 시작합니다."""
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
+
+@router.get("/loop")
+def loop_status():
+    """이 워커의 이벤트 루프 감시 설정과 최근 막힘 기록 (최근 순, 루프를 막은 스택 포함)"""
+    return loop_monitor.status()
@@ -0,0 +1,225 @@
+# controller/rate_limit.py
+import os
+import json
+import math
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from dotenv import load_dotenv
+from model.database import engine
+from controller.metrics import RATE_LIMITED_REQUESTS
+from controller.tracing import route_label
+from controller.auth import token_user_id
+from controller.api_keys import registered_client
+
+# 로깅 설정
+logger = logging.getLogger("rate_limit")
+
+# 환경 변수 로드
+load_dotenv()
+
+# 요청 제한 설정
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# memory: 프로세스별 버킷, postgres: 데이터베이스에 버킷을 저장하여 모든 워커가 공유
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+# 사용자/클라이언트별 라우트 제한 ("라우트=허용 횟수/기간(초)", 쉼표로 구분)
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "/api/remove-and-generate=10/60,/api/remove-and-generate/stream=10/60,"
+    "/api/replace-bg=20/60,/api/background/remove=30/60,/api/backgroundBG/save=60/60,"
+    "/api/backgroundBG/save-binary=60/60"
+)
+# 라우트 전체 제한 (모든 사용자 합계)
+RATE_LIMITS_GLOBAL = os.getenv("RATE_LIMITS_GLOBAL", "")
+# 프록시 뒤에서 실행할 때 X-Forwarded-For의 첫 주소를 클라이언트 주소로 사용
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+# 메모리 백엔드에서 유지할 최대 버킷 수 (넘으면 가득 찬 버킷부터 정리)
+MAX_MEMORY_BUCKETS = 100000
+
+
+@dataclass
+class RateLimitRule:
+    """capacity개의 요청을 period초 동안 허용하는 토큰 버킷 규칙 (순간 최대 capacity개)"""
+    capacity: float
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_rules(value: str) -> Dict[str, RateLimitRule]:
+    rules = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        route, limit = item.rsplit("=", 1)
+        capacity, period = limit.split("/", 1)
+        rules[route.strip()] = RateLimitRule(float(capacity), float(period))
+    return rules
+
+
+class MemoryBackend:
+    """프로세스 내부 토큰 버킷 (워커마다 따로 계산됨)"""
+
+    def __init__(self):
+        # 키 → (남은 토큰, 마지막 갱신 시각, 다시 가득 차는 시각)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        토큰을 사용합니다.
+        반환: (허용 여부, 거부된 경우 다시 시도할 수 있을 때까지의 시간(초))
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (rule.capacity, now, now))
+            tokens = min(rule.capacity, tokens + (now - updated_at) * rule.rate)
+            if tokens >= cost:
+                tokens -= cost
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (cost - tokens) / rule.rate
+            # 버킷마다 자기 규칙으로 계산해 두어야 정리할 때 다른 규칙의 주기를 적용하지 않음
+            self._buckets[key] = (tokens, now, now + (rule.capacity - tokens) / rule.rate)
+            if len(self._buckets) > MAX_MEMORY_BUCKETS:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float):
+        # 다시 가득 찬 버킷은 새로 만든 버킷과 같으므로 정리
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+
+class PostgresBackend:
+    """
+    rate_limit_buckets 테이블을 사용하는 토큰 버킷
+
+    버킷 갱신을 하나의 INSERT ... ON CONFLICT DO UPDATE 문으로 처리하므로
+    여러 워커/서버가 동시에 요청해도 토큰이 중복으로 사용되지 않습니다.
+    """
+
+    _TAKE = text("""
+        INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at)
+        VALUES (:key, :capacity - :cost, :now)
+        ON CONFLICT (bucket_key) DO UPDATE SET
+            tokens = CASE
+                WHEN rate_limit_buckets.tokens + (:now - rate_limit_buckets.updated_at) * :rate > :capacity
+                THEN :capacity
+                ELSE rate_limit_buckets.tokens + (:now - rate_limit_buckets.updated_at) * :rate
+            END - :cost,
+            updated_at = :now
+        WHERE rate_limit_buckets.tokens + (:now - rate_limit_buckets.updated_at) * :rate >= :cost
+        RETURNING tokens
+    """)
+    _CURRENT = text("SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = :key")
+
+    def __init__(self, db_engine):
+        self.engine = db_engine
+
+    def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()
+        params = {"key": key, "capacity": rule.capacity, "rate": rule.rate, "cost": cost, "now": now}
+        with self.engine.begin() as conn:
+            if conn.execute(self._TAKE, params).first() is not None:
+                return True, 0.0
+            row = conn.execute(self._CURRENT, {"key": key}).first()
+        tokens = min(rule.capacity, row.tokens + (now - row.updated_at) * rule.rate) if row else 0.0
+        return False, max(0.0, (cost - tokens) / rule.rate)
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "postgres":
+        return PostgresBackend(engine)
+    return MemoryBackend()
+
+
+def _client_identity(scope) -> str:
+    """
+    요청한 사용자/클라이언트를 구분하는 키 (토큰 사용자 > 등록된 X-API-Client 키 > 클라이언트 주소)
+    user_id 파라미터와 등록되지 않은 X-API-Client 값은 누구나 바꿔 보낼 수 있으므로 사용하지 않음
+    (값을 바꿔 가며 한도를 피할 수 있음)
+    """
+    user_id = token_user_id(scope)
+    if user_id is not None:
+        return f"user:{user_id}"
+
+    headers = dict(scope.get("headers") or [])
+    client_name = registered_client(headers.get(b"x-api-client", b"").decode("latin-1"))
+    if client_name:
+        return f"client:{client_name}"
+
+    if RATE_LIMIT_TRUST_FORWARDED and b"x-forwarded-for" in headers:
+        return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """
+    라우트별 토큰 버킷으로 요청을 제한하는 ASGI 미들웨어
+
+    제한을 넘은 요청은 처리하지 않고 바로 429와 Retry-After 헤더로 응답합니다.
+    백엔드 오류 시에는 요청을 허용합니다 (fail open).
+    """
+
+    def __init__(self, app, backend=None, rules: Optional[Dict[str, RateLimitRule]] = None,
+                 global_rules: Optional[Dict[str, RateLimitRule]] = None):
+        self.app = app
+        self.backend = backend or create_backend()
+        self.rules = parse_rules(RATE_LIMITS) if rules is None else rules
+        self.global_rules = parse_rules(RATE_LIMITS_GLOBAL) if global_rules is None else global_rules
+
+    async def _take(self, key: str, rule: RateLimitRule) -> Tuple[bool, float]:
+        try:
+            if isinstance(self.backend, MemoryBackend):
+                return self.backend.take(key, rule)
+            return await run_in_threadpool(self.backend.take, key, rule)
+        except Exception as e:
+            logger.warning("요청 제한 백엔드 오류 (요청 허용)", extra={"error": str(e)})
+            return True, 0.0
+
+    async def __call__(self, scope, receive, send):
+        if not RATE_LIMIT_ENABLED or scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_label(scope)
+        checks: List[Tuple[str, str, RateLimitRule]] = []
+        if route in self.global_rules:
+            checks.append(("route", f"route:{route}", self.global_rules[route]))
+        if route in self.rules:
+            checks.append(("client", f"{_client_identity(scope)}:{route}", self.rules[route]))
+
+        for scope_name, key, rule in checks:
+            allowed, retry_after = await self._take(key, rule)
+            if not allowed:
+                RATE_LIMITED_REQUESTS.labels(route, scope_name).inc()
+                logger.info("요청 제한 초과", extra={"route": route, "scope": scope_name, "retry_after": round(retry_after, 2)})
+                await self._reject(send, retry_after)
+                return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, retry_after: float):
+        body = json.dumps(
+            {"detail": "요청이 너무 많습니다. 잠시 후 다시 시도하세요."}, ensure_ascii=False
+        ).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
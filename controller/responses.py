@@ -0,0 +1,50 @@
+# controller/responses.py
+import os
+from typing import Any, Dict, List
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# BRIA 결과 응답 형식 기본값
+# full: BRIA 원본 응답(bria_results)과 요청 정보를 모두 포함
+# compact: 결과 이미지 URL 목록만 포함
+RESPONSE_FORMAT = os.getenv("RESPONSE_FORMAT", "full").lower()
+RESPONSE_FORMATS = ("full", "compact")
+
+
+def bria_result_urls(bria_response: Dict[str, Any]) -> List[str]:
+    """
+    BRIA 응답에서 결과 이미지 URL만 꺼냅니다.
+    result 항목은 [url, seed, uuid] 형태의 배열이거나 URL 문자열입니다.
+    """
+    urls = []
+    for item in bria_response.get("result", []):
+        url = item[0] if isinstance(item, list) and item else item
+        if isinstance(url, str):
+            urls.append(url)
+    return urls
+
+
+def validate_response_format(response_format: str) -> str:
+    response_format = (response_format or RESPONSE_FORMAT).lower()
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"지원되지 않는 응답 형식입니다: {response_format} (full, compact)")
+    return response_format
+
+
+def format_bria_response(content: Dict[str, Any], response_format: str) -> Dict[str, Any]:
+    """
+    배경 생성 결과를 요청한 응답 형식으로 바꿉니다.
+
+    compact 형식 예:
+        {"status": "success", "request_id": "...", "original_url": "...", "result_urls": ["https://..."]}
+    """
+    if response_format != "compact":
+        return content
+    return {
+        "status": content["status"],
+        "request_id": content["request_id"],
+        "original_url": content["original_url"],
+        "result_urls": bria_result_urls(content["bria_results"]),
+    }
@@ -0,0 +1,131 @@
+# controller/result_publishing.py
+import os
+import time
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from fastapi.responses import RedirectResponse
+from dotenv import load_dotenv
+from controller.upstream import BUCKET_NAME, presign_s3_get, put_file_to_s3, s3_object_exists
+from controller.storage_paths import shard_prefix, url_for_path
+
+# 로깅 설정
+logger = logging.getLogger("result_publishing")
+
+load_dotenv()
+
+# 결과 파일 제공 방식
+# local: API 서버의 /uploads 경로로 제공 (기본값)
+# s3: 결과를 오브젝트 스토리지에 올리고 만료 시간이 있는 서명 URL을 반환 (API 워커는 파일을 전송하지 않음)
+RESULT_PUBLISH_MODE = os.getenv("RESULT_PUBLISH_MODE", "local").lower()
+RESULT_BUCKET = os.getenv("RESULT_BUCKET", BUCKET_NAME)
+RESULT_PREFIX = os.getenv("RESULT_PREFIX", "published")
+# 서명 URL 유효 시간 (초)
+RESULT_URL_TTL_SECONDS = int(os.getenv("RESULT_URL_TTL_SECONDS", "3600"))
+# 결과 파일은 내용이 바뀌지 않으므로 오래 캐시
+RESULT_CACHE_CONTROL = os.getenv("RESULT_CACHE_CONTROL", "public, max-age=31536000, immutable")
+# CDN 주소 (지정하면 서명 없이 {주소}/{키} 형태의 URL 반환, 예: CloudFront + OAC)
+RESULT_PUBLIC_BASE_URL = os.getenv("RESULT_PUBLIC_BASE_URL", "").rstrip("/")
+
+# 업로드가 확인된 키 캐시 크기
+PUBLISHED_CACHE_SIZE = 100000
+
+
+def publishing_enabled() -> bool:
+    return RESULT_PUBLISH_MODE == "s3"
+
+
+def object_key(category: str, name: str) -> str:
+    """결과 파일의 오브젝트 키 (로컬 샤딩과 같은 해시 접두어로 분산)"""
+    return f"{RESULT_PREFIX}/{category}/{shard_prefix(name)}/{name}"
+
+
+_lock = threading.Lock()
+_published: "OrderedDict[str, bool]" = OrderedDict()
+_signed_urls: Dict[str, Tuple[str, float]] = {}
+
+
+def _mark_published(key: str):
+    with _lock:
+        _published[key] = True
+        _published.move_to_end(key)
+        while len(_published) > PUBLISHED_CACHE_SIZE:
+            _published.popitem(last=False)
+
+
+def _is_published(key: str) -> bool:
+    with _lock:
+        return key in _published
+
+
+def signed_url(key: str) -> str:
+    """
+    결과 파일의 다운로드 URL을 반환합니다.
+
+    같은 키에는 유효 시간의 절반이 지날 때까지 같은 서명 URL을 돌려주므로
+    브라우저와 CDN이 URL 단위로 캐시할 수 있습니다.
+    """
+    if RESULT_PUBLIC_BASE_URL:
+        return f"{RESULT_PUBLIC_BASE_URL}/{key}"
+    now = time.time()
+    with _lock:
+        cached = _signed_urls.get(key)
+        if cached and cached[1] - now > RESULT_URL_TTL_SECONDS / 2:
+            return cached[0]
+    url = presign_s3_get(RESULT_BUCKET, key, RESULT_URL_TTL_SECONDS)
+    with _lock:
+        if len(_signed_urls) > PUBLISHED_CACHE_SIZE:
+            _signed_urls.clear()
+        _signed_urls[key] = (url, now + RESULT_URL_TTL_SECONDS)
+    return url
+
+
+def publish_file(category: str, path: str) -> str:
+    """로컬 결과 파일을 업로드하고 오브젝트 키를 반환합니다."""
+    name = os.path.basename(path)
+    key = object_key(category, name)
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    put_file_to_s3(path, RESULT_BUCKET, key, content_type, RESULT_CACHE_CONTROL)
+    _mark_published(key)
+    return key
+
+
+def result_url(category: str, path: str) -> str:
+    """
+    새로 만든 결과 파일의 URL을 반환합니다.
+    s3 모드에서는 업로드 후 서명 URL을, local 모드에서는 /uploads URL을 반환합니다.
+    """
+    if not publishing_enabled():
+        return url_for_path(path)
+    return signed_url(publish_file(category, path))
+
+
+def published_url(category: str, name: str, path: Optional[str] = None) -> Optional[str]:
+    """
+    이미 만들어진 결과 파일의 서명 URL을 반환합니다 (s3 모드 전용).
+    버킷에 없고 로컬 파일이 있으면 그때 업로드하고, 둘 다 없으면 None을 반환합니다.
+    """
+    key = object_key(category, name)
+    if not _is_published(key):
+        if s3_object_exists(RESULT_BUCKET, key):
+            _mark_published(key)
+        elif path and os.path.exists(path):
+            publish_file(category, path)
+        else:
+            return None
+    return signed_url(key)
+
+
+def existing_result_url(category: str, path: str) -> str:
+    """이전에 만든 결과 파일의 URL (s3 모드에서 버킷에 없고 로컬에도 없으면 /uploads URL)"""
+    if not publishing_enabled():
+        return url_for_path(path)
+    return published_url(category, os.path.basename(path), path) or url_for_path(path)
+
+
+def redirect_to(url: str) -> RedirectResponse:
+    """서명 URL로 리다이렉트합니다 (URL이 유효한 동안만 리다이렉트를 캐시)."""
+    max_age = 86400 if RESULT_PUBLIC_BASE_URL else RESULT_URL_TTL_SECONDS // 4
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={max_age}"})
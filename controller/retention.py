@@ -0,0 +1,346 @@
+# controller/retention.py
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Set
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from dotenv import load_dotenv
+from model.database import SessionLocal, Image, backfill_image_file_keys, file_key_from_url
+from controller.admin_auth import require_admin
+from controller.metrics import stage_timer, RETENTION_FILES, RETENTION_BYTES
+from controller.upstream import archive_to_s3
+from controller.locks import singleton_lock
+from controller.storage_paths import category_dir, file_key, scan_batch, url_for_path
+
+# 로깅 설정
+logger = logging.getLogger("retention")
+
+# 환경 변수 로드
+load_dotenv()
+
+# 보존 정책 설정 (파일을 삭제하므로 기본은 비활성, 켜더라도 RETENTION_DRY_RUN=false로 바꾸기 전까지는 보고만 함)
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+RETENTION_DRY_RUN = os.getenv("RETENTION_DRY_RUN", "true").lower() == "true"
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_INITIAL_DELAY_SECONDS = float(os.getenv("RETENTION_INITIAL_DELAY_SECONDS", "60"))
+# 한 번 실행할 때 카테고리별로 검사할 최대 파일 수
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+# 카테고리별 스캔 위치(커서) 저장 파일
+RETENTION_STATE_FILE = os.getenv("RETENTION_STATE_FILE", os.path.join(os.getcwd(), "retention_state.json"))
+
+# 콜드 스토리지 티어링 (버킷을 지정하지 않으면 비활성화)
+RETENTION_COLD_BUCKET = os.getenv("RETENTION_COLD_BUCKET", "")
+RETENTION_COLD_STORAGE_CLASS = os.getenv("RETENTION_COLD_STORAGE_CLASS", "GLACIER_IR")
+RETENTION_COLD_PREFIX = os.getenv("RETENTION_COLD_PREFIX", "archive")
+# images 테이블이 참조하는 파일을 콜드 스토리지로 옮기기까지의 기간 (0이면 옮기지 않음)
+RETENTION_TIER_AFTER_DAYS = float(os.getenv("RETENTION_TIER_AFTER_DAYS", "0"))
+
+# 드라이런 보고서에 포함할 카테고리별 최대 항목 수
+REPORT_SAMPLE_SIZE = 50
+# 한 번 실행할 때 file_key 컬럼을 채울 최대 images 행 수 (기존 행을 모두 채우기 전에는 파일을 처리하지 않음)
+BACKFILL_ROWS_PER_RUN = 50000
+
+# 라우터 설정
+router = APIRouter(prefix="/api/admin/retention", tags=["보존 정책"], dependencies=[Depends(require_admin)])
+
+
+@dataclass
+class RetentionCategory:
+    """보존 기간이 같은 파일 묶음 (디렉토리 단위)"""
+    name: str
+    directory: str
+    ttl_days: float  # 0이면 삭제하지 않음
+    # False이면 images 테이블 참조와 관계없이 기간이 지나면 정리 (임시 파일용)
+    check_references: bool = True
+
+
+CATEGORIES = [
+    RetentionCategory("originals", category_dir("originals"), float(os.getenv("RETENTION_ORIGINALS_DAYS", "30"))),
+    RetentionCategory("results", category_dir("results"), float(os.getenv("RETENTION_RESULTS_DAYS", "30"))),
+    RetentionCategory("bg_results", category_dir("bg_results"), float(os.getenv("RETENTION_BG_RESULTS_DAYS", "30"))),
+    RetentionCategory("edges", category_dir("edges"), float(os.getenv("RETENTION_EDGES_DAYS", "7"))),
+    RetentionCategory("bria_results", category_dir("bria_results"), float(os.getenv("RETENTION_BRIA_RESULTS_DAYS", "30"))),
+    # 미리보기는 같은 request_id의 S3 원본 URL이 images에 기록되므로 참조 확인을 하지 않음
+    RetentionCategory("previews", category_dir("previews"), float(os.getenv("RETENTION_PREVIEWS_DAYS", "1")), check_references=False),
+]
+
+
+@dataclass
+class CategoryReport:
+    category: str
+    scanned: int = 0
+    referenced: int = 0
+    kept: int = 0
+    deleted: int = 0
+    archived: int = 0
+    tiered: int = 0
+    errors: int = 0
+    bytes_freed: int = 0
+    cursor: str = ""
+    cycle_completed: bool = False
+    actions: List[dict] = field(default_factory=list)
+
+
+def referenced_keys(db, keys: Set[str]) -> Set[str]:
+    """주어진 파일 ID 중 images 테이블이 참조하는 것을 반환합니다 (배치마다 인덱스 IN 조회)."""
+    if not keys:
+        return set()
+    found = set()
+    for column in (Image.original_file_key, Image.generated_file_key):
+        found.update(db.scalars(select(column).where(column.in_(keys)).distinct()))
+    return found
+
+
+def pending_file_keys(db) -> Set[str]:
+    """
+    file_key가 아직 채워지지 않은 행이 참조하는 파일 ID를 DB에 쓰지 않고 계산합니다.
+    드라이런 보고서가 채우기 작업이 끝난 뒤의 실제 실행과 같은 참조 여부를 보도록 사용합니다.
+    """
+    keys = set()
+    rows = db.execute(
+        select(Image.original_image_url, Image.generated_image_url)
+        .where(Image.original_file_key.is_(None))
+        .execution_options(yield_per=5000)
+    )
+    for row in rows:
+        keys.update(key for key in (file_key_from_url(row.original_image_url),
+                                    file_key_from_url(row.generated_image_url)) if key)
+    return keys
+
+
+def _load_state() -> Dict[str, str]:
+    try:
+        with open(RETENTION_STATE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state: Dict[str, str]):
+    temp_path = f"{RETENTION_STATE_FILE}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, RETENTION_STATE_FILE)
+
+
+def _cold_key(category: RetentionCategory, name: str) -> str:
+    return f"{RETENTION_COLD_PREFIX}/{category.name}/{name}"
+
+
+def _rewrite_image_urls(db, path: str, new_url: str):
+    """콜드 스토리지로 옮긴 파일을 가리키던 images 행의 주소를 바꿉니다 (file_key 인덱스로 후보를 좁힘)."""
+    local_urls = [path, url_for_path(path)]
+    key = file_key(os.path.basename(path))
+    for key_column, column in ((Image.original_file_key, Image.original_image_url),
+                               (Image.generated_file_key, Image.generated_image_url)):
+        db.execute(
+            update(Image).where(key_column == key, column.in_(local_urls)).values({column.key: new_url})
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+
+
+def _apply(db, category: RetentionCategory, entry, action: str, size: int):
+    if action == "tier":
+        new_url = archive_to_s3(entry.path, _cold_key(category, entry.name), RETENTION_COLD_BUCKET, RETENTION_COLD_STORAGE_CLASS)
+        _rewrite_image_urls(db, entry.path, new_url)
+    elif action == "archive":
+        archive_to_s3(entry.path, _cold_key(category, entry.name), RETENTION_COLD_BUCKET, RETENTION_COLD_STORAGE_CLASS)
+    os.remove(entry.path)
+    RETENTION_FILES.labels(category.name, action).inc()
+    RETENTION_BYTES.labels(category.name, action).inc(size)
+
+
+def process_category(db, category: RetentionCategory, cursor: str, dry_run: bool, now: float,
+                     pending_keys: Optional[Set[str]] = None) -> CategoryReport:
+    report = CategoryReport(category=category.name)
+    entries, report.cursor = scan_batch(category.name, cursor, RETENTION_BATCH_SIZE)
+    report.cycle_completed = report.cursor == ""
+    referenced = set()
+    if category.check_references:
+        keys = {file_key(entry.name) for _, entry in entries}
+        referenced = referenced_keys(db, keys) | (keys & pending_keys if pending_keys else set())
+
+    for relative_path, entry in entries:
+        report.scanned += 1
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        age_days = (now - stat.st_mtime) / 86400
+
+        if file_key(entry.name) in referenced:
+            report.referenced += 1
+            if not (RETENTION_COLD_BUCKET and RETENTION_TIER_AFTER_DAYS > 0 and age_days >= RETENTION_TIER_AFTER_DAYS):
+                report.kept += 1
+                continue
+            action = "tier"
+        elif category.ttl_days > 0 and age_days >= category.ttl_days:
+            action = "archive" if RETENTION_COLD_BUCKET else "delete"
+        else:
+            report.kept += 1
+            continue
+
+        if dry_run:
+            if len(report.actions) < REPORT_SAMPLE_SIZE:
+                report.actions.append({
+                    "file": relative_path, "action": action,
+                    "bytes": stat.st_size, "age_days": round(age_days, 1)
+                })
+        else:
+            try:
+                _apply(db, category, entry, action, stat.st_size)
+            except Exception as e:
+                report.errors += 1
+                logger.warning("보존 정책 적용 실패", extra={"file": entry.path, "action": action, "error": str(e)})
+                continue
+
+        report.bytes_freed += stat.st_size
+        if action == "delete":
+            report.deleted += 1
+        elif action == "archive":
+            report.archived += 1
+        else:
+            report.tiered += 1
+    return report
+
+
+def report_category(db, category: RetentionCategory, now: float, pending_keys: Set[str]) -> CategoryReport:
+    """카테고리 전체를 처음부터 끝까지 드라이런으로 검사하여 하나의 보고서로 합칩니다 (저장된 커서는 사용하지 않음)."""
+    total = CategoryReport(category=category.name, cycle_completed=True)
+    cursor = ""
+    while True:
+        report = process_category(db, category, cursor, True, now, pending_keys)
+        for name in ("scanned", "referenced", "kept", "deleted", "archived", "tiered", "errors", "bytes_freed"):
+            setattr(total, name, getattr(total, name) + getattr(report, name))
+        total.actions.extend(report.actions[:REPORT_SAMPLE_SIZE - len(total.actions)])
+        cursor = report.cursor
+        if not cursor:
+            return total
+
+
+# 같은 프로세스에서 동시에 두 번 실행되지 않도록 함 (워커/서버 간에는 singleton_lock 사용)
+_run_lock = threading.Lock()
+
+
+def run_retention(dry_run: bool = False) -> dict:
+    """
+    모든 카테고리에 대해 보존 정책을 한 배치씩 적용하고 보고서를 반환합니다.
+
+    - images 테이블이 참조하는 파일은 삭제하지 않음 (RETENTION_TIER_AFTER_DAYS 경과 시 콜드 스토리지로 이동)
+    - 참조되지 않고 카테고리 TTL이 지난 파일은 삭제 (콜드 버킷이 설정되어 있으면 보관 후 삭제)
+    - dry_run이면 파일, DB, 커서를 변경하지 않고 카테고리 전체를 끝까지 검사하여 대상 목록만 보고
+    - 여러 워커가 같은 주기로 실행해도 한 곳에서만 실제로 처리
+    """
+    if not _run_lock.acquire(blocking=False):
+        return {"status": "busy", "message": "보존 정책 작업이 이미 실행 중입니다."}
+    try:
+        with singleton_lock("retention") as acquired:
+            if not acquired:
+                return {"status": "busy", "message": "다른 워커에서 보존 정책 작업이 실행 중입니다."}
+            return _run_retention(dry_run)
+    finally:
+        _run_lock.release()
+
+
+def _run_retention(dry_run: bool) -> dict:
+    start_time = time.perf_counter()
+    state = _load_state()
+    reports = []
+    db = SessionLocal()
+    try:
+        with stage_timer("retention"):
+            if dry_run:
+                # 채우기 작업 대신 채워질 값을 메모리에서 계산하여 실제 실행이 삭제할 대상을 보고
+                pending_keys = pending_file_keys(db)
+                now = time.time()
+                reports = [report_category(db, category, now, pending_keys) for category in CATEGORIES]
+                return _result(reports, True, start_time)
+            # file_key가 비어 있는 행이 남아 있으면 참조 여부를 알 수 없으므로 채우기만 하고 파일은 건드리지 않음
+            backfilled = 0
+            while backfilled < BACKFILL_ROWS_PER_RUN:
+                count = backfill_image_file_keys(db)
+                backfilled += count
+                if count == 0:
+                    break
+            else:
+                logger.info("images.file_key 채우는 중, 파일 처리는 다음 실행으로 미룸", extra={"rows": backfilled})
+                return {"status": "backfilling", "dry_run": False, "rows_backfilled": backfilled}
+            now = time.time()
+            for category in CATEGORIES:
+                report = process_category(db, category, state.get(category.name, ""), False, now)
+                reports.append(report)
+                state[category.name] = report.cursor
+    finally:
+        db.close()
+
+    _save_state(state)
+    return _result(reports, False, start_time)
+
+
+def _result(reports: List[CategoryReport], dry_run: bool, start_time: float) -> dict:
+    result = {
+        "status": "success",
+        "dry_run": dry_run,
+        "cold_storage": bool(RETENTION_COLD_BUCKET),
+        "referenced_files": sum(r.referenced for r in reports),
+        "elapsed": round(time.perf_counter() - start_time, 3),
+        "categories": [asdict(report) for report in reports],
+    }
+    logger.info("보존 정책 실행 완료", extra={
+        "dry_run": dry_run,
+        "deleted": sum(r.deleted for r in reports),
+        "archived": sum(r.archived for r in reports),
+        "tiered": sum(r.tiered for r in reports),
+        "bytes_freed": sum(r.bytes_freed for r in reports),
+    })
+    return result
+
+
+_scheduler_task: Optional[asyncio.Task] = None
+
+
+async def _retention_loop():
+    await asyncio.sleep(RETENTION_INITIAL_DELAY_SECONDS)
+    while True:
+        try:
+            await run_in_threadpool(run_retention, RETENTION_DRY_RUN)
+        except Exception:
+            logger.exception("보존 정책 작업 실패")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+def start_scheduler():
+    """보존 정책 작업을 주기적으로 실행하는 백그라운드 작업을 시작합니다."""
+    global _scheduler_task
+    if RETENTION_ENABLED and _scheduler_task is None:
+        _scheduler_task = asyncio.create_task(_retention_loop())
+
+
+async def stop_scheduler():
+    global _scheduler_task
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+        _scheduler_task = None
+
+
+@router.get("/report")
+async def retention_report():
+    """삭제/이동 대상 파일을 실제로 처리하지 않고 보고합니다 (드라이런)."""
+    return await run_in_threadpool(run_retention, True)
+
+
+@router.post("/run")
+async def retention_run(dry_run: bool = False):
+    """보존 정책을 즉시 한 배치 실행합니다."""
+    return await run_in_threadpool(run_retention, dry_run)
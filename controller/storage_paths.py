@@ -0,0 +1,186 @@
+# controller/storage_paths.py
+import os
+import heapq
+import hashlib
+from typing import List, Optional, Tuple
+from fastapi.staticfiles import StaticFiles
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 업로드 및 결과 저장 디렉토리
+UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
+
+# 카테고리별 디렉토리 (UPLOAD_DIR 기준 상대 경로, URL에도 그대로 사용)
+CATEGORY_DIRS = {
+    "originals": "",
+    "results": "results",
+    "bg_results": "bg_results",
+    "edges": "edges",
+    "bria_results": "bria_results",
+    # 스트리밍 파이프라인의 배경 제거 미리보기 (images 테이블이 참조하지 않는 임시 파일)
+    "previews": "previews",
+}
+
+# 해시 앞부분으로 하위 디렉토리를 나눠 저장 (예: ab/cd/{file_id}_nobg.png)
+STORAGE_SHARDING = os.getenv("STORAGE_SHARDING", "true").lower() == "true"
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+
+def file_key(name: str) -> str:
+    """
+    파일 이름에서 요청/파일 ID를 추출합니다.
+    예: "{file_id}.jpg", "{file_id}_nobg.png", "{file_id}_edge.png" → file_id
+    """
+    return name.split(".", 1)[0].split("_", 1)[0]
+
+
+def shard_prefix(name: str) -> str:
+    """
+    파일 ID 해시로 샤드 경로를 계산합니다 (예: "3f/a2").
+    같은 ID의 원본, 결과, 윤곽선 파일은 카테고리가 달라도 같은 샤드에 놓입니다.
+    """
+    digest = hashlib.md5(file_key(name).encode()).hexdigest()
+    return "/".join(digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH))
+
+
+def category_dir(category: str) -> str:
+    return os.path.join(UPLOAD_DIR, CATEGORY_DIRS[category])
+
+
+def legacy_path(category: str, name: str) -> str:
+    """샤딩 이전의 평면 경로"""
+    return os.path.join(category_dir(category), name)
+
+
+def sharded_path(category: str, name: str) -> str:
+    return os.path.join(category_dir(category), *shard_prefix(name).split("/"), name)
+
+
+def storage_path(category: str, name: str) -> str:
+    """새 파일을 저장할 경로를 반환합니다 (상위 디렉토리를 만들어 둠)."""
+    path = sharded_path(category, name) if STORAGE_SHARDING else legacy_path(category, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def resolve_path(category: str, name: str) -> Optional[str]:
+    """
+    기존 파일의 실제 경로를 찾습니다 (없으면 None).
+    마이그레이션 중에는 샤딩 경로와 평면 경로 어디에나 있을 수 있으므로 둘 다 확인하고,
+    확인하는 사이 파일이 옮겨진 경우를 위해 샤딩 경로를 한 번 더 확인합니다.
+    """
+    sharded = sharded_path(category, name)
+    if os.path.exists(sharded):
+        return sharded
+    legacy = legacy_path(category, name)
+    if os.path.exists(legacy):
+        return legacy
+    if os.path.exists(sharded):
+        return sharded
+    return None
+
+
+def url_for_path(path: str) -> str:
+    """저장 경로를 클라이언트에서 접근 가능한 /uploads URL로 바꿉니다."""
+    relative = os.path.relpath(path, UPLOAD_DIR).replace(os.sep, "/")
+    return f"/uploads/{relative}"
+
+
+def storage_url(category: str, name: str) -> str:
+    return url_for_path(storage_path(category, name))
+
+
+def _is_shard_dir(name: str) -> bool:
+    return len(name) == SHARD_WIDTH and all(c in "0123456789abcdef" for c in name)
+
+
+# 샤드 디렉토리 이름 (00 ~ ff), 디렉토리를 나열하지 않고 순서대로 방문하는 데 사용
+SHARD_NAMES = [f"{i:0{SHARD_WIDTH}x}" for i in range(16 ** SHARD_WIDTH)]
+
+
+def _scan_files(directory: str, relative: str, after: str, limit: int) -> List[Tuple[str, os.DirEntry]]:
+    """디렉토리 바로 아래 파일 중 이름이 after보다 큰 것을 이름 순으로 최대 limit개 반환합니다."""
+    candidates = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith(".") or entry.name <= after or not entry.is_file(follow_symlinks=False):
+                    continue
+                candidates.append((entry.name, entry))
+                # 남은 개수만큼만 유지하여 메모리 사용량을 제한
+                if len(candidates) > 4 * limit:
+                    candidates = heapq.nsmallest(limit, candidates, key=lambda item: item[0])
+    except FileNotFoundError:
+        return []
+    return [(relative + name, entry) for name, entry in heapq.nsmallest(limit, candidates, key=lambda item: item[0])]
+
+
+def _scan_shards(directory: str, relative: str, cursor_parts: List[str], depth: int, limit: int,
+                 out: List[Tuple[str, os.DirEntry]]):
+    """
+    샤드 디렉토리를 이름 순으로 방문하며 커서 다음 파일을 모읍니다.
+    디렉토리 이름은 정해져 있으므로 상위 디렉토리를 나열하지 않고, 파일이 있는 맨 아래 디렉토리만 읽습니다.
+    """
+    start = cursor_parts[0] if cursor_parts else ""
+    for name in SHARD_NAMES:
+        if len(out) >= limit:
+            return
+        if name < start:
+            continue
+        # 커서가 가리키는 디렉토리에서만 커서 이후부터, 그 다음 디렉토리부터는 처음부터
+        rest = cursor_parts[1:] if name == start else []
+        path = os.path.join(directory, name)
+        if depth + 1 < SHARD_DEPTH:
+            if os.path.isdir(path):
+                _scan_shards(path, f"{relative}{name}/", rest, depth + 1, limit, out)
+        else:
+            out.extend(_scan_files(path, f"{relative}{name}/", rest[0] if rest else "", limit - len(out)))
+
+
+def scan_batch(category: str, cursor: str, limit: int) -> Tuple[List[Tuple[str, os.DirEntry]], str]:
+    """
+    카테고리 디렉토리에서 커서(마지막으로 처리한 상대 경로) 다음 파일을 최대 limit개 반환합니다.
+
+    평면 파일(샤딩 이전 구조)을 먼저, 그 다음 샤드 디렉토리(ab/cd/...)를 경로 순으로 순회합니다.
+    샤드는 커서가 가리키는 디렉토리부터 필요한 만큼만 읽으므로 한 번에 읽는 디렉토리는 배치 크기에 비례합니다.
+    평면 파일을 찾으려면 카테고리 디렉토리 전체를 나열해야 하므로 주기(커서가 빈 값에서 다시 시작)마다
+    평면 파일 단계에서만 나열하고, 평면 파일이 남아 있지 않으면 샤드 단계로 바로 넘어갑니다.
+    반환: ([(상대 경로, DirEntry)], 다음 커서). 끝까지 도달하면 다음 커서는 "".
+    """
+    directory = category_dir(category)
+    if not os.path.isdir(directory):
+        return [], ""
+    out: List[Tuple[str, os.DirEntry]] = []
+    shard_cursor = cursor.split("/") if "/" in cursor else []
+    if not shard_cursor:
+        out = _scan_files(directory, "", cursor, limit)
+    if len(out) < limit:
+        _scan_shards(directory, "", shard_cursor, 0, limit, out)
+    next_cursor = out[-1][0] if len(out) >= limit else ""
+    return out, next_cursor
+
+
+class ShardedStaticFiles(StaticFiles):
+    """
+    /uploads 정적 파일 서빙. 샤딩 이전의 평면 URL(/uploads/results/{file_id}_nobg.png)로
+    요청해도 샤딩 경로에서 찾아 반환하고, 그 반대도 처리합니다.
+    """
+
+    def lookup_path(self, path: str):
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None:
+            return full_path, stat_result
+
+        directory, name = os.path.split(path.strip("/"))
+        parts = directory.split("/") if directory else []
+        # 샤딩 URL로 요청했지만 아직 평면 경로에 있는 경우
+        if len(parts) >= SHARD_DEPTH and all(_is_shard_dir(part) for part in parts[-SHARD_DEPTH:]):
+            base = "/".join(parts[:-SHARD_DEPTH])
+            return super().lookup_path(f"{base}/{name}" if base else name)
+        # 평면 URL로 요청했지만 이미 샤딩 경로로 옮겨진 경우
+        if directory in CATEGORY_DIRS.values():
+            sharded = f"{directory}/{shard_prefix(name)}/{name}" if directory else f"{shard_prefix(name)}/{name}"
+            return super().lookup_path(sharded)
+        return full_path, stat_result
@@ -0,0 +1,303 @@
+# controller/streaming_io.py
+import os
+import re
+import json
+import base64
+import binascii
+from typing import Any, Dict
+import aiofiles
+
+# 스트리밍 처리 단위 (4의 배수여야 base64 조각 경계가 맞음)
+CHUNK_SIZE = 64 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# 길이(0) + "IEND" + CRC
+PNG_IEND_CHUNK = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+_WHITESPACE = re.compile(rb"\s+")
+
+
+class InvalidImageError(ValueError):
+    """저장하려는 데이터가 올바른 이미지가 아닌 경우"""
+
+
+class PayloadTooLargeError(ValueError):
+    """업로드 크기 제한을 초과한 경우"""
+
+
+class JsonStringFieldReader:
+    """
+    JSON 객체 본문에서 문자열 필드 하나의 값만 조각 단위로 꺼냅니다.
+
+    본문 전체를 파싱하지 않고 지정한 필드의 문자열 내용을 받는 대로 돌려주며,
+    나머지 필드는 작은 값으로 보고 max_other_bytes까지만 모아 finish()에서 반환합니다.
+    """
+
+    _WHITESPACE = b" \t\r\n"
+    _ESCAPES = {ord("/"): b"/", ord("\\"): b"\\", ord('"'): b'"', ord("n"): b"\n",
+                ord("r"): b"\r", ord("t"): b"\t", ord("b"): b"\b", ord("f"): b"\f"}
+
+    def __init__(self, field: str, max_other_bytes: int = 64 * 1024):
+        self.field = field
+        self.max_other_bytes = max_other_bytes
+        self.found = False
+        self.fields: Dict[str, Any] = {}
+        self._state = "start"
+        self._key = ""
+        self._raw = bytearray()
+        self._other_bytes = 0
+        self._escape = None
+        # 다른 필드 값을 모으는 중의 상태 (중첩 깊이, 문자열 안인지, 이스케이프 직후인지)
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @staticmethod
+    def _invalid(message: str = "JSON 형식이 올바르지 않습니다."):
+        return InvalidImageError(message)
+
+    def _collect(self, byte: int):
+        self._other_bytes += 1
+        if self._other_bytes > self.max_other_bytes:
+            raise PayloadTooLargeError(f"{self.field} 외 필드가 제한({self.max_other_bytes} bytes)을 초과했습니다.")
+        self._raw.append(byte)
+
+    def _loads(self):
+        try:
+            return json.loads(bytes(self._raw))
+        except ValueError:
+            raise self._invalid()
+        finally:
+            self._raw = bytearray()
+
+    def _unescape(self, escape: bytes) -> bytes:
+        if escape[1] == ord("u"):
+            try:
+                return chr(int(escape[2:6], 16)).encode("utf-8", errors="surrogatepass")
+            except ValueError:
+                raise self._invalid()
+        if escape[1] not in self._ESCAPES:
+            raise self._invalid()
+        return self._ESCAPES[escape[1]]
+
+    def feed(self, data: bytes) -> bytes:
+        """data를 처리하고 그 안에 들어 있던 필드 값의 내용(이스케이프 해제)을 반환합니다."""
+        out = []
+        i, n = 0, len(data)
+        while i < n:
+            state = self._state
+            if state == "stream":
+                if self._escape is not None:
+                    self._escape += data[i:i + 1]
+                    i += 1
+                    if len(self._escape) == (6 if self._escape[1:2] == b"u" else 2):
+                        out.append(self._unescape(self._escape))
+                        self._escape = None
+                    continue
+                # 값의 대부분은 이스케이프가 없으므로 따옴표/역슬래시까지 한 번에 복사
+                stops = [p for p in (data.find(b'"', i), data.find(b"\\", i)) if p >= 0]
+                end = min(stops) if stops else n
+                out.append(data[i:end])
+                if end == n:
+                    break
+                if data[end] == ord('"'):
+                    self._state = "after_value"
+                else:
+                    self._escape = b"\\"
+                i = end + 1
+                continue
+
+            byte = data[i]
+            if state == "other":
+                if self._in_string:
+                    if self._escaped:
+                        self._escaped = False
+                    elif byte == ord("\\"):
+                        self._escaped = True
+                    elif byte == ord('"'):
+                        self._in_string = False
+                elif byte == ord('"'):
+                    self._in_string = True
+                elif byte in b"{[":
+                    self._depth += 1
+                elif byte in b"}]" or byte == ord(","):
+                    if self._depth == 0:
+                        # 값이 끝났으므로 구분자는 after_value에서 처리
+                        self.fields[self._key] = self._loads()
+                        self._state = "after_value"
+                        continue
+                    if byte != ord(","):
+                        self._depth -= 1
+                self._collect(byte)
+                i += 1
+                continue
+            if state == "key":
+                self._collect(byte)
+                i += 1
+                if self._escaped:
+                    self._escaped = False
+                elif byte == ord("\\"):
+                    self._escaped = True
+                elif byte == ord('"') and len(self._raw) > 1:
+                    self._key = self._loads()
+                    self._state = "colon"
+                continue
+
+            i += 1
+            if byte in self._WHITESPACE:
+                continue
+            if state == "start" and byte == ord("{"):
+                self._state = "first_key"
+            elif state in ("first_key", "next_key") and byte == ord('"'):
+                self._raw.append(byte)
+                self._state = "key"
+            elif state in ("first_key", "after_value") and byte == ord("}"):
+                self._state = "end"
+            elif state == "after_value" and byte == ord(","):
+                self._state = "next_key"
+            elif state == "colon" and byte == ord(":"):
+                self._state = "value"
+            elif state == "value" and self._key == self.field:
+                if self.found:
+                    raise self._invalid(f"{self.field} 필드가 중복되었습니다.")
+                if byte != ord('"'):
+                    raise self._invalid("이미지 데이터 형식이 올바르지 않습니다.")
+                self.found = True
+                self._state = "stream"
+            elif state == "value":
+                self._state = "other"
+                self._depth, self._in_string, self._escaped = 0, False, False
+                i -= 1
+            else:
+                raise self._invalid()
+        return b"".join(out)
+
+    def finish(self) -> Dict[str, Any]:
+        """본문이 올바른 JSON 객체로 끝났는지 확인하고 나머지 필드를 반환합니다."""
+        if self._state != "end":
+            raise self._invalid()
+        return self.fields
+
+
+class Base64StreamDecoder:
+    """
+    base64 문자열(또는 data URL)을 조각 단위로 디코딩합니다.
+
+    전체 문자열을 한 번에 b64decode하지 않고, 4글자 단위로 끊어서
+    들어오는 대로 디코딩하므로 디코딩된 전체 버퍼를 메모리에 만들지 않습니다.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self._header_done = False
+        self._header = b""
+
+    def feed(self, data) -> bytes:
+        if isinstance(data, str):
+            try:
+                data = data.encode("ascii", errors="strict")
+            except UnicodeEncodeError:
+                raise InvalidImageError("base64 데이터에 ASCII가 아닌 문자가 있습니다.")
+
+        # "data:image/png;base64," 접두사 제거
+        if not self._header_done:
+            self._header += data
+            if self._header[:5].lower() == b"data:":
+                comma = self._header.find(b",")
+                if comma < 0:
+                    if len(self._header) > 256:
+                        raise InvalidImageError("data URL 형식이 올바르지 않습니다.")
+                    return b""
+                data = self._header[comma + 1:]
+            elif len(self._header) < 5:
+                return b""
+            else:
+                data = self._header
+            self._header_done = True
+            self._header = b""
+
+        buffer = self._pending + _WHITESPACE.sub(b"", data)
+        usable = len(buffer) // 4 * 4
+        self._pending = buffer[usable:]
+        try:
+            return base64.b64decode(buffer[:usable], validate=True)
+        except binascii.Error as e:
+            raise InvalidImageError(f"base64 데이터가 올바르지 않습니다: {str(e)}")
+
+    def finish(self) -> bytes:
+        remaining = self._pending
+        if not self._header_done:
+            remaining = self._header
+        self._pending = b""
+        if not remaining:
+            return b""
+        try:
+            return base64.b64decode(remaining + b"=" * (-len(remaining) % 4), validate=True)
+        except binascii.Error as e:
+            raise InvalidImageError(f"base64 데이터가 올바르지 않습니다: {str(e)}")
+
+
+class PngStreamWriter:
+    """
+    PNG 데이터를 받는 대로 임시 파일에 기록하고, 완료 시 검증 후 최종 경로로 옮깁니다.
+
+    - 시작 부분의 PNG 시그니처와 IHDR 청크를 확인
+    - 마지막 IEND 청크를 확인 (잘린 업로드 방지)
+    - max_bytes를 넘으면 PayloadTooLargeError
+
+    사용 예:
+        async with PngStreamWriter(path, max_bytes) as writer:
+            async for chunk in request.stream():
+                await writer.write(chunk)
+            await writer.commit()
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._temp_path = f"{path}.part"
+        self._file = None
+        self._head = b""
+        self._tail = b""
+        self._committed = False
+
+    async def __aenter__(self):
+        self._file = await aiofiles.open(self._temp_path, "wb")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        if not self._committed and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        return False
+
+    def _check_header(self):
+        if len(self._head) < 16:
+            return
+        if self._head[:8] != PNG_SIGNATURE or self._head[12:16] != b"IHDR":
+            raise InvalidImageError("PNG 이미지가 아닙니다.")
+
+    async def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise PayloadTooLargeError(f"이미지 크기가 제한({self.max_bytes} bytes)을 초과했습니다.")
+        if len(self._head) < 16:
+            self._head += chunk[:16 - len(self._head)]
+            self._check_header()
+        self._tail = (self._tail + chunk)[-len(PNG_IEND_CHUNK):]
+        await self._file.write(chunk)
+
+    async def commit(self):
+        if len(self._head) < 16:
+            raise InvalidImageError("PNG 이미지가 아닙니다.")
+        if self._tail != PNG_IEND_CHUNK:
+            raise InvalidImageError("PNG 데이터가 완전하지 않습니다.")
+        await self._file.close()
+        self._file = None
+        os.replace(self._temp_path, self.path)
+        self._committed = True
@@ -0,0 +1,159 @@
+# controller/tracing.py
+import os
+import functools
+import logging
+from typing import Callable, Sequence
+from opentelemetry import trace, context, propagate
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider, ReadableSpan
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.routing import Match
+
+# 로깅 설정
+logger = logging.getLogger("tracing")
+
+# 트레이싱 설정
+# - none: 비활성화 (기본값)
+# - otlp: OTLP/HTTP로 로컬 컬렉터에 전송 (OTEL_EXPORTER_OTLP_ENDPOINT 사용)
+# - file: TRACING_FILE_PATH에 JSON Lines로 기록 (오프라인 분석용)
+# - console: 표준 출력
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", os.path.join(os.getcwd(), "logs", "traces.jsonl"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "ai-image-optimizer")
+
+tracer = trace.get_tracer("ai_image_optimizer")
+
+
+class FileSpanExporter(SpanExporter):
+    """완료된 span을 한 줄에 하나씩 JSON으로 파일에 기록합니다."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        try:
+            for span in spans:
+                self._file.write(span.to_json(indent=None) + "\n")
+            self._file.flush()
+            return SpanExportResult.SUCCESS
+        except Exception as e:
+            logger.error("span 파일 기록 실패: %s", e)
+            return SpanExportResult.FAILURE
+
+    def shutdown(self):
+        self._file.close()
+
+
+def _create_exporter():
+    if TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if TRACING_EXPORTER == "file":
+        return FileSpanExporter(TRACING_FILE_PATH)
+    if TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    return None
+
+
+def setup_tracing():
+    """환경 설정에 따라 TracerProvider와 exporter를 등록합니다."""
+    exporter = _create_exporter()
+    if exporter is None:
+        logger.info("트레이싱 비활성화됨")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logger.info("트레이싱 활성화됨", extra={"exporter": TRACING_EXPORTER})
+
+
+def shutdown_tracing():
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+def route_label(scope) -> str:
+    """요청 경로에 해당하는 라우트 템플릿을 반환합니다 (예: /api/background/result/{file_id})."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+def current_trace_id() -> str:
+    span_context = trace.get_current_span().get_span_context()
+    return format(span_context.trace_id, "032x") if span_context.is_valid else ""
+
+
+def bind_context(func: Callable, span_name: str = None) -> Callable:
+    """
+    현재 트레이스 컨텍스트를 캡처하여 백그라운드 작업에서도 같은 트레이스에 연결합니다.
+    BackgroundTasks나 스레드 풀에 넘기는 함수에 사용합니다.
+    """
+    captured = context.get_current()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = context.attach(captured)
+        try:
+            if span_name:
+                with tracer.start_as_current_span(span_name):
+                    return func(*args, **kwargs)
+            return func(*args, **kwargs)
+        finally:
+            context.detach(token)
+
+    return wrapper
+
+
+class TracingMiddleware:
+    """요청마다 루트 span을 시작하고 W3C traceparent 헤더로 전달된 컨텍스트를 이어받는 ASGI 미들웨어"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        parent = propagate.extract(headers)
+        route = route_label(scope)
+
+        with tracer.start_as_current_span(
+            f"{scope['method']} {route}",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.method": scope["method"],
+                "http.route": route,
+                "http.target": scope["path"],
+            },
+        ) as span:
+            trace_id = current_trace_id()
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                    if trace_id:
+                        message.setdefault("headers", [])
+                        message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
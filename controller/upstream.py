@@ -0,0 +1,177 @@
+# controller/upstream.py
+import os
+import io
+import threading
+import boto3
+import requests
+from typing import Iterator, Tuple
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from controller.api_keys import get_api_key
+from controller.metrics import stage_timer, record_upstream
+from controller.upstream_gate import upstream_slot
+
+load_dotenv()
+
+# 업스트림 API 주소
+REMOVE_BG_API_URL = os.getenv("REMOVE_BG_API_URL", "https://api.remove.bg/v1.0/removebg")
+BRIA_API_URL = os.getenv("BRIA_API_URL", "https://engine.prod.bria-api.com/v1/background/replace")
+
+# AWS S3 설정
+BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "briadownload")
+REGION = "ap-northeast-2"  # 서울 리전
+# S3 호환 스토리지(로컬 스텁, MinIO 등)를 사용할 때 지정
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")
+# BRIA가 이미지를 내려받을 공개 URL의 기본 주소 (기본값: S3 가상 호스트 주소)
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL", "") or (
+    f"{S3_ENDPOINT_URL.rstrip('/')}/{BUCKET_NAME}" if S3_ENDPOINT_URL
+    else f"https://{BUCKET_NAME}.s3.{REGION}.amazonaws.com"
+)
+
+# S3 클라이언트 (키가 바뀌면 다시 만듦)
+_s3_client = None
+_s3_credentials: Tuple[str, str] = ("", "")
+_s3_lock = threading.Lock()
+
+
+def _s3():
+    """
+    현재 AWS 키로 만든 S3 클라이언트를 반환합니다.
+    /api/keys로 다른 워커에서 키를 바꿔도 다음 호출부터 새 키가 적용됩니다.
+    """
+    global _s3_client, _s3_credentials
+    credentials = (get_api_key("AWS_ACCESS_KEY_ID"), get_api_key("AWS_SECRET_ACCESS_KEY"))
+    with _s3_lock:
+        if _s3_client is None or credentials != _s3_credentials:
+            _s3_client = boto3.client(
+                's3',
+                region_name=REGION,
+                aws_access_key_id=credentials[0] or None,
+                aws_secret_access_key=credentials[1] or None,
+                endpoint_url=S3_ENDPOINT_URL or None,
+                config=Config(s3={"addressing_style": "path"}) if S3_ENDPOINT_URL else None
+            )
+            _s3_credentials = credentials
+        return _s3_client
+
+
+def call_remove_bg(image_data: bytes, filename: str, content_type: str, api_key: str) -> requests.Response:
+    """Remove.bg API로 배경 제거를 요청합니다."""
+    with upstream_slot("remove_bg"), stage_timer("remove_bg"):
+        try:
+            response = requests.post(
+                REMOVE_BG_API_URL,
+                files={'image_file': (filename, image_data, content_type)},
+                data={'size': 'auto'},
+                headers={'X-Api-Key': api_key},
+            )
+        except requests.RequestException:
+            record_upstream("remove_bg", "error", sent_bytes=len(image_data))
+            raise
+        record_upstream("remove_bg", response.status_code, len(image_data), len(response.content))
+    return response
+
+
+def call_bria_replace(request_data: dict, api_token: str) -> requests.Response:
+    """BRIA 배경 교체 API를 동기 모드로 호출합니다."""
+    with upstream_slot("bria"), stage_timer("bria"):
+        try:
+            response = requests.post(
+                BRIA_API_URL,
+                headers={
+                    "Content-Type": "application/json",
+                    "api_token": api_token,
+                    "Cache-Control": "no-cache"
+                },
+                json=request_data,
+                timeout=60
+            )
+        except requests.RequestException:
+            record_upstream("bria", "error")
+            raise
+        record_upstream("bria", response.status_code, len(response.request.body or b""), len(response.content))
+    return response
+
+
+def upload_to_s3(data: bytes, key: str, content_type: str) -> str:
+    """S3에 파일을 업로드하고 공개 URL을 반환합니다."""
+    with upstream_slot("s3"), stage_timer("s3_put"):
+        try:
+            _s3().upload_fileobj(
+                io.BytesIO(data),
+                BUCKET_NAME,
+                key,
+                ExtraArgs={'ContentType': content_type}
+            )
+        except Exception:
+            record_upstream("s3", "error", sent_bytes=len(data))
+            raise
+        record_upstream("s3", 200, sent_bytes=len(data))
+    return f"{S3_PUBLIC_URL}/{key}"
+
+
+def archive_to_s3(path: str, key: str, bucket: str, storage_class: str) -> str:
+    """로컬 파일을 콜드 스토리지 버킷으로 옮기기 위해 업로드하고 s3:// 주소를 반환합니다."""
+    size = os.path.getsize(path)
+    with stage_timer("s3_archive"):
+        try:
+            _s3().upload_file(path, bucket, key, ExtraArgs={"StorageClass": storage_class})
+        except Exception:
+            record_upstream("s3", "error", sent_bytes=size)
+            raise
+        record_upstream("s3", 200, sent_bytes=size)
+    return f"s3://{bucket}/{key}"
+
+
+def put_file_to_s3(path: str, bucket: str, key: str, content_type: str, cache_control: str):
+    """로컬 결과 파일을 캐시 헤더와 함께 업로드합니다."""
+    size = os.path.getsize(path)
+    with upstream_slot("s3"), stage_timer("s3_put"):
+        try:
+            _s3().upload_file(path, bucket, key, ExtraArgs={"ContentType": content_type, "CacheControl": cache_control})
+        except Exception:
+            record_upstream("s3", "error", sent_bytes=size)
+            raise
+        record_upstream("s3", 200, sent_bytes=size)
+
+
+def s3_object_exists(bucket: str, key: str) -> bool:
+    with stage_timer("s3_head"):
+        try:
+            _s3().head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                record_upstream("s3", 404)
+                return False
+            record_upstream("s3", "error")
+            raise
+        record_upstream("s3", 200)
+    return True
+
+
+def presign_s3_get(bucket: str, key: str, expires: int) -> str:
+    """만료 시간이 있는 다운로드 URL을 만듭니다 (네트워크 호출 없음)."""
+    return _s3().generate_presigned_url("get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires)
+
+
+def list_s3_objects(bucket: str, prefix: str) -> Iterator[Tuple[str, int]]:
+    """prefix 아래 객체의 (키, 크기)를 페이지 단위로 가져옵니다 (디렉토리 표시용 빈 객체 제외)."""
+    paginator = _s3().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        record_upstream("s3", 200)
+        for item in page.get("Contents", []):
+            if not item["Key"].endswith("/"):
+                yield item["Key"], item["Size"]
+
+
+def get_s3_object(bucket: str, key: str) -> bytes:
+    """객체 전체를 메모리로 내려받습니다."""
+    with upstream_slot("s3"), stage_timer("s3_get"):
+        try:
+            data = _s3().get_object(Bucket=bucket, Key=key)["Body"].read()
+        except Exception:
+            record_upstream("s3", "error")
+            raise
+        record_upstream("s3", 200, received_bytes=len(data))
+    return data
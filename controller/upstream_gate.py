@@ -0,0 +1,405 @@
+# controller/upstream_gate.py
+import os
+import math
+import asyncio
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from model.database import DEFAULT_USER_CREDITS, get_db
+from controller.auth import authenticated_user_id, user_cache
+from controller.metrics import (
+    stage_timer, UPSTREAM_ACTIVE, UPSTREAM_QUEUE_DEPTH, UPSTREAM_QUEUE_WAIT,
+    UPSTREAM_REJECTED, UPSTREAM_STARVATION_PROMOTIONS
+)
+
+load_dotenv()
+
+# 업스트림별 최대 동시 호출 수 (0이면 제한 없음)
+UPSTREAM_CONCURRENCY = os.getenv("UPSTREAM_CONCURRENCY", "remove_bg=16,bria=8,s3=32")
+# 업스트림별 최대 대기 호출 수 (넘으면 바로 429)
+UPSTREAM_QUEUE_SIZE = int(os.getenv("UPSTREAM_QUEUE_SIZE", "64"))
+# 대기열에서 기다릴 최대 시간 (초, 넘으면 429)
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "15"))
+# 스레드를 붙잡고 기다릴 수 있는 호출 수 (모든 업스트림 합계, 넘으면 바로 429)
+# 요청 처리 경로는 이벤트 루프에서 기다리므로(upstream_slot_async) 스레드에서 직접 호출하는 작업(결과 게시, 보존 정책)만 해당.
+# 스레드 풀(기본 40개)보다 충분히 작아야 DB 의존성, 파일 응답 등이 스레드를 얻을 수 있음
+UPSTREAM_MAX_BLOCKING_WAITERS = int(os.getenv("UPSTREAM_MAX_BLOCKING_WAITERS", "16"))
+
+# 우선순위 등급별 가중치 (가중치가 클수록 대기열에서 더 자주 선택됨)
+PRIORITY_WEIGHTS = os.getenv("PRIORITY_WEIGHTS", "paid=8,free=2,anonymous=1")
+# 보유 크레딧이 이 값 이상이면 paid 등급
+# 크레딧은 가입 시 DEFAULT_USER_CREDITS만큼만 지급되므로, 기본값은 그보다 많이 가진(추가 구매한) 사용자
+PRIORITY_PAID_MIN_CREDITS = int(os.getenv("PRIORITY_PAID_MIN_CREDITS", str(DEFAULT_USER_CREDITS + 1)))
+# 이 시간(초) 이상 기다린 호출은 가중치와 관계없이 먼저 처리 (기아 방지)
+PRIORITY_MAX_WAIT_SECONDS = float(os.getenv("PRIORITY_MAX_WAIT_SECONDS", "5"))
+
+# 현재 요청의 (우선순위 등급, 흐름 키). 흐름 키는 같은 등급 안에서 사용자 간 공정성에 사용
+request_priority_var: ContextVar[Tuple[str, str]] = ContextVar("request_priority", default=("anonymous", ""))
+
+
+def classify_tier(credits: Optional[int]) -> str:
+    """보유 크레딧으로 우선순위 등급을 정합니다 (사용자 정보가 없으면 anonymous)."""
+    if credits is None:
+        return "anonymous"
+    return "paid" if credits >= PRIORITY_PAID_MIN_CREDITS else "free"
+
+
+def set_request_priority(tier: str, flow: str):
+    request_priority_var.set((tier, flow))
+
+
+async def request_priority(
+    request: Request,
+    user_id: Optional[int] = Depends(authenticated_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    요청의 우선순위 등급을 정하는 라우트 의존성
+
+    토큰의 사용자가 있으면 보유 크레딧으로 등급을 정하고(사용자 캐시 사용), 없으면 anonymous 등급으로 클라이언트 주소별로 구분합니다.
+    세션은 같은 요청의 get_db 의존성과 공유되므로 엔드포인트가 쓰는 세션을 그대로 사용합니다.
+    """
+    if user_id:
+        # 캐시 미스면 DB를 조회하므로 스레드 풀에서 실행
+        # (동기 의존성으로 바꾸면 스레드에서 설정한 컨텍스트 변수가 엔드포인트에 전달되지 않음)
+        user = await run_in_threadpool(user_cache.get, db, user_id)
+        set_request_priority(classify_tier(user.credits if user else None), f"user:{user_id}")
+        return
+    client = request.client.host if request.client else "unknown"
+    set_request_priority("anonymous", f"ip:{client}")
+
+
+class UpstreamBusyError(HTTPException):
+    """업스트림 동시 호출 수가 한도에 도달하여 요청을 받을 수 없는 경우 (429)"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail=f"{upstream} 요청이 많아 지금은 처리할 수 없습니다. 잠시 후 다시 시도하세요.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        self.upstream = upstream
+
+
+@dataclass(order=True)
+class _Waiter:
+    finish: float
+    sequence: int
+    tier: str = field(compare=False)
+    flow: str = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    # 흐름의 가상 종료 시간에 더한 값 (취소되면 되돌림)
+    cost: float = field(default=0.0, compare=False)
+    granted: bool = field(default=False, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+    # 이벤트 루프에서 기다리는 경우 자리를 얻으면 완료되는 future
+    future: Optional[asyncio.Future] = field(default=None, compare=False)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _BlockingWaiters:
+    """스레드를 붙잡고 기다리는 호출 수를 모든 게이트에 걸쳐 제한합니다."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.count >= self.limit:
+                return False
+            self.count += 1
+            return True
+
+    def give_back(self):
+        with self._lock:
+            self.count -= 1
+
+
+_blocking_waiters = _BlockingWaiters(UPSTREAM_MAX_BLOCKING_WAITERS)
+
+
+class ConcurrencyGate:
+    """
+    업스트림 동시 호출 수를 제한하는 우선순위 게이트
+
+    요청 처리 경로는 이벤트 루프에서 기다린 뒤(acquire_async) 스레드 풀로 들어가므로 대기 중인 요청이
+    스레드를 차지하지 않습니다. 스레드에서 직접 호출하는 경우(acquire)는 UPSTREAM_MAX_BLOCKING_WAITERS로 제한합니다.
+
+    한도를 넘은 호출은 대기열에서 기다리며, 자리가 나면 가중 공정 큐(WFQ) 방식으로
+    다음 호출을 고릅니다. 흐름(사용자)마다 가상 종료 시간 = max(가상 시간, 흐름의 이전 종료 시간) + 1/가중치
+    를 부여하고 가장 작은 호출부터 처리하므로, 같은 등급 안에서는 사용자 간에 공평하고
+    등급 간에는 가중치 비율로 처리량이 나뉩니다.
+
+    PRIORITY_MAX_WAIT_SECONDS 이상 기다린 호출은 먼저 처리하여 낮은 등급이 굶지 않게 하고,
+    대기열이 가득 찼거나 timeout초를 넘기면 UpstreamBusyError를 발생시켜 빠르게 429로 응답합니다.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float,
+                 weights: Optional[Dict[str, float]] = None, max_wait: float = PRIORITY_MAX_WAIT_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.weights = weights or _parse_weights(PRIORITY_WEIGHTS)
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self._heap: List[_Waiter] = []
+        self._arrivals: Deque[_Waiter] = deque()
+        self._virtual_time = 0.0
+        self._flow_finish: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._waiting_by_tier: Dict[str, int] = {}
+        # 호출 처리 시간의 지수 이동 평균 (Retry-After 추정용)
+        self._average_duration = 1.0
+        self._cond = threading.Condition()
+
+    def retry_after(self) -> float:
+        return (self.waiting + 1) / max(self.limit, 1) * self._average_duration
+
+    def _reject(self, tier: str, reason: str):
+        UPSTREAM_REJECTED.labels(self.name, tier, reason).inc()
+        raise UpstreamBusyError(self.name, self.retry_after())
+
+    def _set_waiting(self, tier: str, delta: int):
+        self.waiting += delta
+        self._waiting_by_tier[tier] = self._waiting_by_tier.get(tier, 0) + delta
+        UPSTREAM_QUEUE_DEPTH.labels(self.name, tier).set(self._waiting_by_tier[tier])
+
+    def _enqueue(self, tier: str, flow: str, future: Optional[asyncio.Future] = None) -> _Waiter:
+        flow_key = f"{tier}:{flow}"
+        start = max(self._virtual_time, self._flow_finish.get(flow_key, 0.0))
+        cost = 1.0 / self.weights.get(tier, 1.0)
+        waiter = _Waiter(
+            finish=start + cost,
+            sequence=next(self._sequence),
+            tier=tier, flow=flow_key, enqueued_at=time.monotonic(), cost=cost, future=future
+        )
+        self._flow_finish[flow_key] = waiter.finish
+        heapq.heappush(self._heap, waiter)
+        self._arrivals.append(waiter)
+        self._set_waiting(tier, 1)
+        return waiter
+
+    def _cancel(self, waiter: _Waiter):
+        """
+        대기를 포기한 호출을 대기열에서 빼고, 흐름의 가상 종료 시간에 더했던 값을 되돌립니다.
+        되돌리지 않으면 처리되지도 않은 호출 때문에 그 흐름의 다음 호출이 뒤로 밀립니다.
+        """
+        waiter.cancelled = True
+        finish = self._flow_finish.get(waiter.flow)
+        if finish is not None:
+            self._flow_finish[waiter.flow] = max(self._virtual_time, finish - waiter.cost)
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        # 취소되었거나 이미 처리된 항목 정리
+        while self._arrivals and (self._arrivals[0].granted or self._arrivals[0].cancelled):
+            self._arrivals.popleft()
+        while self._heap and (self._heap[0].granted or self._heap[0].cancelled):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+
+        # 기아 방지: 너무 오래 기다린 호출을 먼저 처리
+        oldest = self._arrivals[0]
+        if oldest is not self._heap[0] and time.monotonic() - oldest.enqueued_at >= self.max_wait:
+            UPSTREAM_STARVATION_PROMOTIONS.labels(self.name, oldest.tier).inc()
+            return oldest
+        return heapq.heappop(self._heap)
+
+    def _dispatch(self):
+        granted = False
+        while self.active < self.limit:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            waiter.granted = True
+            self._virtual_time = max(self._virtual_time, waiter.finish)
+            self.active += 1
+            granted = True
+            if waiter.future is not None:
+                waiter.future.get_loop().call_soon_threadsafe(_wake, waiter.future)
+        if granted:
+            UPSTREAM_ACTIVE.labels(self.name).set(self.active)
+            self._cond.notify_all()
+        # 오래된 흐름 정보 정리
+        if len(self._flow_finish) > 10000:
+            self._flow_finish = {k: v for k, v in self._flow_finish.items() if v > self._virtual_time}
+
+    def _admit(self, tier: str, flow: str, future: Optional[asyncio.Future] = None) -> Optional[_Waiter]:
+        """자리가 있으면 바로 차지하고 None을, 없으면 대기열 항목을 반환합니다 (잠금을 잡은 상태에서 호출)."""
+        if self.active < self.limit and self.waiting == 0:
+            self.active += 1
+            UPSTREAM_ACTIVE.labels(self.name).set(self.active)
+            return None
+        if self.waiting >= self.max_queue:
+            self._reject(tier, "queue_full")
+        waiter = self._enqueue(tier, flow, future)
+        # 자리를 받았지만 아직 깨어나지 않은 대기자 때문에 waiting > 0이어도 빈자리가 있을 수 있음
+        self._dispatch()
+        return waiter
+
+    def acquire(self, tier: str = "anonymous", flow: str = ""):
+        """스레드에서 자리가 날 때까지 기다립니다."""
+        start_time = time.monotonic()
+        with self._cond:
+            if self.active < self.limit and self.waiting == 0:
+                self._admit(tier, flow)
+                UPSTREAM_QUEUE_WAIT.labels(self.name, tier).observe(0.0)
+                return
+            if not _blocking_waiters.take():
+                self._reject(tier, "threads_busy")
+            try:
+                waiter = self._admit(tier, flow)
+                deadline = start_time + self.timeout
+                try:
+                    while not waiter.granted:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._cancel(waiter)
+                            self._reject(tier, "timeout")
+                        self._cond.wait(remaining)
+                finally:
+                    self._set_waiting(tier, -1)
+            finally:
+                _blocking_waiters.give_back()
+        UPSTREAM_QUEUE_WAIT.labels(self.name, tier).observe(time.monotonic() - start_time)
+
+    async def acquire_async(self, tier: str = "anonymous", flow: str = ""):
+        """이벤트 루프에서 자리가 날 때까지 기다립니다 (스레드를 차지하지 않음)."""
+        start_time = time.monotonic()
+        with self._cond:
+            waiter = self._admit(tier, flow, asyncio.get_running_loop().create_future())
+        if waiter is None:
+            UPSTREAM_QUEUE_WAIT.labels(self.name, tier).observe(0.0)
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._cond:
+                if not waiter.granted:
+                    self._cancel(waiter)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._reject(tier, "timeout")
+                    raise
+                if isinstance(e, asyncio.CancelledError):
+                    # 취소된 순간 자리를 받았으면 다음 대기자에게 넘김
+                    self.active -= 1
+                    UPSTREAM_ACTIVE.labels(self.name).set(self.active)
+                    self._dispatch()
+                    raise
+                # 시간 초과와 동시에 자리를 받은 경우는 그대로 사용
+        finally:
+            with self._cond:
+                self._set_waiting(tier, -1)
+        UPSTREAM_QUEUE_WAIT.labels(self.name, tier).observe(time.monotonic() - start_time)
+
+    def release(self, duration: float):
+        with self._cond:
+            self.active -= 1
+            self._average_duration = 0.8 * self._average_duration + 0.2 * duration
+            UPSTREAM_ACTIVE.labels(self.name).set(self.active)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, tier: str = "anonymous", flow: str = ""):
+        with stage_timer(f"{self.name}_queue"):
+            self.acquire(tier, flow)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start_time)
+
+    @asynccontextmanager
+    async def slot_async(self, tier: str = "anonymous", flow: str = ""):
+        with stage_timer(f"{self.name}_queue"):
+            await self.acquire_async(tier, flow)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start_time)
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, setting = item.split("=", 1)
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+def _parse_weights(value: str) -> Dict[str, float]:
+    return {tier: float(weight) for tier, weight in _parse_pairs(value).items()}
+
+
+gates: Dict[str, ConcurrencyGate] = {
+    name: ConcurrencyGate(name, int(limit), UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT)
+    for name, limit in _parse_pairs(UPSTREAM_CONCURRENCY).items() if int(limit) > 0
+}
+
+
+# 현재 컨텍스트가 이미 자리를 잡은 업스트림
+# upstream_slot_async 안에서 run_in_threadpool로 호출한 함수는 컨텍스트를 물려받으므로 upstream_slot이 다시 기다리지 않음
+_held_slots: ContextVar[frozenset] = ContextVar("upstream_held_slots", default=frozenset())
+
+
+@contextmanager
+def upstream_slot(upstream: str):
+    """
+    업스트림 호출 전후로 감싸서 동시 호출 수를 제한합니다.
+    현재 요청의 우선순위(request_priority_var)에 따라 대기 순서가 정해집니다.
+    이벤트 루프에서 이미 upstream_slot_async로 자리를 잡았으면 그대로 진행합니다.
+
+    사용 예:
+        with upstream_slot("remove_bg"):
+            response = requests.post(...)
+    """
+    gate = gates.get(upstream)
+    if gate is None or upstream in _held_slots.get():
+        yield
+        return
+    tier, flow = request_priority_var.get()
+    with gate.slot(tier, flow):
+        yield
+
+
+@asynccontextmanager
+async def upstream_slot_async(upstream: str):
+    """
+    이벤트 루프에서 자리를 기다린 뒤 스레드 풀에서 업스트림을 호출할 때 사용합니다.
+    대기하는 동안 스레드를 차지하지 않습니다.
+
+    사용 예:
+        async with upstream_slot_async("remove_bg"):
+            response = await run_in_threadpool(call_remove_bg, ...)
+    """
+    gate = gates.get(upstream)
+    if gate is None or upstream in _held_slots.get():
+        yield
+        return
+    tier, flow = request_priority_var.get()
+    async with gate.slot_async(tier, flow):
+        token = _held_slots.set(_held_slots.get() | {upstream})
+        try:
+            yield
+        finally:
+            _held_slots.reset(token)
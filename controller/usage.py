@@ -0,0 +1,395 @@
+# controller/usage.py
+import os
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from model.database import (
+    SessionLocal, engine, get_read_db, Image, UserImage, UsageRollup, UsageRollupState, PROCESSING_TIME_BUCKETS
+)
+from controller.admin_auth import is_admin_token, require_admin
+from controller.auth import authenticated_user_id
+from controller.metrics import stage_timer
+from controller.locks import singleton_lock
+
+# 로깅 설정
+logger = logging.getLogger("usage")
+
+load_dotenv()
+
+# 사용량 집계 방식
+# - inline: images 기록과 같은 트랜잭션에서 집계 행을 갱신
+# - job: USAGE_ROLLUP_INTERVAL_SECONDS마다 마지막으로 반영한 image_id 이후의 행만 집계
+# - off: 집계하지 않음 (/api/admin/usage/rebuild로만 갱신)
+# 방식을 바꾼 뒤에는 /api/admin/usage/rebuild를 한 번 실행해야 중복/누락이 없습니다.
+USAGE_ROLLUP_MODE = os.getenv("USAGE_ROLLUP_MODE", "inline").lower()
+USAGE_ROLLUP_INTERVAL_SECONDS = float(os.getenv("USAGE_ROLLUP_INTERVAL_SECONDS", "60"))
+USAGE_ROLLUP_BATCH_SIZE = int(os.getenv("USAGE_ROLLUP_BATCH_SIZE", "5000"))
+# 아직 커밋되지 않은 트랜잭션이 앞선 image_id를 가지고 있을 수 있으므로 최근 행은 다음 실행으로 미룸
+USAGE_ROLLUP_LAG_SECONDS = float(os.getenv("USAGE_ROLLUP_LAG_SECONDS", "30"))
+# /api/usage에서 조회할 수 있는 최대 기간 (일)
+USAGE_MAX_DAYS = 366
+
+ANONYMOUS_USER_ID = 0
+STATE_NAME = "images"
+BUCKET_COLUMNS = [f"bucket_{i}" for i in range(len(PROCESSING_TIME_BUCKETS) + 1)]
+SUM_COLUMNS = ["image_count", "credits_used", "processing_time_sum", *BUCKET_COLUMNS]
+
+router = APIRouter(prefix="/api/usage", tags=["사용량"])
+admin_router = APIRouter(prefix="/api/admin/usage", tags=["사용량"], dependencies=[Depends(require_admin)])
+
+# 집계 행 증가 (키가 없으면 생성). PostgreSQL과 SQLite 모두 ON CONFLICT를 지원
+_UPSERT = text(f"""
+    INSERT INTO usage_rollups (user_id, day, model_version, processing_time_max, {", ".join(SUM_COLUMNS)})
+    VALUES (:user_id, :day, :model_version, :processing_time_max, {", ".join(f":{column}" for column in SUM_COLUMNS)})
+    ON CONFLICT (user_id, day, model_version) DO UPDATE SET
+        {", ".join(f"{column} = usage_rollups.{column} + excluded.{column}" for column in SUM_COLUMNS)},
+        processing_time_max = CASE
+            WHEN excluded.processing_time_max > usage_rollups.processing_time_max THEN excluded.processing_time_max
+            ELSE usage_rollups.processing_time_max
+        END
+""")
+
+
+def _bucket_cases() -> str:
+    cases = []
+    lower = None
+    for index, column in enumerate(BUCKET_COLUMNS):
+        conditions = ["i.processing_time IS NOT NULL"]
+        if lower is not None:
+            conditions.append(f"i.processing_time > {lower}")
+        if index < len(PROCESSING_TIME_BUCKETS):
+            conditions.append(f"i.processing_time <= {PROCESSING_TIME_BUCKETS[index]}")
+            lower = PROCESSING_TIME_BUCKETS[index]
+        cases.append(f"SUM(CASE WHEN {' AND '.join(conditions)} THEN 1 ELSE 0 END)")
+    return ", ".join(cases)
+
+
+# images 전체에서 집계 테이블을 다시 만듦 (SQL 한 번으로 처리)
+_REBUILD = text(f"""
+    INSERT INTO usage_rollups (user_id, day, model_version, processing_time_max, {", ".join(SUM_COLUMNS)})
+    SELECT
+        COALESCE(i.user_id, {ANONYMOUS_USER_ID}),
+        DATE(i.created_at),
+        COALESCE(SUBSTR(i.model_version, 1, 64), 'unknown'),
+        COALESCE(MAX(i.processing_time), 0),
+        COUNT(*),
+        COALESCE(SUM(c.credits), 0),
+        COALESCE(SUM(i.processing_time), 0),
+        {_bucket_cases()}
+    FROM images i
+    LEFT JOIN (SELECT image_id, SUM(credits_used) AS credits FROM user_images GROUP BY image_id) c
+        ON c.image_id = i.image_id
+    GROUP BY 1, 2, 3
+""")
+
+
+def _rollup_key(user_id: Optional[int], created_at: Optional[datetime], model_version: Optional[str]) -> Tuple:
+    day = (created_at or datetime.utcnow()).date()
+    return (user_id or ANONYMOUS_USER_ID, day, (model_version or "unknown")[:64])
+
+
+def _empty_delta() -> Dict[str, float]:
+    delta = {column: 0 for column in SUM_COLUMNS}
+    delta["processing_time_max"] = 0.0
+    return delta
+
+
+def _add(delta: Dict[str, float], credits_used: int, processing_time: Optional[float]):
+    delta["image_count"] += 1
+    delta["credits_used"] += credits_used or 0
+    if processing_time is not None:
+        delta["processing_time_sum"] += processing_time
+        delta["processing_time_max"] = max(delta["processing_time_max"], processing_time)
+        delta[BUCKET_COLUMNS[bisect_left(PROCESSING_TIME_BUCKETS, processing_time)]] += 1
+
+
+def apply_deltas(db: Session, deltas: Dict[Tuple, Dict[str, float]]):
+    """키별 증가분을 집계 테이블에 반영합니다 (커밋은 호출한 쪽에서)."""
+    params = [
+        {"user_id": user_id, "day": day, "model_version": model_version, **delta}
+        for (user_id, day, model_version), delta in deltas.items()
+    ]
+    if params:
+        db.execute(_UPSERT, params)
+
+
+def record_usage(db: Session, image: Image, credits_used: int):
+    """
+    새로 기록한 이미지를 집계에 반영합니다 (USAGE_ROLLUP_MODE=inline일 때만).
+    image를 flush한 뒤, 커밋하기 전에 호출하면 images 기록과 같은 트랜잭션에서 갱신됩니다.
+    """
+    if USAGE_ROLLUP_MODE != "inline":
+        return
+    delta = _empty_delta()
+    _add(delta, credits_used, image.processing_time)
+    apply_deltas(db, {_rollup_key(image.user_id, image.created_at, image.model_version): delta})
+
+
+def _pending_images(db: Session, after_id: int, limit: int):
+    credits = (
+        select(UserImage.image_id, func.sum(UserImage.credits_used).label("credits"))
+        .group_by(UserImage.image_id)
+        .subquery()
+    )
+    return db.execute(
+        select(
+            Image.image_id, Image.user_id, Image.model_version, Image.processing_time, Image.created_at,
+            func.coalesce(credits.c.credits, 0)
+        )
+        .outerjoin(credits, credits.c.image_id == Image.image_id)
+        .where(Image.image_id > after_id)
+        .order_by(Image.image_id)
+        .limit(limit)
+    ).all()
+
+
+def _run_rollup_batch(db: Session, cutoff: datetime) -> int:
+    """마지막으로 반영한 image_id 이후 한 배치를 집계합니다. 반영한 행 수를 반환합니다."""
+    state = db.get(UsageRollupState, STATE_NAME, with_for_update=True)
+    if state is None:
+        state = UsageRollupState(name=STATE_NAME, last_image_id=0)
+        db.add(state)
+
+    deltas = defaultdict(_empty_delta)
+    processed = 0
+    for image_id, user_id, model_version, processing_time, created_at, credits_used in _pending_images(
+        db, state.last_image_id, USAGE_ROLLUP_BATCH_SIZE
+    ):
+        if created_at and created_at > cutoff:
+            break
+        _add(deltas[_rollup_key(user_id, created_at, model_version)], credits_used, processing_time)
+        state.last_image_id = image_id
+        processed += 1
+
+    # 집계 행과 워터마크를 같은 트랜잭션에서 갱신하므로 같은 이미지를 두 번 반영하지 않음
+    apply_deltas(db, deltas)
+    db.commit()
+    return processed
+
+
+_run_lock = threading.Lock()
+
+
+def run_rollup() -> dict:
+    """
+    아직 반영하지 않은 images 행을 집계합니다 (USAGE_ROLLUP_MODE=job).
+    여러 워커가 같은 주기로 실행해도 한 곳에서만 실제로 처리합니다.
+    """
+    if not _run_lock.acquire(blocking=False):
+        return {"status": "busy", "message": "사용량 집계 작업이 이미 실행 중입니다."}
+    try:
+        with singleton_lock("usage_rollup") as acquired:
+            if not acquired:
+                return {"status": "busy", "message": "다른 워커에서 사용량 집계 작업이 실행 중입니다."}
+            start_time = time.perf_counter()
+            cutoff = datetime.utcnow() - timedelta(seconds=USAGE_ROLLUP_LAG_SECONDS)
+            processed = 0
+            db = SessionLocal()
+            try:
+                with stage_timer("usage_rollup"):
+                    while True:
+                        count = _run_rollup_batch(db, cutoff)
+                        processed += count
+                        if count < USAGE_ROLLUP_BATCH_SIZE:
+                            break
+                last_image_id = db.get(UsageRollupState, STATE_NAME).last_image_id
+            finally:
+                db.close()
+            logger.info("사용량 집계 완료", extra={"processed": processed, "last_image_id": last_image_id})
+            return {
+                "status": "success",
+                "processed": processed,
+                "last_image_id": last_image_id,
+                "elapsed": round(time.perf_counter() - start_time, 3),
+            }
+    finally:
+        _run_lock.release()
+
+
+def rebuild_rollups() -> dict:
+    """
+    images/user_images 전체에서 집계 테이블을 다시 만들고 워터마크를 마지막 image_id로 맞춥니다.
+    집계 방식을 바꿨거나 집계가 어긋났을 때 사용합니다.
+    """
+    start_time = time.perf_counter()
+    db = SessionLocal()
+    try:
+        with stage_timer("usage_rebuild"):
+            if engine.dialect.name == "postgresql":
+                # 다시 만드는 동안 inline 갱신을 막아 스냅숏 밖의 증가분이 지워지지 않도록 함
+                db.execute(text("LOCK TABLE usage_rollups IN EXCLUSIVE MODE"))
+            db.execute(text("DELETE FROM usage_rollups"))
+            db.execute(_REBUILD)
+            last_image_id = db.execute(select(func.coalesce(func.max(Image.image_id), 0))).scalar()
+            state = db.get(UsageRollupState, STATE_NAME, with_for_update=True)
+            if state is None:
+                db.add(UsageRollupState(name=STATE_NAME, last_image_id=last_image_id))
+            else:
+                state.last_image_id = last_image_id
+            rows = db.execute(select(func.count()).select_from(UsageRollup)).scalar()
+            db.commit()
+    finally:
+        db.close()
+    logger.info("사용량 집계 재생성 완료", extra={"rows": rows, "last_image_id": last_image_id})
+    return {
+        "status": "success",
+        "rollup_rows": rows,
+        "last_image_id": last_image_id,
+        "elapsed": round(time.perf_counter() - start_time, 3),
+    }
+
+
+def estimate_percentile(buckets: List[int], q: float, max_value: float) -> Optional[float]:
+    """히스토그램 버킷 안에서 선형 보간으로 백분위수를 추정합니다."""
+    total = sum(buckets)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        if count and seen + count >= target:
+            lower = PROCESSING_TIME_BUCKETS[index - 1] if index else 0.0
+            upper = PROCESSING_TIME_BUCKETS[index] if index < len(PROCESSING_TIME_BUCKETS) else max_value
+            upper = max(lower, min(upper, max_value))
+            return round(lower + (upper - lower) * (target - seen) / count, 3)
+        seen += count
+    return round(max_value, 3)
+
+
+def _summary(rows: Iterable[UsageRollup]) -> dict:
+    totals = {column: 0 for column in SUM_COLUMNS}
+    processing_time_max = 0.0
+    for row in rows:
+        for column in SUM_COLUMNS:
+            totals[column] += getattr(row, column)
+        processing_time_max = max(processing_time_max, row.processing_time_max)
+    buckets = [totals[column] for column in BUCKET_COLUMNS]
+    timed = sum(buckets)
+    return {
+        "image_count": totals["image_count"],
+        "credits_used": totals["credits_used"],
+        "processing_time": {
+            "avg": round(totals["processing_time_sum"] / timed, 3) if timed else None,
+            "p50": estimate_percentile(buckets, 0.5, processing_time_max),
+            "p95": estimate_percentile(buckets, 0.95, processing_time_max),
+            "p99": estimate_percentile(buckets, 0.99, processing_time_max),
+            "max": round(processing_time_max, 3) if timed else None,
+        },
+    }
+
+
+def _date_range(days: int) -> Tuple:
+    if days < 1 or days > USAGE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days는 1 이상 {USAGE_MAX_DAYS} 이하여야 합니다.")
+    end = datetime.utcnow().date()
+    return end - timedelta(days=days - 1), end
+
+
+def require_usage_reader(request: Request, user_id: int, x_admin_token: Optional[str] = Header(None)):
+    """
+    본인 또는 관리자만 사용량을 조회할 수 있도록 하는 의존성
+
+    X-Admin-Token이 맞으면 모든 사용자를 조회할 수 있고, 아니면 Bearer 토큰의 사용자가
+    경로의 user_id와 같아야 합니다 (토큰이 없으면 401, 다르면 403).
+    """
+    if is_admin_token(x_admin_token):
+        return
+    authenticated_user_id(request, user_id)
+
+
+@router.get("/{user_id}", dependencies=[Depends(require_usage_reader)])
+def get_usage(user_id: int, days: int = 30, db: Session = Depends(get_read_db)):
+    """
+    사용자의 일별/모델별 사용량 (이미지 수, 사용 크레딧, 처리 시간 평균/백분위수)
+
+    images를 스캔하지 않고 usage_rollups의 (user_id, day) 범위만 읽으므로
+    누적 이미지 수와 관계없이 조회 기간에 비례하는 시간에 응답합니다.
+    백분위수는 히스토그램에서 추정한 값입니다.
+    """
+    start, end = _date_range(days)
+    rows = db.query(UsageRollup).filter(
+        UsageRollup.user_id == user_id, UsageRollup.day >= start, UsageRollup.day <= end
+    ).order_by(UsageRollup.day, UsageRollup.model_version).all()
+
+    by_model = defaultdict(list)
+    for row in rows:
+        by_model[row.model_version].append(row)
+    return {
+        "user_id": user_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "mode": USAGE_ROLLUP_MODE,
+        "total": _summary(rows),
+        "by_model": {model_version: _summary(model_rows) for model_version, model_rows in by_model.items()},
+        "daily": [
+            {"day": row.day.isoformat(), "model_version": row.model_version, **_summary([row])}
+            for row in rows
+        ],
+    }
+
+
+@admin_router.get("/models")
+def get_model_usage(days: int = 30, db: Session = Depends(get_read_db)):
+    """전체 사용자의 모델별 사용량 (집계 테이블 기준)"""
+    start, end = _date_range(days)
+    rows = db.query(UsageRollup).filter(UsageRollup.day >= start, UsageRollup.day <= end).all()
+    by_model = defaultdict(list)
+    for row in rows:
+        by_model[row.model_version].append(row)
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "models": {model_version: _summary(model_rows) for model_version, model_rows in by_model.items()},
+    }
+
+
+@admin_router.post("/run")
+async def usage_run():
+    """반영하지 않은 images 행을 즉시 집계합니다."""
+    return await run_in_threadpool(run_rollup)
+
+
+@admin_router.post("/rebuild")
+async def usage_rebuild():
+    """집계 테이블을 images/user_images 전체에서 다시 만듭니다."""
+    return await run_in_threadpool(rebuild_rollups)
+
+
+_scheduler_task: Optional[asyncio.Task] = None
+
+
+async def _rollup_loop():
+    while True:
+        await asyncio.sleep(USAGE_ROLLUP_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(run_rollup)
+        except Exception:
+            logger.exception("사용량 집계 작업 실패")
+
+
+def start_scheduler():
+    """USAGE_ROLLUP_MODE=job이면 주기 집계 작업을 시작합니다."""
+    global _scheduler_task
+    if USAGE_ROLLUP_MODE == "job" and _scheduler_task is None:
+        _scheduler_task = asyncio.create_task(_rollup_loop())
+
+
+async def stop_scheduler():
+    global _scheduler_task
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+        _scheduler_task = None
@@ -0,0 +1,48 @@
+# controller/uvicorn_worker.py
+"""
+종료 신호를 받으면 연결을 닫기 전에 먼저 상태 확인을 503으로 바꾸는 uvicorn 서버/워커
+
+uvicorn은 SIGTERM을 받으면 바로 리스너를 닫고 연결이 끝나기를 기다린 뒤에야 lifespan 종료
+단계를 실행합니다. 그래서 lifespan에서 바꾼 /api/health 응답은 로드밸런서가 볼 수 없습니다.
+여기서는 신호를 받는 즉시 종료 준비 상태로 바꾸고, DRAIN_PRESTOP_SECONDS 동안 요청을 계속
+받은 다음 uvicorn의 원래 종료 절차를 시작합니다.
+
+gunicorn.conf.py의 worker_class로 사용합니다.
+"""
+import asyncio
+import logging
+import signal
+import sys
+from types import FrameType
+from typing import Optional
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn.workers import UvicornWorker
+from controller import lifecycle
+
+# 로깅 설정
+logger = logging.getLogger("lifecycle")
+
+
+class DrainingServer(Server):
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        # 두 번째 신호나 대기 시간이 0이면 바로 원래 종료 절차로 넘어감
+        if lifecycle.is_draining() or lifecycle.DRAIN_PRESTOP_SECONDS <= 0:
+            super().handle_exit(sig, frame)
+            return
+        lifecycle.begin_drain()
+        logger.info("종료 신호 수신: 로드밸런서 제외 대기", extra={
+            "signal": signal.Signals(sig).name, "prestop_seconds": lifecycle.DRAIN_PRESTOP_SECONDS
+        })
+        asyncio.get_event_loop().call_later(lifecycle.DRAIN_PRESTOP_SECONDS, super().handle_exit, sig, frame)
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    async def _serve(self) -> None:
+        # UvicornWorker._serve와 같되 Server 대신 DrainingServer를 사용
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
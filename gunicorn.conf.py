@@ -0,0 +1,48 @@
+# gunicorn.conf.py
+"""
+여러 워커 프로세스로 API 서버를 실행하기 위한 gunicorn 설정
+
+실행 예:
+    gunicorn main:app -c gunicorn.conf.py
+    WEB_CONCURRENCY=4 BIND=0.0.0.0:8000 gunicorn main:app -c gunicorn.conf.py
+
+워커 간 공유 상태는 README의 "다중 워커 배포" 항목을 참고하세요.
+"""
+import os
+import multiprocessing
+
+# 워커 설정 (기본값: CPU 코어 수, 최대 8)
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 8))))
+# 종료 신호를 받으면 리스너를 닫기 전에 DRAIN_PRESTOP_SECONDS 동안 /api/health를 503으로 응답하는 워커
+worker_class = "controller.uvicorn_worker.DrainingUvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# SIGTERM을 받은 워커가 로드밸런서에서 빠지고 처리 중인 요청과 백그라운드 작업을 마칠 때까지 기다리는 시간
+# (lifecycle.DRAIN_PRESTOP_SECONDS + DRAIN_TIMEOUT_SECONDS보다 길게 설정)
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "50"))
+# 응답이 없는 워커를 재시작하기까지의 시간 (BRIA 생성이 오래 걸리므로 넉넉하게)
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# 메모리 누수 대비: 일정 요청 수마다 워커를 교체 (워커들이 동시에 재시작되지 않도록 지터 적용)
+max_requests = int(os.getenv("MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "200"))
+
+accesslog = os.getenv("ACCESS_LOG", None)
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def on_starting(server):
+    # API 키 임시 파일은 마스터 프로세스에서 한 번만 초기화
+    # (워커가 재시작될 때 /api/keys로 설정한 키가 환경변수 값으로 되돌아가지 않도록 함)
+    # (환경변수를 먼저 설정하여 모듈을 불러올 때와 워커에서는 다시 초기화하지 않음)
+    # JWT 서명 키가 없으면 하나를 만들어 모든 워커가 같은 키로 토큰을 검증하도록 함
+    if not os.getenv("JWT_SECRET_KEY"):
+        import secrets
+        os.environ["JWT_SECRET_KEY"] = secrets.token_urlsafe(32)
+    
+    already_initialized = os.getenv("API_KEYS_INITIALIZED") == "1"
+    os.environ["API_KEYS_INITIALIZED"] = "1"
+    if not already_initialized:
+        from controller.api_keys import initialize_temp_keys
+        initialize_temp_keys()
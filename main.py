@@ -1,11 +1,49 @@
+from controller.logging_config import setup_logging, shutdown_logging, RequestIdMiddleware
+
+# 구조화 로깅 설정 (다른 모듈이 로그를 남기기 전에 가장 먼저 실행)
+setup_logging()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse
 import os
-from controller import background_removal, background_bg, background_bria, background_replace, api_keys
+from controller import background_removal, background_bg, background_bria, background_replace, api_keys, metrics, tracing, retention, admin_export, usage, auth, profiling, perceptual_hash
 from model.database import create_tables
+from controller.storage_paths import ShardedStaticFiles
+from controller.rate_limit import RateLimitMiddleware
+from controller import lifecycle
+from controller.compression import CompressionMiddleware
+
+# 트레이싱 설정 (TRACING_EXPORTER 환경 변수)
+tracing.setup_tracing()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 오래된 업로드/결과 파일 정리 작업 시작
+    retention.start_scheduler()
+    # USAGE_ROLLUP_MODE=job이면 사용량 주기 집계 시작
+    usage.start_scheduler()
+    # LOOP_MONITOR_ENABLED=true이면 이벤트 루프 막힘 감시 시작
+    profiling.start_loop_monitor()
+    # 중복 이미지 인덱스를 미리 적재 (첫 업로드 요청이 전체 적재를 기다리지 않도록 백그라운드 스레드에서 실행)
+    lifecycle.submit_background(perceptual_hash.warm_index)
+    yield
+    # 처리 중인 요청과 백그라운드 작업이 끝날 때까지 대기 (DRAIN_TIMEOUT_SECONDS)
+    await lifecycle.drain()
+    await retention.stop_scheduler()
+    await usage.stop_scheduler()
+    await admin_export.shutdown()
+    await profiling.stop_loop_monitor()
+    # 남은 span을 exporter로 내보냄
+    tracing.shutdown_tracing()
+    # 큐에 남은 로그 출력
+    shutdown_logging()
 
-app = FastAPI()
+
+# orjson으로 응답 직렬화 (표준 json 인코더보다 빠름)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # BRIA 배경 교체 API 라우터 등록
 app.include_router(background_bria.router, prefix="/api")
@@ -13,6 +51,12 @@ app.include_router(background_bria.router, prefix="/api")
 # 배경 제거 및 생성 API 라우터 등록
 app.include_router(background_replace.router, prefix="/api")
 
+# X-Profile: 1 헤더가 붙은 관리자 요청만 cProfile로 기록 (미들웨어 비용이 포함되지 않도록 가장 안쪽에 등록)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# 사용자/라우트별 요청 제한 (429 응답에도 CORS 헤더가 붙도록 CORS보다 먼저 등록)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS 미들웨어 설정 업데이트
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +67,24 @@ app.add_middleware(
     expose_headers=["*"],  # 모든 응답 헤더 노출
 )
 
+# JSON 응답 압축 (brotli 또는 gzip, COMPRESSION_MIN_SIZE 이상만)
+app.add_middleware(CompressionMiddleware)
+
+# 라우트별 처리 시간 및 처리 중인 요청 수 측정
+app.add_middleware(metrics.MetricsMiddleware)
+
+# 요청별 루트 span 생성
+app.add_middleware(tracing.TracingMiddleware)
+
+# 처리 중인 요청 수 집계 (종료 시 대기용)
+app.add_middleware(lifecycle.InFlightMiddleware)
+
+# 요청 ID 할당 (가장 바깥쪽에서 실행되도록 마지막에 등록)
+app.add_middleware(RequestIdMiddleware)
+
+# Prometheus 지표 수집 엔드포인트
+app.include_router(metrics.router)
+
 # 데이터베이스 테이블 생성
 create_tables()
 
@@ -36,8 +98,8 @@ RESULT_BG_DIR = os.path.join(os.getcwd(), "uploads", "bg_results")
 if not os.path.exists(RESULT_BG_DIR):
     os.makedirs(RESULT_BG_DIR)
 
-# 정적 파일 서빙 설정
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# 정적 파일 서빙 설정 (샤딩 이전 평면 URL도 지원)
+app.mount("/uploads", ShardedStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # API 키 관리 라우터 등록
 app.include_router(api_keys.router)
@@ -47,8 +109,23 @@ app.include_router(background_bg.router)
 
 app.include_router(background_removal.router)
 
-from fastapi import APIRouter
+# 파일 보존 정책 관리 라우터 등록
+app.include_router(retention.router)
 
+# 인증(토큰 발급) 라우터 등록
+app.include_router(auth.router)
+
+# 사용량 집계 조회 라우터 등록
+app.include_router(usage.router)
+app.include_router(usage.admin_router)
+
+# 관리자/리포트 데이터 내보내기 라우터 등록
+app.include_router(admin_export.router)
+
+# 프로파일링 라우터 등록
+app.include_router(profiling.router)
+
+from fastapi import APIRouter
 
 @app.get("/")
 def read_root():
@@ -56,5 +133,7 @@ def read_root():
 
 @app.get("/api/health")
 def health_check():
-    """서버 상태 확인 엔드포인트"""
+    """서버 상태 확인 엔드포인트 (종료 준비 중에는 503을 반환하여 로드밸런서가 새 요청을 보내지 않게 함)"""
+    if lifecycle.is_draining():
+        return ORJSONResponse(status_code=503, content={"status": "draining", "message": "서버가 종료 준비 중입니다."})
     return {"status": "ok", "message": "서버가 정상적으로 동작 중입니다."}
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# migrate_storage.py
+"""
+평면 디렉토리(uploads/, uploads/results 등)에 저장된 기존 파일을
+샤딩 경로(예: uploads/results/ab/cd/{file_id}_nobg.png)로 옮기는 마이그레이션 도구
+
+서버를 멈추지 않고 실행할 수 있습니다.
+- 파일은 같은 파일 시스템 안에서 os.replace로 원자적으로 이동
+- 이동한 파일을 가리키는 images 행의 경로/URL을 배치 단위로 갱신
+  (인덱스가 있는 file_key 컬럼으로 후보 행을 찾고, 바뀐 행을 기본 키로 한 번에 갱신)
+- 이동 중에도 controller.storage_paths.resolve_path와 ShardedStaticFiles가
+  평면 경로와 샤딩 경로를 모두 확인하므로 기존 URL이 계속 동작
+
+실행 예:
+    python migrate_storage.py --dry-run
+    python migrate_storage.py --batch-size 500 --sleep 0.2
+    python migrate_storage.py --categories results edges
+"""
+import os
+import time
+import logging
+import argparse
+from typing import List, Tuple
+from sqlalchemy import or_, select, update
+from model.database import SessionLocal, Image, backfill_image_file_keys
+from controller.storage_paths import CATEGORY_DIRS, category_dir, file_key, sharded_path, url_for_path
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("migrate_storage")
+
+
+def _iter_flat_batches(directory: str, batch_size: int):
+    """디렉토리 바로 아래의 파일을 batch_size개씩 묶어 반환합니다 (하위 디렉토리 제외)."""
+    batch = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.startswith(".") or entry.name.endswith(".part"):
+                continue
+            if entry.is_file(follow_symlinks=False):
+                batch.append(entry.name)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def _move_batch(category: str, names: List[str]) -> List[Tuple[str, str]]:
+    moved = []
+    for name in names:
+        old_path = os.path.join(category_dir(category), name)
+        new_path = sharded_path(category, name)
+        try:
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            if os.path.exists(new_path):
+                # 이전 실행에서 옮겼지만 원본 삭제 전에 중단된 경우
+                if os.path.getsize(new_path) == os.path.getsize(old_path):
+                    os.remove(old_path)
+                    moved.append((old_path, new_path))
+                else:
+                    logger.warning("대상 파일이 이미 존재하여 건너뜀: %s", new_path)
+                continue
+            os.replace(old_path, new_path)
+            moved.append((old_path, new_path))
+        except FileNotFoundError:
+            # 이동 중 보존 정책 작업 등으로 삭제된 경우
+            continue
+    return moved
+
+
+def _update_references(db, moved: List[Tuple[str, str]]):
+    """
+    이동한 파일을 가리키는 images 행을 새 경로로 갱신합니다 (저장 형식 유지).
+    배치의 file_key로 후보 행을 인덱스 조회한 뒤, 바뀐 행만 기본 키 기준 executemany 한 번으로 갱신합니다.
+    """
+    if not moved:
+        return
+    new_values = {}
+    for old_path, new_path in moved:
+        new_values[old_path] = new_path
+        new_values[url_for_path(old_path)] = url_for_path(new_path)
+    keys = list({file_key(os.path.basename(old_path)) for old_path, _ in moved})
+    rows = db.execute(
+        select(Image.image_id, Image.original_image_url, Image.generated_image_url)
+        .where(or_(Image.original_file_key.in_(keys), Image.generated_file_key.in_(keys)))
+    ).all()
+    changes = []
+    for row in rows:
+        change = {}
+        if row.original_image_url in new_values:
+            change["original_image_url"] = new_values[row.original_image_url]
+        if row.generated_image_url in new_values:
+            change["generated_image_url"] = new_values[row.generated_image_url]
+        if change:
+            changes.append({"image_id": row.image_id, **change})
+    # 열 조합별로 나눠 실행 (executemany는 모든 파라미터의 열이 같아야 함)
+    for columns in {tuple(sorted(change)) for change in changes}:
+        db.execute(update(Image), [change for change in changes if tuple(sorted(change)) == columns])
+    db.commit()
+
+
+def _backfill_file_keys(db):
+    """file_key 컬럼이 추가되기 전에 기록된 행을 먼저 채웁니다 (그래야 file_key로 참조 행을 찾을 수 있음)."""
+    total = 0
+    while True:
+        count = backfill_image_file_keys(db)
+        if not count:
+            break
+        total += count
+    if total:
+        logger.info("images.file_key %d행 채움", total)
+
+
+def migrate_category(category: str, batch_size: int, sleep: float, dry_run: bool) -> int:
+    directory = category_dir(category)
+    if not os.path.isdir(directory):
+        return 0
+
+    total = 0
+    db = SessionLocal()
+    try:
+        if not dry_run:
+            _backfill_file_keys(db)
+        # 순회 중 디렉토리가 바뀌므로 더 옮길 파일이 없을 때까지 반복
+        while True:
+            moved_in_pass = 0
+            for names in _iter_flat_batches(directory, batch_size):
+                if dry_run:
+                    total += len(names)
+                    continue
+                moved = _move_batch(category, names)
+                _update_references(db, moved)
+                moved_in_pass += len(moved)
+                total += len(moved)
+                logger.info("%s: %d개 이동 (누적 %d)", category, len(moved), total)
+                if sleep:
+                    time.sleep(sleep)
+            if dry_run or moved_in_pass == 0:
+                break
+    finally:
+        db.close()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="업로드/결과 파일을 샤딩 디렉토리 구조로 옮깁니다.")
+    parser.add_argument("--categories", nargs="+", default=list(CATEGORY_DIRS), choices=list(CATEGORY_DIRS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--sleep", type=float, default=0.0, help="배치 사이 대기 시간 (초, 서버 부하 조절용)")
+    parser.add_argument("--dry-run", action="store_true", help="옮길 파일 수만 출력")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    for category in args.categories:
+        count = migrate_category(category, args.batch_size, args.sleep, args.dry_run)
+        logger.info("%s: %s %d개", category, "이동 대상" if args.dry_run else "이동 완료", count)
+    logger.info("마이그레이션 종료 (%.1f초)", time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#model/admin_export.py
+"""
+관리자/리포트용 대량 조회
+
+결과 전체를 리스트로 가져오지 않고 서버 측 커서에서 배치 단위로 읽으므로
+행 수와 관계없이 메모리 사용량이 배치 크기로 제한됩니다.
+
+- admin_batches: sp_l_admin 프로시저가 연 refcursor를 FETCH FORWARD로 나눠 읽음
+- query_batches: 이름 있는 서버 측 커서(DECLARE ... CURSOR)로 조회
+- iter_query_csv: COPY (...) TO STDOUT으로 PostgreSQL이 만든 CSV를 그대로 전달
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+import uuid
+from psycopg import sql
+from model.pgsql_test import get_pool
+
+# 내보내기 대상 쿼리 (이름으로만 선택, 비밀번호 해시 등 민감한 컬럼은 제외)
+EXPORT_QUERIES = {
+    "users": "SELECT user_id, email, credits, created_at, last_login FROM users ORDER BY user_id",
+    "images": (
+        "SELECT image_id, user_id, original_image_url, generated_image_url, background_style, "
+        "model_version, processing_time, content_hash, created_at FROM images ORDER BY image_id"
+    ),
+    "user_images": "SELECT id, user_id, image_id, credits_used, created_at FROM user_images ORDER BY id",
+}
+
+# COPY 출력을 이 크기 이상 모아서 전달 (행마다 작은 조각으로 나오므로)
+COPY_CHUNK_SIZE = 64 * 1024
+
+Batches = Iterator[List[tuple]]
+
+
+@contextmanager
+def admin_batches(batch_size: int) -> Iterator[Tuple[List[str], Batches]]:
+    """
+    sp_l_admin 결과를 (컬럼 이름, 배치 이터레이터)로 돌려줍니다.
+    with 블록이 끝날 때까지 연결 풀의 연결 하나를 사용합니다.
+    """
+    with get_pool(read_only=True).connection() as conn:
+        with conn.cursor() as cur:
+            # refcursor를 명시적으로 넘기기 위해 CAST 사용
+            cur.execute("CALL sp_l_admin(CAST(%s AS refcursor))", ('admin_cursor',))
+            fetch = sql.SQL("FETCH FORWARD {} FROM admin_cursor").format(sql.Literal(batch_size))
+            # 컬럼 정보는 첫 FETCH 이후에 알 수 있음
+            cur.execute(fetch)
+            columns = [column.name for column in cur.description]
+            first = cur.fetchall()
+
+            def batches() -> Batches:
+                rows = first
+                while rows:
+                    yield rows
+                    if len(rows) < batch_size:
+                        return
+                    cur.execute(fetch)
+                    rows = cur.fetchall()
+
+            yield columns, batches()
+            cur.execute("CLOSE admin_cursor")
+
+
+@contextmanager
+def query_batches(name: str, batch_size: int) -> Iterator[Tuple[List[str], Batches]]:
+    """EXPORT_QUERIES[name] 결과를 이름 있는 서버 측 커서로 (컬럼 이름, 배치 이터레이터)로 돌려줍니다."""
+    with get_pool(read_only=True).connection() as conn:
+        with conn.cursor(name=f"export_{name}_{uuid.uuid4().hex[:8]}") as cur:
+            cur.itersize = batch_size
+            cur.execute(EXPORT_QUERIES[name])
+            columns = [column.name for column in cur.description]
+
+            def batches() -> Batches:
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+
+            yield columns, batches()
+
+
+def iter_query_csv(name: str) -> Iterator[bytes]:
+    """EXPORT_QUERIES[name] 결과를 헤더가 포함된 CSV 바이트 조각으로 돌려줍니다 (COPY TO STDOUT)."""
+    query = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER true)").format(sql.SQL(EXPORT_QUERIES[name]))
+    with get_pool(read_only=True).connection() as conn:
+        with conn.cursor() as cur:
+            with cur.copy(query) as copy:
+                buffer = bytearray()
+                for data in copy:
+                    buffer += data
+                    if len(buffer) >= COPY_CHUNK_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+                if buffer:
+                    yield bytes(buffer)
@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, event, make_url, select, update, Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, Text, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, Session
 from datetime import datetime
+from typing import List, Optional
+from urllib.parse import urlsplit
 import os
+import time
+import threading
 from dotenv import load_dotenv
 import logging
 
@@ -20,25 +24,149 @@ DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_PORT = os.getenv('DB_PORT', '5432')
 DB_NAME = os.getenv('DB_NAME', 'ai_photo_db')
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL이 지정되면 우선 사용 (벤치마크/테스트용 SQLite 등)
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL", f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
 
 # 데이터베이스 연결 문자열 검증
 if not os.getenv('DB_USER') or not os.getenv('DB_PASSWORD'):
     logger.warning("데이터베이스 사용자 이름 또는 비밀번호가 설정되지 않았습니다. .env 파일을 확인하세요.")
-    logger.info(f"현재 사용 중인 데이터베이스 설정: Host={DB_HOST}, Port={DB_PORT}, DB={DB_NAME}")
+    logger.info("현재 사용 중인 데이터베이스 설정", extra={"db_host": DB_HOST, "db_port": DB_PORT, "db_name": DB_NAME})
 
 # 엔진 생성
 try:
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
     logger.info("데이터베이스 연결 엔진 생성 성공")
 except Exception as e:
-    logger.error(f"데이터베이스 연결 엔진 생성 실패: {str(e)}")
+    logger.error("데이터베이스 연결 엔진 생성 실패", extra={"error": str(e)})
     raise
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# 데이터베이스 세션 관리
+# 읽기 전용 복제본 (쉼표로 구분한 연결 문자열, 비어 있으면 모든 읽기도 기본 DB 사용)
+# 기본 DB와 같은 주소를 지정하면 인스턴스 하나로 복제본 라우팅을 시험할 수 있음
+REPLICA_URLS = [url.strip() for url in os.getenv("REPLICA_URLS", "").split(",") if url.strip()]
+# 복제 지연이 이보다 크면 해당 복제본을 쓰지 않고 기본 DB에서 읽음
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# 복제본별 지연 확인 주기 (요청마다 확인하지 않음)
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+# 지연 확인용 연결 시간 제한 (초). 응답 없는 복제본 때문에 확인 스레드가 오래 묶이지 않게 함
+REPLICA_CONNECT_TIMEOUT_SECONDS = int(os.getenv("REPLICA_CONNECT_TIMEOUT_SECONDS", "2"))
+
+# 복제본의 재생 지연 (초). NULL이면 사용하지 않음
+# - 기본 DB 자체(복구 모드가 아님)는 0
+# - WAL 수신 프로세스가 없거나 스트리밍 중이 아니면 NULL
+#   (수신이 끊긴 복제본도 받은 WAL을 모두 재생했으므로 LSN 비교만으로는 0이 되어 버림)
+#   status는 pg_read_all_stats(pg_monitor) 권한이 없으면 NULL로 보이므로 그때는 프로세스 존재만 확인
+# - 스트리밍 중이고 받은 WAL을 모두 재생했으면 기본 DB에 쓰기가 없어도 0
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE status IS NULL OR status = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, url: str):
+        connect_args = {}
+        if make_url(url).get_backend_name() == "postgresql":
+            connect_args["connect_timeout"] = REPLICA_CONNECT_TIMEOUT_SECONDS
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _measure_lag(self) -> Optional[float]:
+        if self.engine.dialect.name != "postgresql":
+            return 0.0
+        with self.engine.connect() as conn:
+            lag = conn.execute(REPLICA_LAG_QUERY).scalar()
+        return None if lag is None else float(lag)
+
+    def refresh(self, now: float):
+        """
+        확인 주기가 지났으면 백그라운드 스레드에서 지연을 다시 측정합니다.
+        요청 경로에서는 연결을 기다리지 않고 이전 결과를 사용합니다 (처음 확인이 끝나기 전에는 기본 DB).
+        """
+        if now - self.checked_at < REPLICA_CHECK_INTERVAL_SECONDS or not self._lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._check, name="replica-check", daemon=True).start()
+        except Exception:
+            self._lock.release()
+            raise
+
+    def _check(self):
+        try:
+            healthy = False
+            try:
+                self.lag = self._measure_lag()
+                if self.lag is None:
+                    logger.warning("복제본 WAL 수신 중단, 기본 DB에서 읽음", extra={"replica": self.name})
+                else:
+                    healthy = self.lag <= REPLICA_MAX_LAG_SECONDS
+            except Exception as e:
+                self.lag = None
+                logger.warning("복제본 상태 확인 실패", extra={"replica": self.name, "error": str(e)})
+            if healthy and not self.healthy:
+                logger.info("복제본 사용", extra={"replica": self.name, "lag_seconds": self.lag})
+            elif self.healthy and not healthy:
+                logger.warning("복제본 제외, 기본 DB에서 읽음", extra={"replica": self.name, "lag_seconds": self.lag})
+            self.healthy = healthy
+            self.checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+
+class ReplicaRouter:
+    """
+    읽기 전용 세션을 지연이 허용 범위 안인 복제본으로 보냅니다 (라운드 로빈).
+    사용할 수 있는 복제본이 없으면 기본 DB를 사용합니다.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._next = 0
+
+    def read_engine(self):
+        if not self.replicas:
+            return engine
+        now = time.monotonic()
+        for replica in self.replicas:
+            replica.refresh(now)
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return engine
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next].engine
+
+    def status(self) -> List[dict]:
+        return [
+            {"replica": replica.name, "healthy": replica.healthy, "lag_seconds": replica.lag}
+            for replica in self.replicas
+        ]
+
+
+replica_router = ReplicaRouter(REPLICA_URLS)
+
+
+@event.listens_for(Session, "after_begin")
+def _set_read_only(session, transaction, connection):
+    # 읽기 세션이 기본 DB로 돌아가거나 복제본 주소가 기본 DB와 같아도 쓰기는 실패하도록 함
+    if session.info.get("read_only") and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+
+# 데이터베이스 세션 관리 (쓰기, 크레딧 차감 등 기본 DB가 필요한 경로)
 def get_db():
     db = SessionLocal()
     try:
@@ -46,14 +174,26 @@ def get_db():
     finally:
         db.close()
 
+# 읽기 전용 세션 (복제본, 복제 지연만큼 최근 쓰기가 보이지 않을 수 있는 조회에만 사용)
+def get_read_db():
+    db = SessionLocal(bind=replica_router.read_engine(), info={"read_only": True})
+    try:
+        yield db
+    finally:
+        db.close()
+
 # 사용자 모델
+# 가입 시 지급하는 크레딧 (이보다 많이 가진 사용자는 크레딧을 추가로 구매한 것으로 봄)
+DEFAULT_USER_CREDITS = 100
+
+
 class User(Base):
     __tablename__ = "users"
     
     user_id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, nullable=False)
     password_hash = Column(Text, nullable=False)
-    credits = Column(Integer, default=100)
+    credits = Column(Integer, default=DEFAULT_USER_CREDITS)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime)
     
@@ -71,11 +211,56 @@ class Image(Base):
     background_style = Column(Text)
     model_version = Column(Text)
     processing_time = Column(Float)
+    perceptual_hash = Column(BigInteger)  # 64비트 dHash (중복 이미지 탐지용)
+    content_hash = Column(String(64), index=True)  # 결과 파일 SHA-256 (미러링한 BRIA 결과 중복 제거용)
+    # URL이 가리키는 파일 ID (보존 정책/마이그레이션이 URL 전체를 스캔하지 않고 인덱스로 찾기 위함)
+    original_file_key = Column(String(64), index=True)
+    generated_file_key = Column(String(64), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="images")
     user_images = relationship("UserImage", back_populates="image")
 
+def file_key_from_url(url: Optional[str]) -> Optional[str]:
+    """
+    URL 또는 경로가 가리키는 파일 ID (controller.storage_paths.file_key와 같은 규칙)
+    예: "/uploads/results/3f/a2/{file_id}_nobg.png", "https://.../{file_id}_photo_nobg.png" → file_id
+    """
+    if not url:
+        return None
+    name = os.path.basename(urlsplit(url).path)
+    return name.split(".", 1)[0].split("_", 1)[0][:64]
+
+
+@event.listens_for(Image, "before_insert")
+@event.listens_for(Image, "before_update")
+def _set_file_keys(mapper, connection, target):
+    target.original_file_key = file_key_from_url(target.original_image_url)
+    target.generated_file_key = file_key_from_url(target.generated_image_url)
+
+
+def backfill_image_file_keys(db: Session, batch_size: int = 5000) -> int:
+    """
+    file_key 컬럼이 추가되기 전에 기록된 행을 batch_size개 채우고 채운 행 수를 반환합니다.
+    0을 반환하면 모든 행이 채워진 것입니다 (original_image_url은 NOT NULL이므로 original_file_key가 NULL인 행이 남은 행).
+    """
+    rows = db.execute(
+        select(Image.image_id, Image.original_image_url, Image.generated_image_url)
+        .where(Image.original_file_key.is_(None))
+        .limit(batch_size)
+    ).all()
+    if rows:
+        db.execute(update(Image), [
+            {
+                "image_id": row.image_id,
+                "original_file_key": file_key_from_url(row.original_image_url) or "",
+                "generated_file_key": file_key_from_url(row.generated_image_url),
+            }
+            for row in rows
+        ])
+        db.commit()
+    return len(rows)
+
 # 사용자별 이미지 처리 기록 모델
 class UserImage(Base):
     __tablename__ = "user_images"
@@ -89,11 +274,136 @@ class UserImage(Base):
     user = relationship("User", back_populates="user_images")
     image = relationship("Image", back_populates="user_images")
 
+# 요청 제한(rate limit) 토큰 버킷 (여러 워커가 같은 버킷을 공유할 때 사용)
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    
+    bucket_key = Column(String(255), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # UNIX 타임스탬프 (초)
+
+# usage_rollups의 processing_time 히스토그램 경계 (초). bucket_i는 경계 i 이하, 마지막 버킷은 마지막 경계 초과
+PROCESSING_TIME_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+# 사용자/일/모델별 사용량 집계 (controller.usage가 images 기록과 함께 또는 주기 작업으로 갱신)
+class UsageRollup(Base):
+    __tablename__ = "usage_rollups"
+    
+    user_id = Column(Integer, primary_key=True)  # 비인증 사용자는 0
+    day = Column(Date, primary_key=True)  # created_at 기준 UTC 날짜
+    model_version = Column(String(64), primary_key=True)
+    image_count = Column(Integer, nullable=False, default=0)
+    credits_used = Column(Integer, nullable=False, default=0)
+    processing_time_sum = Column(Float, nullable=False, default=0)
+    processing_time_max = Column(Float, nullable=False, default=0)
+    bucket_0 = Column(Integer, nullable=False, default=0)
+    bucket_1 = Column(Integer, nullable=False, default=0)
+    bucket_2 = Column(Integer, nullable=False, default=0)
+    bucket_3 = Column(Integer, nullable=False, default=0)
+    bucket_4 = Column(Integer, nullable=False, default=0)
+    bucket_5 = Column(Integer, nullable=False, default=0)
+    bucket_6 = Column(Integer, nullable=False, default=0)
+    bucket_7 = Column(Integer, nullable=False, default=0)
+    bucket_8 = Column(Integer, nullable=False, default=0)
+    bucket_9 = Column(Integer, nullable=False, default=0)
+
+# 주기 집계 작업이 마지막으로 반영한 images.image_id
+class UsageRollupState(Base):
+    __tablename__ = "usage_rollup_state"
+    
+    name = Column(String(64), primary_key=True)
+    last_image_id = Column(Integer, nullable=False, default=0)
+
+# 기존 테이블에 새로 추가된 컬럼 (create_all은 기존 테이블을 변경하지 않음)
+ADDED_COLUMNS = {
+    "images": {
+        "perceptual_hash": "BIGINT",
+        "content_hash": "VARCHAR(64)",
+        "original_file_key": "VARCHAR(64)",
+        "generated_file_key": "VARCHAR(64)",
+    },
+}
+
+# 다른 워커/서버가 스키마를 바꾸는 동안 새 컬럼이 생기기를 기다릴 최대 시간 (초)
+SCHEMA_WAIT_SECONDS = float(os.getenv("SCHEMA_WAIT_SECONDS", "60"))
+
+# 기존 테이블에 새로 추가된 컬럼의 인덱스
+ADDED_INDEXES = {
+    "ix_images_content_hash": "images (content_hash)",
+    "ix_images_original_file_key": "images (original_file_key)",
+    "ix_images_generated_file_key": "images (generated_file_key)",
+}
+
+def ensure_columns():
+    """
+    create_all이 바꾸지 않는 기존 테이블에 새 컬럼과 인덱스를 추가합니다 (create_tables에서 한 곳만 실행).
+    PostgreSQL에서는 인덱스를 만드는 동안 쓰기가 막히지 않도록 트랜잭션 밖에서 CREATE INDEX CONCURRENTLY를 사용합니다.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table_name, columns in ADDED_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            for column_name, column_type in columns.items():
+                if column_name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+                    logger.info("컬럼 추가됨", extra={"table": table_name, "column": column_name})
+
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            for index_name, definition in ADDED_INDEXES.items():
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition}"))
+        return
+
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        for index_name, definition in ADDED_INDEXES.items():
+            valid = conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+            ), {"name": index_name}).scalar()
+            if valid:
+                continue
+            if valid is False:
+                # 중단된 CONCURRENTLY 빌드가 남긴 무효 인덱스는 지우고 다시 만듦
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY {index_name} ON {definition}"))
+            logger.info("인덱스 생성됨", extra={"index": index_name})
+
+def _schema_ready() -> bool:
+    """모든 테이블과 새 컬럼이 있는지 확인합니다 (인덱스는 없어도 동작하므로 확인하지 않음)."""
+    inspector = inspect(engine)
+    if not set(inspector.get_table_names()).issuperset(Base.metadata.tables):
+        return False
+    for table_name, columns in ADDED_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        if not existing.issuperset(columns):
+            return False
+    return True
+
 # 테이블 생성 함수
 def create_tables():
+    """
+    테이블, 새 컬럼, 인덱스를 만듭니다.
+
+    여러 워커/서버가 동시에 시작해도 singleton_lock을 얻은 한 곳만 스키마를 바꾸고,
+    나머지는 새 컬럼이 생길 때까지만 기다린 뒤 시작합니다 (인덱스 생성은 기다리지 않음).
+    잠금을 기다리는 세션이 있으면 CREATE INDEX CONCURRENTLY가 그 세션을 기다리며 멈추므로 잠금은 기다리지 않습니다.
+    """
+    # controller.locks가 이 모듈의 engine을 사용하므로 함수 안에서 import
+    from controller.locks import singleton_lock
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("데이터베이스 테이블 생성 완료")
+        with singleton_lock("schema") as acquired:
+            if acquired:
+                Base.metadata.create_all(bind=engine)
+                ensure_columns()
+                logger.info("데이터베이스 테이블 생성 완료")
+                return
+        logger.info("다른 워커에서 스키마 변경 중, 새 컬럼이 추가되기를 기다림")
+        deadline = time.monotonic() + SCHEMA_WAIT_SECONDS
+        while not _schema_ready():
+            if time.monotonic() > deadline:
+                logger.warning("스키마 변경 대기 시간 초과", extra={"wait_seconds": SCHEMA_WAIT_SECONDS})
+                break
+            time.sleep(0.5)
     except Exception as e:
-        logger.error(f"데이터베이스 테이블 생성 실패: {str(e)}")
-        raise 
\ No newline at end of file
+        logger.error("데이터베이스 테이블 생성 실패", extra={"error": str(e)})
+        raise 
@@ -1,20 +1,57 @@
 #model/pgsql_test.py
 
 
+import logging
+import threading
 import psycopg
 import psycopg_pool
 from config import config
 
-pool_default = psycopg_pool.ConnectionPool(
-    config.PGSQL_TEST_DATABASE_STRING, 
-    min_size=config.PGSQL_TEST_POOL_MIN_SIZE,
-    max_size=config.PGSQL_TEST_POOL_MAX_SIZE,
-    max_idle=config.PGSQL_TEST_POOL_MAX_IDLE
-    
-    
-)
+# 로깅 설정
+logger = logging.getLogger("pgsql_test")
+
+
+def _create_pool(conninfo: str) -> psycopg_pool.ConnectionPool:
+    # 임포트만으로 DB에 연결하지 않도록 처음 사용할 때 연결 풀을 엶
+    return psycopg_pool.ConnectionPool(
+        conninfo, 
+        min_size=config.PGSQL_TEST_POOL_MIN_SIZE,
+        max_size=config.PGSQL_TEST_POOL_MAX_SIZE,
+        max_idle=config.PGSQL_TEST_POOL_MAX_IDLE,
+        timeout=config.PGSQL_TEST_POOL_TIMEOUT,
+        open=False
+    )
+
+
+pool_default = _create_pool(config.PGSQL_TEST_DATABASE_STRING)
+# 읽기 전용 조회(관리자 목록, 내보내기)용 복제본 풀 (설정하지 않으면 기본 풀 사용)
+pool_replica = _create_pool(config.PGSQL_TEST_REPLICA_STRING) if config.PGSQL_TEST_REPLICA_STRING else None
+_pool_lock = threading.Lock()
+_opened_pools = []
+
+
+def get_pool(read_only: bool = False) -> psycopg_pool.ConnectionPool:
+    """
+    연결 풀을 반환합니다. read_only=True이면 복제본 풀을 사용합니다
+    (복제 지연만큼 최근 쓰기가 보이지 않아도 되는 조회에만 사용).
+    """
+    pool = pool_replica if read_only and pool_replica is not None else pool_default
+    with _pool_lock:
+        if pool not in _opened_pools:
+            pool.open()
+            _opened_pools.append(pool)
+    return pool
+
+
+def close_pool():
+    with _pool_lock:
+        while _opened_pools:
+            _opened_pools.pop().close()
+
+
 def list_admin():
-    with pool_default.connection() as conn:
+    # 행 수가 많으면 model.admin_export.admin_batches를 사용
+    with get_pool(read_only=True).connection() as conn:
         cur = conn.cursor(row_factory=psycopg.rows.dict_row)
 
         try:
@@ -25,12 +62,13 @@ def list_admin():
 
             conn.commit()
         except psycopg.OperationalError as err:
-            print(f'Error querying: {err}')
+            logger.error("관리자 목록 조회 실패: 연결 오류", extra={"error": str(err)})
+            results = False
         except psycopg.ProgrammingError as err:
-            print('Database error via psycopg.     %s', err)
+            logger.error("관리자 목록 조회 실패: 쿼리 오류", extra={"error": str(err)})
             results = False
         except psycopg.IntegrityError as err:
-            print('postgresSQL integrity error via psycopg.    %s', err)
+            logger.error("관리자 목록 조회 실패: 무결성 오류", extra={"error": str(err)})
             results = False
 
 
@@ -44,12 +82,13 @@ def list_admin():
         try:
             results = cur.execute("SELECT * FROM users").fetchall() #raw query test
         except psycopg.OperationalError as err:
-            print(f'Error querying: {err}')
+            logger.error("관리자 목록 조회 실패: 연결 오류", extra={"error": str(err)})
+            results = False
         except psycopg.ProgrammingError as err:
-            print('Database error via psycopg.     %s', err)
+            logger.error("관리자 목록 조회 실패: 쿼리 오류", extra={"error": str(err)})
             results = False
         except psycopg.IntegrityError as err:
-            print('postgresSQL integrity error via psycopg.    %s', err)
+            logger.error("관리자 목록 조회 실패: 무결성 오류", extra={"error": str(err)})
             results = False
 
 
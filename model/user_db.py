@@ -15,7 +15,7 @@ load_dotenv()
 app = FastAPI()
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, text, Column, Integer, String, Float, DateTime, ForeignKey, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import uuid
@@ -24,7 +24,7 @@ import shutil
 from typing import Optional
 
 # database.py에서 모델과 세션 관리 함수 임포트
-from .database import User, Image, UserImage, get_db, SQLALCHEMY_DATABASE_URL, engine, Base
+from .database import User, Image, UserImage, get_db, get_read_db, replica_router, SQLALCHEMY_DATABASE_URL, engine, Base
 
 # 테이블 생성
 Base.metadata.create_all(bind=engine)
@@ -33,7 +33,7 @@ Base.metadata.create_all(bind=engine)
 UPLOAD_DIR = "uploads"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
-    logger.info(f"업로드 디렉토리 생성: {UPLOAD_DIR}")
+    logger.info("업로드 디렉토리 생성", extra={"directory": UPLOAD_DIR})
 
 @app.get("/")
 async def root():
@@ -98,10 +98,10 @@ async def upload_file(
     }
 
 @app.get("/test-db")
-async def test_db(db = Depends(get_db)):
+def test_db(db = Depends(get_read_db)):
     try:
-        # 데이터베이스에 간단한 쿼리 실행
-        result = db.execute("SELECT 1").fetchone()
+        # 데이터베이스에 간단한 쿼리 실행 (복제본이 설정되어 있으면 복제본)
+        result = db.execute(text("SELECT 1")).fetchone()
         # 비밀번호 가림 처리
         sanitized_db_url = SQLALCHEMY_DATABASE_URL.replace(
             os.getenv('DB_PASSWORD', ''), '********'
@@ -109,7 +109,8 @@ async def test_db(db = Depends(get_db)):
         return {
             "message": "데이터베이스 연결 성공!",
             "result": result[0] if result else None,
-            "database_url": sanitized_db_url
+            "database_url": sanitized_db_url,
+            "replicas": replica_router.status()
         }
     except Exception as e:
         # 비밀번호 가림 처리
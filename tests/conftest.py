@@ -0,0 +1,15 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+# 모듈을 import하기 전에 설정해야 하는 환경 변수 (외부 DB/업스트림 없이 실행)
+_workdir = tempfile.mkdtemp(prefix="backend_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ.setdefault("JWT_SECRET_KEY", "test-current-secret")
+os.environ.setdefault("JWT_KEY_ID", "v2")
+os.environ.setdefault("JWT_PREVIOUS_KEYS", "v1:test-previous-secret")
+os.environ.setdefault("API_KEYS_INITIALIZED", "1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,120 @@
+# tests/test_auth.py
+from datetime import datetime, timedelta
+from typing import Optional
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from controller import auth
+from model.database import User
+
+
+def _token(secret: str, kid: str, **overrides) -> str:
+    now = datetime.utcnow()
+    claims = {"sub": "7", "iss": auth.JWT_ISSUER, "iat": now, "exp": now + timedelta(minutes=5), **overrides}
+    return jwt.encode(claims, secret, algorithm=auth.JWT_ALGORITHM, headers={"kid": kid})
+
+
+def test_token_round_trip():
+    claims = auth.decode_token(auth.create_access_token(42))
+    assert claims["user_id"] == 42
+    assert jwt.get_unverified_header(auth.create_access_token(42))["kid"] == "v2"
+
+
+def test_previous_key_still_accepted_during_rotation():
+    assert auth.decode_token(_token("test-previous-secret", "v1"))["user_id"] == 7
+
+
+@pytest.mark.parametrize("token", [
+    _token("test-current-secret", "v9"),
+    _token("wrong-secret", "v2"),
+    _token("test-previous-secret", "v2"),
+    _token("test-current-secret", "v2", exp=datetime.utcnow() - timedelta(seconds=1)),
+    _token("test-current-secret", "v2", iss="someone-else"),
+    _token("test-current-secret", "v2", sub="not-a-number"),
+    "not-a-jwt",
+])
+def test_invalid_tokens_rejected(token):
+    with pytest.raises(auth.AuthError):
+        auth.decode_token(token)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/current")
+    def current(user_id: Optional[int] = Depends(auth.current_user_id)):
+        return {"user_id": user_id}
+
+    @app.get("/authenticated/{user_id}")
+    def authenticated(user_id: Optional[int] = Depends(auth.authenticated_user_id)):
+        return {"user_id": user_id}
+
+    return TestClient(app)
+
+
+def _bearer(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token(user_id)}"}
+
+
+def test_token_user_wins_and_mismatch_is_forbidden(client):
+    assert client.get("/current", headers=_bearer(3)).json() == {"user_id": 3}
+    assert client.get("/current", params={"user_id": 3}, headers=_bearer(3)).json() == {"user_id": 3}
+    assert client.get("/current", params={"user_id": 4}, headers=_bearer(3)).status_code == 403
+    assert client.get("/authenticated/4", headers=_bearer(3)).status_code == 403
+
+
+def test_invalid_token_is_unauthorized(client):
+    response = client.get("/current", headers={"Authorization": "Bearer garbage"})
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_user_id_param_requires_token_by_default(client):
+    assert auth.AUTH_ALLOW_USER_ID_PARAM is False
+    assert client.get("/current").json() == {"user_id": None}
+    assert client.get("/current", params={"user_id": 3}).status_code == 401
+    assert client.get("/authenticated/3").status_code == 401
+
+
+def test_legacy_param_never_reaches_authenticated_routes(client, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_ALLOW_USER_ID_PARAM", True)
+    assert client.get("/current", params={"user_id": 3}).json() == {"user_id": 3}
+    assert client.get("/authenticated/3").status_code == 401
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    User.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(user_id=1, email="a@example.com", password_hash="x", credits=2))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_charge_credits_only_when_sufficient(db):
+    assert auth.charge_credits(db, 1) == 1
+    assert auth.charge_credits(db, 1) == 0
+    with pytest.raises(auth.InsufficientCreditsError):
+        auth.charge_credits(db, 1)
+    db.commit()
+    assert db.get(User, 1).credits == 0
+
+
+def test_charge_credits_does_not_partially_charge(db):
+    with pytest.raises(auth.InsufficientCreditsError):
+        auth.charge_credits(db, 1, amount=3)
+    db.commit()
+    assert db.get(User, 1).credits == 2
+
+
+def test_charge_credits_unknown_user(db):
+    with pytest.raises(auth.InsufficientCreditsError):
+        auth.charge_credits(db, 999)
@@ -0,0 +1,41 @@
+# tests/test_bria_mirror.py
+import asyncio
+import pytest
+from controller import bria_mirror
+
+
+@pytest.fixture
+def mirrored(monkeypatch):
+    recorded = []
+
+    async def fake_download(client, index, url, start_time):
+        return bria_mirror.MirroredImage(index, url, f"/uploads/bria_results/{index}.png", str(index), 1, 0.0, False)
+
+    def fake_record(items, user_id, original_image_url, bg_prompt):
+        for item in items:
+            item.image_id = 100 + item.index
+        recorded.append(user_id)
+
+    monkeypatch.setattr(bria_mirror, "BRIA_MIRROR_ENABLED", True)
+    monkeypatch.setattr(bria_mirror, "_download", fake_download)
+    monkeypatch.setattr(bria_mirror, "result_url", lambda category, path: path)
+    monkeypatch.setattr(bria_mirror, "record_mirrored_images", fake_record)
+    return recorded
+
+
+def _mirror(user_id):
+    response = {"result": [["https://bria/a.png", 1, "u1"], ["https://bria/b.png", 2, "u2"]]}
+    return asyncio.run(bria_mirror.mirror_bria_results(response, 0.0, "/uploads/x.png", "sea", user_id))
+
+
+def test_results_are_recorded_for_the_token_user(mirrored):
+    result = _mirror(7)
+    assert mirrored == [7]
+    assert result["image_ids"] == [100, 101]
+
+
+def test_anonymous_results_are_mirrored_but_not_recorded(mirrored):
+    result = _mirror(None)
+    assert mirrored == []
+    assert result["image_ids"] == [None, None]
+    assert [item[0] for item in result["result"]] == ["/uploads/bria_results/0.png", "/uploads/bria_results/1.png"]
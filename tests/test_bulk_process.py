@@ -0,0 +1,68 @@
+# tests/test_bulk_process.py
+import asyncio
+import json
+import os
+import cv2
+import numpy as np
+import pytest
+import bulk_process
+from controller import storage_paths
+
+
+def _write_image(path, value):
+    image = np.full((32, 32), value, dtype=np.uint8)
+    image[8:24, 8:24] = 255 - value
+    cv2.imwrite(str(path), image)
+
+
+def _run(tmp_path, **overrides):
+    args = dict(source=str(tmp_path / "in"), mode="edges", manifest=str(tmp_path / "manifest.jsonl"),
+                concurrency=2, retries=0, limit=None, progress_interval=60.0)
+    args.update(overrides)
+    return asyncio.run(bulk_process.run(type("Args", (), args)))
+
+
+@pytest.fixture
+def inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_paths, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    (tmp_path / "in").mkdir()
+    for i in range(3):
+        _write_image(tmp_path / "in" / f"img{i}.png", i * 10)
+    return tmp_path
+
+
+def test_resume_skips_unchanged_and_reprocesses_replaced_files(inputs):
+    first = _run(inputs)
+    assert (first.done, first.skipped, first.total) == (3, 0, 3)
+
+    second = _run(inputs)
+    assert (second.done, second.skipped) == (0, 3)
+
+    # 같은 경로의 파일을 다른 내용으로 교체
+    replaced = inputs / "in" / "img1.png"
+    _write_image(replaced, 200)
+    os.utime(replaced, ns=(1, 1))
+    third = _run(inputs)
+    assert (third.done, third.skipped) == (1, 2)
+
+    # 수정 시간만 바뀐 경우는 해시를 비교해 건너뛰고, 새 상태를 기록해 다음에는 해시도 생략
+    os.utime(inputs / "in" / "img0.png", ns=(2, 2))
+    fourth = _run(inputs)
+    assert (fourth.done, fourth.skipped) == (0, 3)
+    records = [json.loads(line) for line in open(inputs / "manifest.jsonl")]
+    assert records[-1]["mtime_ns"] == 2 and "duplicate_of" not in records[-1]
+
+
+def test_workers_pull_sources_lazily(inputs, monkeypatch):
+    pulled = []
+
+    def sources(source, mode):
+        for i in range(3):
+            pulled.append(i)
+            yield str(inputs / "in" / f"img{i}.png")
+
+    monkeypatch.setattr(bulk_process, "iter_sources", sources)
+    progress = _run(inputs, concurrency=1, limit=2)
+    assert progress.done == 2 and progress.total == 2
+    # 처리용 1회 + 개수 세기 1회, 각각 limit개까지만 꺼냄
+    assert len(pulled) == 4
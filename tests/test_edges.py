@@ -0,0 +1,59 @@
+# tests/test_edges.py
+import io
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from controller import background_removal, storage_paths
+from controller.image_pipeline import (
+    decode_image, encode_png, iter_png_bands, iter_unpacked_bands, pack_edges, read_packed_header, unpack_edges, write_file
+)
+
+
+def _edges(height=53, width=37):
+    rng = np.random.default_rng(0)
+    return (rng.random((height, width)) > 0.9).astype(np.uint8) * 255
+
+
+def test_packed_to_png_streams_in_bands():
+    edges = _edges()
+    f = io.BytesIO(pack_edges(edges))
+    width, height = read_packed_header(f)
+    # 8행 밴드가 여러 개 나오도록 메모리 한도를 작게 설정
+    bands = list(iter_unpacked_bands(f, width, height, memory_limit=37 * 3 * 8, chunk_size=7))
+    assert len(bands) == 7 and all(band.shape[0] <= 8 for band in bands)
+
+    png = b"".join(iter_png_bands(width, height, bands))
+    assert np.array_equal(decode_image(png, cv2.IMREAD_GRAYSCALE), edges)
+
+
+def test_truncated_packed_file_is_rejected():
+    f = io.BytesIO(pack_edges(_edges())[:-10])
+    width, height = read_packed_header(f)
+    with pytest.raises(ValueError):
+        list(iter_unpacked_bands(f, width, height, memory_limit=1 << 20))
+
+
+def test_other_rendition_is_streamed_without_a_disk_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_paths, "UPLOAD_DIR", str(tmp_path))
+    edges = _edges()
+    write_file(storage_paths.storage_path("edges", "abc_edge.bits"), pack_edges(edges))
+    write_file(storage_paths.storage_path("edges", "def_edge.png"), encode_png(edges))
+    app = FastAPI()
+    app.include_router(background_removal.router)
+    client = TestClient(app)
+
+    response = client.get("/api/background/edge/abc")
+    assert response.status_code == 200 and response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == background_removal.EDGE_CACHE_CONTROL
+    assert np.array_equal(decode_image(response.content, cv2.IMREAD_GRAYSCALE), edges)
+
+    response = client.get("/api/background/edge/def", params={"format": "packed"})
+    assert response.status_code == 200 and np.array_equal(unpack_edges(response.content), edges)
+
+    # 변환한 사본을 저장하지 않음
+    assert not storage_paths.resolve_path("edges", "abc_edge.png")
+    assert not storage_paths.resolve_path("edges", "def_edge.bits")
+    assert client.get("/api/background/edge/missing").status_code == 404
+    assert client.get("/api/background/edge/missing", params={"format": "json"}).status_code == 404
@@ -0,0 +1,43 @@
+# tests/test_image_normalizer.py
+import io
+import numpy as np
+from PIL import Image as PILImage, PngImagePlugin
+from controller.image_normalizer import normalize_image
+
+
+def _gps_exif() -> PILImage.Exif:
+    exif = PILImage.Exif()
+    exif[0x010F] = "TestCam"
+    exif.get_ifd(0x8825)[2] = (37.0, 30.0, 0.0)
+    return exif
+
+
+def _photo() -> PILImage.Image:
+    rng = np.random.default_rng(0)
+    return PILImage.fromarray(rng.integers(0, 255, (64, 64, 3), dtype=np.uint8))
+
+
+def test_jpeg_metadata_removed_without_reencoding():
+    # 낮은 화질로 저장해 재인코딩 결과가 더 커지는 경우 (원본 화질 유지 경로)
+    buffer = io.BytesIO()
+    _photo().save(buffer, format="JPEG", quality=30, exif=_gps_exif(), icc_profile=b"\0" * 16)
+    original = buffer.getvalue()
+
+    result = normalize_image(original, "image/jpeg", "photo.jpg")
+    assert result.content_type == "image/jpeg" and result.changed
+    stripped = PILImage.open(io.BytesIO(result.data))
+    assert not stripped.getexif() and stripped.info.get("icc_profile") == b"\0" * 16
+    assert np.array_equal(np.asarray(stripped), np.asarray(PILImage.open(io.BytesIO(original))))
+
+
+def test_png_text_chunks_removed():
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Location", "37.5,127.0")
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (8, 8), "white").save(buffer, format="PNG", pnginfo=info, exif=_gps_exif())
+    original = buffer.getvalue()
+
+    result = normalize_image(original, "image/png", "flat.png")
+    stripped = PILImage.open(io.BytesIO(result.data))
+    stripped.load()
+    assert "Location" not in stripped.info and not stripped.getexif()
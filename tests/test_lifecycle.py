@@ -0,0 +1,51 @@
+# tests/test_lifecycle.py
+import asyncio
+import signal
+import pytest
+import uvicorn
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from controller import lifecycle
+from controller.uvicorn_worker import DrainingServer
+
+
+@pytest.fixture(autouse=True)
+def not_draining(monkeypatch):
+    monkeypatch.setattr(lifecycle, "_draining", False)
+
+
+def test_sigterm_flips_readiness_before_server_exits(monkeypatch):
+    monkeypatch.setattr(lifecycle, "DRAIN_PRESTOP_SECONDS", 0.05)
+    server = DrainingServer(uvicorn.Config(FastAPI()))
+
+    async def main():
+        server.handle_exit(signal.SIGTERM, None)
+        # 상태 확인은 바로 503, 리스너는 대기 시간이 지난 뒤에 닫힘
+        assert lifecycle.is_draining() and not server.should_exit
+        await asyncio.sleep(0.1)
+        assert server.should_exit
+
+    asyncio.run(main())
+
+
+def test_second_signal_exits_immediately(monkeypatch):
+    monkeypatch.setattr(lifecycle, "DRAIN_PRESTOP_SECONDS", 60)
+    server = DrainingServer(uvicorn.Config(FastAPI()))
+
+    async def main():
+        server.handle_exit(signal.SIGTERM, None)
+        server.handle_exit(signal.SIGTERM, None)
+        assert server.should_exit
+
+    asyncio.run(main())
+
+
+def test_responses_close_connection_while_draining():
+    app = FastAPI()
+    app.add_middleware(lifecycle.InFlightMiddleware)
+    app.get("/ping")(lambda: {"ok": True})
+    client = TestClient(app)
+
+    assert client.get("/ping").headers.get("connection") != "close"
+    lifecycle.begin_drain()
+    assert client.get("/ping").headers["connection"] == "close"
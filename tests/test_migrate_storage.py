@@ -0,0 +1,50 @@
+# tests/test_migrate_storage.py
+import os
+import pytest
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.orm import sessionmaker
+import migrate_storage
+from controller import storage_paths
+from model.database import Base, Image
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_paths, "UPLOAD_DIR", str(tmp_path))
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(migrate_storage, "SessionLocal", Session)
+    session = Session()
+    yield session, engine
+    session.close()
+    engine.dispose()
+
+
+def _touch(path):
+    with open(path, "wb") as f:
+        f.write(b"x")
+
+
+def test_references_follow_moved_files_with_one_update_per_batch(db):
+    session, engine = db
+    os.makedirs(storage_paths.category_dir("results"))
+    for i in range(4):
+        _touch(storage_paths.legacy_path("results", f"id{i}_nobg.png"))
+    session.add(Image(original_image_url="/uploads/id0.jpg", generated_image_url="/uploads/results/id0_nobg.png"))
+    session.add(Image(original_image_url="/uploads/id1.jpg", generated_image_url=storage_paths.legacy_path("results", "id1_nobg.png")))
+    session.commit()
+    # file_key 컬럼이 생기기 전에 기록된 행
+    session.execute(insert(Image), [{"original_image_url": "/uploads/id2.jpg", "generated_image_url": "/uploads/results/id2_nobg.png"}])
+    session.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    assert migrate_storage.migrate_category("results", batch_size=10, sleep=0, dry_run=False) == 4
+    # 배치 하나의 참조 갱신은 executemany 한 번
+    assert sum(sql.startswith("UPDATE images SET generated_image_url") for sql in statements) == 1
+
+    urls = dict(session.execute(select(Image.original_image_url, Image.generated_image_url)).all())
+    assert urls["/uploads/id0.jpg"] == storage_paths.url_for_path(storage_paths.sharded_path("results", "id0_nobg.png"))
+    assert urls["/uploads/id1.jpg"] == storage_paths.sharded_path("results", "id1_nobg.png")
+    assert urls["/uploads/id2.jpg"] == storage_paths.url_for_path(storage_paths.sharded_path("results", "id2_nobg.png"))
@@ -0,0 +1,38 @@
+# tests/test_rate_limit.py
+import time
+from controller import rate_limit
+
+
+def test_memory_backend_prunes_each_bucket_by_its_own_rule(monkeypatch):
+    monkeypatch.setattr(rate_limit, "MAX_MEMORY_BUCKETS", 1)
+    backend = rate_limit.MemoryBackend()
+    slow = rate_limit.RateLimitRule(capacity=1, period=3600)
+    fast = rate_limit.RateLimitRule(capacity=1000, period=0.001)
+    assert backend.take("slow", slow)[0] is True
+    time.sleep(0.01)
+    # 빠른 규칙의 주기로 정리하면 아직 가득 차지 않은 slow 버킷까지 지워져 한도가 초기화됨
+    backend.take("fast", fast)
+    assert backend.take("slow", slow)[0] is False
+
+
+def test_memory_backend_prunes_refilled_buckets(monkeypatch):
+    monkeypatch.setattr(rate_limit, "MAX_MEMORY_BUCKETS", 1)
+    backend = rate_limit.MemoryBackend()
+    fast = rate_limit.RateLimitRule(capacity=1, period=0.001)
+    backend.take("a", fast)
+    time.sleep(0.01)
+    backend.take("b", fast)
+    assert "a" not in backend._buckets
+
+
+def test_only_registered_api_clients_get_their_own_bucket(monkeypatch):
+    from controller import api_keys
+    monkeypatch.setattr(api_keys, "_client_keys", api_keys._parse_client_keys("partner:secret-key"))
+
+    def scope(client_header):
+        return {"type": "http", "headers": [(b"x-api-client", client_header)], "client": ("10.0.0.1", 1234)}
+
+    assert rate_limit._client_identity(scope(b"secret-key")) == "client:partner"
+    # 등록되지 않은 값을 바꿔 보내도 같은 주소의 버킷을 사용
+    assert rate_limit._client_identity(scope(b"anything")) == "ip:10.0.0.1"
+    assert rate_limit._client_identity(scope(b"partner")) == "ip:10.0.0.1"
@@ -0,0 +1,40 @@
+# tests/test_replicas.py
+import threading
+import time
+from model import database
+from model.database import ReplicaRouter
+
+
+def _wait_for_check(replica):
+    deadline = time.monotonic() + 2
+    while replica.checked_at == float("-inf") and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_lag_is_measured_off_the_request_path(tmp_path, monkeypatch):
+    router = ReplicaRouter([f"sqlite:///{tmp_path}/replica.db"])
+    replica = router.replicas[0]
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_measure():
+        started.set()
+        release.wait(2)
+        return 0.0
+
+    monkeypatch.setattr(replica, "_measure_lag", slow_measure)
+    # 확인이 끝나기 전에는 기다리지 않고 기본 DB 사용
+    assert router.read_engine() is database.engine
+    assert started.wait(2)
+    release.set()
+    _wait_for_check(replica)
+    assert router.read_engine() is replica.engine
+
+
+def test_stopped_wal_receiver_is_unhealthy(tmp_path, monkeypatch):
+    router = ReplicaRouter([f"sqlite:///{tmp_path}/replica.db"])
+    replica = router.replicas[0]
+    monkeypatch.setattr(replica, "_measure_lag", lambda: None)
+    router.read_engine()
+    _wait_for_check(replica)
+    assert not replica.healthy and router.read_engine() is database.engine
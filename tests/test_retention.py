@@ -0,0 +1,149 @@
+# tests/test_retention.py
+import os
+import time
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from controller import locks, retention, storage_paths
+from model.database import Base, Image, backfill_image_file_keys, file_key_from_url
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_paths, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _touch(path, age_days=0.0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x")
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+
+
+def test_scan_batch_visits_every_file_once_flat_first(uploads):
+    flat = [f"flat{i}_nobg.png" for i in range(5)]
+    sharded = [f"id{i:03d}_nobg.png" for i in range(40)]
+    for name in flat:
+        _touch(storage_paths.legacy_path("results", name))
+    for name in sharded:
+        _touch(storage_paths.sharded_path("results", name))
+
+    seen, cursor = [], ""
+    while True:
+        entries, cursor = storage_paths.scan_batch("results", cursor, 7)
+        seen.extend(path for path, _ in entries)
+        if not cursor:
+            break
+    names = [path.rsplit("/", 1)[-1] for path in seen]
+    assert sorted(names) == sorted(flat + sharded) and len(names) == len(set(names))
+    assert names[:5] == sorted(flat)
+    assert seen[5:] == sorted(seen[5:])
+
+
+def test_scan_batch_reads_only_leaf_directories_in_shard_phase(uploads, monkeypatch):
+    for i in range(20):
+        _touch(storage_paths.sharded_path("edges", f"id{i}_edge.bits"))
+    first, cursor = storage_paths.scan_batch("edges", "", 3)
+    assert cursor
+
+    scanned = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scanned.append(path) or real_scandir(path))
+    storage_paths.scan_batch("edges", cursor, 3)
+    root = storage_paths.category_dir("edges")
+    assert scanned and all(os.path.relpath(path, root).count(os.sep) == storage_paths.SHARD_DEPTH - 1 for path in scanned)
+
+
+def test_file_key_from_url():
+    assert file_key_from_url("/uploads/results/3f/a2/abc123_nobg.png") == "abc123"
+    assert file_key_from_url("https://bucket.s3.amazonaws.com/abc123_photo_nobg.png?X-Amz=1") == "abc123"
+    assert file_key_from_url(None) is None
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_backfill_and_referenced_keys(db):
+    # file_key 컬럼이 생기기 전에 기록된 행 (ORM 이벤트를 거치지 않음)
+    db.execute(insert(Image), [
+        {"original_image_url": "/uploads/aaa.jpg", "generated_image_url": "/uploads/results/1/2/aaa_nobg.png"},
+        {"original_image_url": "https://s3/bbb_photo_nobg.png", "generated_image_url": None},
+    ])
+    db.add(Image(original_image_url="/uploads/ccc.jpg"))
+    db.commit()
+    assert db.scalar(select(Image.original_file_key).where(Image.original_image_url == "/uploads/ccc.jpg")) == "ccc"
+
+    assert backfill_image_file_keys(db, batch_size=1) == 1
+    assert backfill_image_file_keys(db) == 1
+    assert backfill_image_file_keys(db) == 0
+    assert retention.referenced_keys(db, {"aaa", "bbb", "ccc", "zzz"}) == {"aaa", "bbb", "ccc"}
+    assert retention.referenced_keys(db, set()) == set()
+
+
+def test_process_category_keeps_referenced_and_young_files(uploads, db):
+    db.add(Image(original_image_url="/uploads/keep.jpg", generated_image_url="/uploads/results/keep_nobg.png"))
+    db.commit()
+    _touch(storage_paths.sharded_path("results", "keep_nobg.png"), age_days=90)
+    _touch(storage_paths.sharded_path("results", "young_nobg.png"), age_days=1)
+    _touch(storage_paths.sharded_path("results", "old_nobg.png"), age_days=90)
+    category = retention.RetentionCategory("results", storage_paths.category_dir("results"), 30)
+
+    report = retention.process_category(db, category, "", dry_run=True, now=time.time())
+    assert (report.scanned, report.referenced, report.kept) == (3, 1, 2)
+    assert [action["file"].rsplit("/", 1)[-1] for action in report.actions] == ["old_nobg.png"]
+    assert os.path.exists(storage_paths.sharded_path("results", "old_nobg.png"))
+
+    report = retention.process_category(db, category, "", dry_run=False, now=time.time())
+    assert report.deleted == 1
+    assert not os.path.exists(storage_paths.sharded_path("results", "old_nobg.png"))
+    assert os.path.exists(storage_paths.sharded_path("results", "keep_nobg.png"))
+
+
+def test_retention_is_off_and_dry_run_by_default():
+    assert retention.RETENTION_ENABLED is False
+    assert retention.RETENTION_DRY_RUN is True
+
+
+def test_previews_expire_even_when_request_is_recorded(uploads, db):
+    # 같은 request_id의 S3 원본 URL이 images에 기록되어 있어도 미리보기는 기간이 지나면 삭제
+    db.add(Image(original_image_url="https://bucket.s3.amazonaws.com/req1_photo_nobg.png"))
+    db.commit()
+    _touch(storage_paths.sharded_path("previews", "req1_nobg.png"), age_days=2)
+    category = next(category for category in retention.CATEGORIES if category.name == "previews")
+
+    report = retention.process_category(db, category, "", dry_run=False, now=time.time())
+    assert (report.referenced, report.deleted) == (0, 1)
+
+
+def test_dry_run_report_covers_every_batch_without_writing(uploads, db, tmp_path, monkeypatch):
+    # 채우기 전의 행도 참조로 보고, DB와 커서는 바꾸지 않음
+    db.execute(insert(Image), [{"original_image_url": "/uploads/old001.jpg", "generated_image_url": None}])
+    db.commit()
+    for i in range(5):
+        _touch(storage_paths.sharded_path("results", f"old{i:03d}_nobg.png"), age_days=90)
+    state_file = tmp_path / "state.json"
+    monkeypatch.setattr(locks, "LOCK_DIR", str(tmp_path))
+    monkeypatch.setattr(retention, "RETENTION_STATE_FILE", str(state_file))
+    monkeypatch.setattr(retention, "RETENTION_BATCH_SIZE", 2)
+    monkeypatch.setattr(retention, "SessionLocal", lambda: db)
+    monkeypatch.setattr(retention, "CATEGORIES", [
+        retention.RetentionCategory("results", storage_paths.category_dir("results"), 30)
+    ])
+
+    result = retention.run_retention(dry_run=True)
+    report = result["categories"][0]
+    assert result["status"] == "success"
+    assert (report["scanned"], report["referenced"], report["deleted"]) == (5, 1, 4)
+    assert report["cycle_completed"] and len(report["actions"]) == 4
+    assert db.scalar(select(Image.original_file_key)) is None
+    assert not state_file.exists()
+    assert all(os.path.exists(storage_paths.sharded_path("results", f"old{i:03d}_nobg.png")) for i in range(5))
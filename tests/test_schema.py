@@ -0,0 +1,30 @@
+# tests/test_schema.py
+import pytest
+from controller import locks
+from controller.locks import singleton_lock
+from model import database
+
+
+@pytest.fixture(autouse=True)
+def lock_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(locks, "LOCK_DIR", str(tmp_path))
+
+
+def test_only_the_lock_holder_changes_the_schema(monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "ensure_columns", lambda: calls.append("ensure"))
+    database.create_tables()
+    assert calls == ["ensure"]
+
+    # 다른 워커가 잠금을 가진 동안에는 스키마를 바꾸지 않고 컬럼이 준비되었는지만 확인
+    with singleton_lock("schema") as acquired:
+        assert acquired
+        database.create_tables()
+    assert calls == ["ensure"]
+
+
+def test_waiting_worker_gives_up_after_timeout(monkeypatch):
+    monkeypatch.setattr(database, "SCHEMA_WAIT_SECONDS", 0)
+    monkeypatch.setattr(database, "_schema_ready", lambda: False)
+    with singleton_lock("schema"):
+        database.create_tables()
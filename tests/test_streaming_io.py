@@ -0,0 +1,108 @@
+# tests/test_streaming_io.py
+import base64
+import pytest
+import json
+from controller.streaming_io import Base64StreamDecoder, InvalidImageError, JsonStringFieldReader
+
+
+def test_decodes_data_url_in_chunks():
+    encoded = "data:image/png;base64," + base64.b64encode(b"\x89PNG payload").decode()
+    decoder = Base64StreamDecoder()
+    decoded = b"".join(decoder.feed(encoded[i:i + 5]) for i in range(0, len(encoded), 5)) + decoder.finish()
+    assert decoded == b"\x89PNG payload"
+
+
+@pytest.mark.parametrize("chunk", ["iVBORw0Ké", "data:image/png;base64,☃AAA", b"iVBO\xff\xfe"])
+def test_non_ascii_input_is_invalid_image(chunk):
+    decoder = Base64StreamDecoder()
+    with pytest.raises(InvalidImageError):
+        decoder.feed(chunk)
+        decoder.finish()
+
+
+@pytest.mark.parametrize("step", [1, 7, 4096])
+def test_json_reader_streams_one_field_and_collects_the_rest(step):
+    image = "data:image\\/png;base64," + base64.b64encode(b"\x89PNG payload" * 100).decode()
+    body = ('{"processingType": "cut", "imageData": "' + image + '", '
+            '"originalImageUrl": "https://a/b?q=\\"}\\"", "extra": [1, {"a": "]"}]}').encode()
+    reader = JsonStringFieldReader("imageData")
+    streamed = b"".join(reader.feed(body[i:i + step]) for i in range(0, len(body), step))
+    assert streamed.decode() == json.loads(body)["imageData"]
+    assert reader.found and reader.finish() == {
+        "processingType": "cut", "originalImageUrl": 'https://a/b?q="}"', "extra": [1, {"a": "]"}]
+    }
+
+
+@pytest.mark.parametrize("body", [
+    b'{"imageData": 5}', b'{"a": 1,}', b"[1]", b'{"imageData": "x"} x', b'{"imageData": "x"',
+    b'{"imageData": "x", "imageData": "y"}', b'{"imageData": "\\q"}',
+])
+def test_json_reader_rejects_malformed_bodies(body):
+    reader = JsonStringFieldReader("imageData")
+    with pytest.raises(InvalidImageError):
+        reader.feed(body)
+        reader.finish()
+
+
+def test_save_endpoint_streams_json_body_to_disk(tmp_path, monkeypatch):
+    import io
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from PIL import Image as PILImage
+    from controller import background_bg, storage_paths
+
+    monkeypatch.setattr(storage_paths, "UPLOAD_DIR", str(tmp_path))
+    png = io.BytesIO()
+    PILImage.new("RGBA", (4, 4)).save(png, format="PNG")
+    app = FastAPI()
+    app.include_router(background_bg.router)
+    client = TestClient(app)
+
+    body = {"imageData": "data:image/png;base64," + base64.b64encode(png.getvalue()).decode()}
+    response = client.post("/api/backgroundBG/save", json=body)
+    assert response.status_code == 200
+    saved = list(tmp_path.rglob("*_nobg.png"))
+    assert len(saved) == 1 and saved[0].read_bytes() == png.getvalue()
+
+    assert client.post("/api/backgroundBG/save", json={"processingType": "x"}).status_code == 400
+    assert client.post("/api/backgroundBG/save", content=b'{"imageData": "iVBO').status_code == 400
+    assert len(list(tmp_path.rglob("*.png*"))) == 1
+
+
+def test_failed_charge_removes_saved_file(tmp_path, monkeypatch):
+    import io
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from PIL import Image as PILImage
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from controller import auth, background_bg, storage_paths
+    from model.database import Base, User, get_db
+
+    monkeypatch.setattr(storage_paths, "UPLOAD_DIR", str(tmp_path))
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add(User(user_id=1, email="a@example.com", password_hash="x", credits=0))
+        session.commit()
+    # 캐시에는 크레딧이 남아 있지만 DB에서 차감할 때 부족한 경우
+    monkeypatch.setattr(auth.user_cache, "get", lambda db, user_id: auth.CachedUser(user_id, "a@example.com", 5))
+
+    def override_db():
+        with Session() as session:
+            yield session
+
+    png = io.BytesIO()
+    PILImage.new("RGBA", (4, 4)).save(png, format="PNG")
+    app = FastAPI()
+    app.include_router(background_bg.router)
+    app.dependency_overrides[get_db] = override_db
+    response = TestClient(app).post(
+        "/api/backgroundBG/save-binary", content=png.getvalue(),
+        headers={"Content-Type": "image/png", "Authorization": f"Bearer {auth.create_access_token(1)}"}
+    )
+    assert response.status_code == 400
+    assert list(tmp_path.rglob("*.png*")) == []
+    engine.dispose()
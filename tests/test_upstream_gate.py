@@ -0,0 +1,158 @@
+# tests/test_upstream_gate.py
+import asyncio
+import threading
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from controller import upstream_gate
+from controller.upstream_gate import ConcurrencyGate, UpstreamBusyError
+
+
+def _gate(limit=1, max_queue=8, timeout=1.0):
+    return ConcurrencyGate("test", limit, max_queue, timeout, weights={"paid": 8, "free": 2, "anonymous": 1})
+
+
+def test_async_waiters_do_not_hold_threads():
+    gate = _gate(limit=1, max_queue=32)
+    order = []
+
+    async def call(name):
+        async with gate.slot_async("free", name):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call(f"user{i}") for i in range(20)))
+
+    threads_before = threading.active_count()
+    asyncio.run(main())
+    # 대기하는 동안 스레드를 쓰지 않음
+    assert threading.active_count() == threads_before
+    assert sorted(order) == sorted(f"user{i}" for i in range(20))
+    assert gate.active == 0 and gate.waiting == 0
+
+
+def test_async_waiter_times_out():
+    gate = _gate(limit=1, timeout=0.05)
+
+    async def main():
+        await gate.acquire_async()
+        with pytest.raises(UpstreamBusyError):
+            await gate.acquire_async()
+        gate.release(0.0)
+
+    asyncio.run(main())
+    assert gate.active == 0 and gate.waiting == 0
+
+
+def test_cancelled_async_waiter_leaves_queue():
+    gate = _gate(limit=1)
+
+    async def main():
+        await gate.acquire_async()
+        task = asyncio.create_task(gate.acquire_async())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        gate.release(0.0)
+
+    asyncio.run(main())
+    assert gate.active == 0 and gate.waiting == 0
+
+
+def test_blocking_waiters_are_capped(monkeypatch):
+    monkeypatch.setattr(upstream_gate, "_blocking_waiters", upstream_gate._BlockingWaiters(0))
+    gate = _gate(limit=1)
+    gate.acquire()
+    with pytest.raises(UpstreamBusyError):
+        gate.acquire()
+    gate.release(0.0)
+    assert gate.waiting == 0
+
+
+def test_threadpool_call_reuses_slot_taken_on_event_loop(monkeypatch):
+    gate = _gate(limit=1, timeout=0.05)
+    monkeypatch.setitem(upstream_gate.gates, "test", gate)
+
+    def call():
+        # 이벤트 루프에서 잡은 자리를 다시 기다리면 한도 1에서 시간 초과가 남
+        with upstream_gate.upstream_slot("test"):
+            return gate.active
+
+    async def main():
+        async with upstream_gate.upstream_slot_async("test"):
+            return await run_in_threadpool(call)
+
+    assert asyncio.run(main()) == 1
+    assert gate.active == 0
+
+
+
+def test_new_arrival_takes_free_slot_while_granted_waiter_sleeps():
+    gate = _gate(limit=2)
+    gate.acquire()
+    gate.acquire()
+    with gate._cond:
+        # 자리를 받았지만 아직 깨어나지 않은 대기자를 흉내 냄
+        sleeper = gate._enqueue("free", "a")
+    gate.release(0.0)
+    assert sleeper.granted and gate.active == 2
+    gate.release(0.0)
+    # active=1 < limit, waiting=1 (sleeper): 새 호출은 다음 release를 기다리지 않고 바로 자리를 받아야 함
+    start = asyncio.run(asyncio.wait_for(gate.acquire_async("free", "b"), 0.5))
+    assert start is None and gate.active == 2
+
+
+def test_timed_out_waiter_does_not_penalize_its_flow():
+    gate = _gate(limit=1, timeout=0.01)
+    gate.acquire()
+    with pytest.raises(UpstreamBusyError):
+        gate.acquire("free", "a")
+    assert gate._flow_finish["free:a"] == gate._virtual_time
+    gate.release(0.0)
+
+
+def test_paid_tier_reachable_with_default_credits():
+    from model.database import DEFAULT_USER_CREDITS
+    assert upstream_gate.classify_tier(DEFAULT_USER_CREDITS) == "free"
+    assert upstream_gate.classify_tier(DEFAULT_USER_CREDITS + 50) == "paid"
+    assert upstream_gate.classify_tier(None) == "anonymous"
+
+
+def test_request_priority_shares_endpoint_session_and_tier(monkeypatch):
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+    from controller import auth
+    from model.database import get_db
+
+    sessions = []
+    lookups = []
+
+    def fake_db():
+        session = object()
+        sessions.append(session)
+        yield session
+
+    def fake_lookup(db, user_id):
+        lookups.append((db, threading.get_ident()))
+        return auth.CachedUser(user_id, "a@example.com", 10_000)
+
+    monkeypatch.setattr(auth.user_cache, "get", fake_lookup)
+    app = FastAPI()
+    app.dependency_overrides[get_db] = fake_db
+
+    @app.get("/tier", dependencies=[Depends(upstream_gate.request_priority)])
+    async def tier(db=Depends(get_db)):
+        return {
+            "priority": list(upstream_gate.request_priority_var.get()),
+            "same_session": db is sessions[0],
+            "loop_thread": threading.get_ident(),
+        }
+
+    token = auth.create_access_token(5)
+    body = TestClient(app).get("/tier", headers={"Authorization": f"Bearer {token}"}).json()
+    # 엔드포인트의 세션을 그대로 쓰고, 조회는 이벤트 루프 밖에서 실행
+    assert len(sessions) == 1 and body["same_session"]
+    assert len(lookups) == 1 and lookups[0][0] is sessions[0]
+    assert lookups[0][1] != body["loop_thread"]
+    assert body["priority"] == ["paid", "user:5"]
@@ -0,0 +1,34 @@
+# tests/test_usage.py
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from controller import admin_auth
+from controller.auth import create_access_token
+from controller.usage import require_usage_reader
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", "admin-secret")
+    app = FastAPI()
+
+    @app.get("/api/usage/{user_id}", dependencies=[Depends(require_usage_reader)])
+    def usage(user_id: int):
+        return {"user_id": user_id}
+
+    return TestClient(app)
+
+
+def test_usage_requires_identity(client):
+    assert client.get("/api/usage/5").status_code == 401
+    assert client.get("/api/usage/5", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+
+def test_usage_readable_by_owner_only(client):
+    headers = {"Authorization": f"Bearer {create_access_token(5)}"}
+    assert client.get("/api/usage/5", headers=headers).json() == {"user_id": 5}
+    assert client.get("/api/usage/6", headers=headers).status_code == 403
+
+
+def test_usage_readable_by_admin(client):
+    assert client.get("/api/usage/6", headers={"X-Admin-Token": "admin-secret"}).json() == {"user_id": 6}